@@ -4,8 +4,10 @@ import database
 from config import *
 from email_validator import validate_email, EmailNotValidError
 from rpi_utils import NetworkScanner, SSHClient
+from network_scanner import DEVICE_PORTS
 from email_utils import EmailVerifier
 import threading
+import ipaddress
 
 class LoginFrame(ctk.CTkFrame):
     def __init__(self, master, login_callback):
@@ -41,8 +43,23 @@ class LoginFrame(ctk.CTkFrame):
     def login_event(self):
         username = self.username_entry.get()
         password = self.password_entry.get()
-        
-        user_info = database.login_user(username, password)
+
+        # Password verification runs a deliberately slow KDF, keep it off the UI thread
+        self.login_button.configure(state="disabled", text="Logging in...")
+        threading.Thread(target=self.perform_login, args=(username, password), daemon=True).start()
+
+    def perform_login(self, username, password):
+        try:
+            user_info = database.login_user(username, password)
+        except Exception as e:
+            print(f"Login error: {e}")
+            user_info = None
+        finally:
+            database.close_connection()
+        self.master.after(0, lambda: self.login_finished(user_info))
+
+    def login_finished(self, user_info):
+        self.login_button.configure(state="normal", text="Login")
         if user_info:
             self.login_callback(user_info)
         else:
@@ -54,6 +71,9 @@ class RegisterFrame(ctk.CTkFrame):
         self.back_callback = back_callback
         self.master = master
         self.scanner = NetworkScanner()
+        self.scan = None
+        self.devices = {}
+        self.device_buttons = {}
         
         # Email verification is now console-based
         self.email_verifier = EmailVerifier()
@@ -184,19 +204,81 @@ class RegisterFrame(ctk.CTkFrame):
         self.start_scan()
 
     def start_scan(self):
-        self.status_label.configure(text="🔍 Scanning network...", text_color="gray70")
-        threading.Thread(target=self.run_scan, daemon=True).start()
+        # The refresh button doubles as stop while a scan is running
+        if self.scan and not self.scan.finished.is_set():
+            self.scan.cancel()
+            return
+        # Devices seen by earlier scans go up straight away (dimmed), the scan then confirms and extends them
+        known = [dev for dev in database.get_discovered_devices() if set(dev["open_ports"]) & set(DEVICE_PORTS)]
+        self.devices = {dev["ip"]: dict(dev, confirmed=False) for dev in known}
+        self.device_buttons = {}
+        self.update_device_list(scanning=True)
+        self.refresh_btn.configure(text="⏹")
+        # SSH and rpi_server in one sweep, so the list can say which Pis already run Nexus
+        scan = self.scanner.prepare_scan(DEVICE_PORTS, known=list(self.devices), identify=True,
+                                         on_finished=self.on_scan_finished)
+        # The callbacks carry their own scan: they can fire before start() returns, and a
+        # stopped scan's stragglers must not land in the next one
+        scan.on_device = scan.on_hostname = lambda device: self.on_scan_device(scan, device)
+        scan.on_progress = lambda done, total, found: self.on_scan_progress(scan, done, total)
+        self.scan = scan
+        scan.start()
+
+    # Called on the scan's thread
+    def on_scan_device(self, scan, device):
+        self.master.after(0, lambda: self.device_found(scan, device))
+
+    def on_scan_progress(self, scan, done, total):
+        self.master.after(0, lambda: self.show_scan_progress(scan, done, total))
+
+    def on_scan_finished(self, scan):
+        try:
+            database.save_discovered_devices(scan.devices)
+        finally:
+            database.close_connection()
+        self.master.after(0, lambda: self.scan_finished(scan))
 
-    def run_scan(self):
-        devices = self.scanner.scan_network()
-        self.master.after(0, lambda: self.update_device_list(devices))
+    def device_found(self, scan, device):
+        if scan is not self.scan:
+            return
+        # Names resolve after the device is found; until then keep the one from earlier scans
+        previous = self.devices.get(device["ip"], {})
+        self.devices[device["ip"]] = dict(device, hostname=device["hostname"] or previous.get("hostname"), confirmed=True)
+        if len(self.device_buttons) == 0:
+            self.update_device_list(scanning=True)
+        else:
+            self.show_device(self.devices[device["ip"]])
 
-    def update_device_list(self, devices):
+    def show_scan_progress(self, scan, done, total):
+        if scan is not self.scan or scan.finished.is_set():
+            return
+        found = sum(dev["confirmed"] for dev in self.devices.values())
+        self.status_label.configure(text=f"🔍 Scanning {done}/{total}... {found} found", text_color="gray70")
+
+    def scan_finished(self, scan):
+        if scan is not self.scan:
+            return
+        self.refresh_btn.configure(text="🔄")
+        if not scan.cancelled:
+            # A full sweep that didn't see a known device means it's gone
+            self.devices = {ip: dev for ip, dev in self.devices.items() if dev["confirmed"]}
+        self.update_device_list()
+        if scan.cancelled and self.devices:
+            self.status_label.configure(text=f"⏹ Scan stopped, {len(self.devices)} device(s)", text_color="gray70")
+
+    def update_device_list(self, scanning=False):
         self.connect_btn.configure(state="normal")
+        for widget in self.device_list_container.winfo_children():
+            widget.destroy()
+        self.device_buttons = {}
+        devices = sorted(self.devices.values(), key=lambda dev: ipaddress.ip_address(dev["ip"]))
         
         if len(devices) > 0:
             # Devices found - show scrollable list
-            self.status_label.configure(text=f"✅ Found {len(devices)} device(s) with SSH", text_color="green")
+            if scanning:
+                self.status_label.configure(text=f"🔍 {len(devices)} device(s), scanning for more...", text_color="gray70")
+            else:
+                self.status_label.configure(text=f"✅ Found {len(devices)} device(s)", text_color="green")
             
             # Create scrollable frame for devices
             self.device_list = ctk.CTkScrollableFrame(self.device_list_container, width=280, height=120,
@@ -207,13 +289,9 @@ class RegisterFrame(ctk.CTkFrame):
                         font=("Roboto", 12, "bold"), text_color="gray70").pack(anchor="w", padx=10, pady=(0, 5))
             
             for dev in devices:
-                btn = ctk.CTkButton(self.device_list, text=f"🖥️  {dev['hostname']}\n   {dev['ip']}", 
-                                    command=lambda ip=dev['ip']: self.select_device(ip),
-                                    fg_color=COLOR_CARD, hover_color=COLOR_PRIMARY,
-                                    border_width=1, border_color="gray30",
-                                    height=60,
-                                    anchor="w", font=FONT_BODY)
-                btn.pack(fill="x", pady=5, padx=10)
+                self.show_device(dev)
+        elif scanning:
+            self.status_label.configure(text="🔍 Scanning network...", text_color="gray70")
         else:
             # No devices found - show clean message
             self.status_label.configure(text="ℹ️  No RPi devices found. Enter IP manually below.", 
@@ -235,6 +313,25 @@ class RegisterFrame(ctk.CTkFrame):
                         font=("Roboto", 11), text_color="gray60", anchor="w").pack(pady=1, padx=30, anchor="w")
             ctk.CTkLabel(info_frame, text="", font=("Roboto", 5)).pack(pady=5)  # Spacer
 
+    def show_device(self, dev):
+        # Known-but-not-yet-confirmed devices are dimmed until the scan reaches them
+        text = f"🖥️  {dev['hostname'] or 'Unknown'}\n   {dev['ip']}"
+        if dev.get("kind"):
+            text += f"  ·  {dev['kind']}"
+        color = COLOR_TEXT if dev["confirmed"] else "gray50"
+        btn = self.device_buttons.get(dev["ip"])
+        if btn is not None:
+            btn.configure(text=text, text_color=color)
+            return
+        btn = ctk.CTkButton(self.device_list, text=text, text_color=color,
+                            command=lambda ip=dev['ip']: self.select_device(ip),
+                            fg_color=COLOR_CARD, hover_color=COLOR_PRIMARY,
+                            border_width=1, border_color="gray30",
+                            height=60,
+                            anchor="w", font=FONT_BODY)
+        btn.pack(fill="x", pady=5, padx=10)
+        self.device_buttons[dev["ip"]] = btn
+
     def select_device(self, ip):
         self.manual_ip.delete(0, "end")
         self.manual_ip.insert(0, ip)
@@ -276,17 +373,32 @@ class RegisterFrame(ctk.CTkFrame):
             self.master.after(0, lambda: self.rpi_fail("Connection failed"))
 
     def rpi_success(self):
+        if self.scan:
+            self.scan.cancel()
         messagebox.showinfo("Success", "RPi Connected and Synced!")
         self.finalize_registration()
 
     def finalize_registration(self):
-        # Register in DB
-        if database.register_user(self.user_data['name'], self.user_data['username'], 
-                                  self.user_data['gmail'], self.user_data['password'], 
-                                  self.user_data['rpi_enabled'],
-                                  self.user_data.get('rpi_ip'),
-                                  self.user_data.get('rpi_user'),
-                                  self.user_data.get('rpi_pass')):
+        # Register in DB (hashing the password is slow, so do it on a worker)
+        threading.Thread(target=self.perform_registration, daemon=True).start()
+
+    def perform_registration(self):
+        try:
+            success = database.register_user(self.user_data['name'], self.user_data['username'], 
+                                             self.user_data['gmail'], self.user_data['password'], 
+                                             self.user_data['rpi_enabled'],
+                                             self.user_data.get('rpi_ip'),
+                                             self.user_data.get('rpi_user'),
+                                             self.user_data.get('rpi_pass'))
+        except Exception as e:
+            print(f"Registration error: {e}")
+            success = False
+        finally:
+            database.close_connection()
+        self.master.after(0, lambda: self.registration_finished(success))
+
+    def registration_finished(self, success):
+        if success:
             messagebox.showinfo("Success", "Account created successfully!")
             self.back_callback()
         else:
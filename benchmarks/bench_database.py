@@ -0,0 +1,88 @@
+"""
+Micro-benchmark: persistent WAL connection layer vs. the old open-per-call pattern.
+
+Runs against a scratch database in a temp directory, never against users.db.
+Usage: python benchmarks/bench_database.py [--ops 2000]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+
+
+# --- Legacy behaviour: new connection, rollback journal, commit + close per call ---
+
+def legacy_save(db_name, section_id, content):
+    conn = sqlite3.connect(db_name)
+    cursor = conn.cursor()
+    cursor.execute("UPDATE user_notes SET content = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?", (content, section_id))
+    conn.commit()
+    conn.close()
+
+def legacy_get_sections(db_name, username):
+    conn = sqlite3.connect(db_name)
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, title, updated_at FROM user_notes WHERE username = ? ORDER BY updated_at DESC", (username,))
+    sections = cursor.fetchall()
+    conn.close()
+    return sections
+
+
+def timed(label, ops, fn):
+    start = time.perf_counter()
+    for i in range(ops):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    rate = ops / elapsed if elapsed else float("inf")
+    print(f"  {label:<28} {rate:>10.0f} ops/sec")
+    return rate
+
+
+def setup_db(path, wal):
+    # Same schema as the app (migrations, FTS and revision triggers included)
+    database.DB_NAME = path
+    database.init_db()
+    for i in range(50):
+        database.create_section("bench", f"Section {i}")
+    database.close_connection()
+    if not wal:
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ops", type=int, default=2000)
+    args = parser.parse_args()
+
+    # A different payload per op: an unchanged save is skipped and would measure nothing
+    def payload(i):
+        return '{"content": "' + f"{i:06d}" + "x" * 2000 + '", "tags": {}}'
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_db = os.path.join(tmp, "legacy.db")
+        pooled_db = os.path.join(tmp, "pooled.db")
+        setup_db(legacy_db, wal=False)
+        setup_db(pooled_db, wal=True)
+
+        print("Open-per-call (legacy):")
+        old_save = timed("save_section_content", args.ops, lambda i: legacy_save(legacy_db, i % 50 + 1, payload(i)))
+        old_read = timed("get_sections", args.ops, lambda i: legacy_get_sections(legacy_db, "bench"))
+
+        database.DB_NAME = pooled_db
+        print("Thread-local WAL connection:")
+        new_save = timed("save_section_content", args.ops, lambda i: database.save_section_content(i % 50 + 1, payload(i)))
+        new_read = timed("get_sections", args.ops, lambda i: database.get_sections("bench"))
+        database.close_connection()
+
+    print(f"\nSpeed-up: save x{new_save / old_save:.1f}, get_sections x{new_read / old_read:.1f}")
+
+
+if __name__ == "__main__":
+    main()
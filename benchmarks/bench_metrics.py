@@ -0,0 +1,61 @@
+"""
+Benchmark: record a simulated week of 1 Hz system metrics into MetricsStore.
+
+Reports ingest rate, on-disk size and query latency for common ranges.
+Runs against a scratch database in a temp directory.
+Usage: python benchmarks/bench_metrics.py [--days 7]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from metrics_store import MetricsStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=float, default=7)
+    args = parser.parse_args()
+    rng = random.Random(1)
+    seconds = int(args.days * 86400)
+    start_ts = 1_700_000_000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "metrics.db")
+        store = MetricsStore(path)
+
+        start = time.perf_counter()
+        for i in range(seconds):
+            store.record({
+                "cpu": 30 + 25 * math.sin(i / 600) + rng.uniform(-5, 5),
+                "ram": 55 + rng.uniform(-1, 1),
+                "gpu": None if i % 2 else rng.uniform(0, 100),
+                "disk": 71.3,
+                "net_down": rng.expovariate(1 / 200),
+                "net_up": rng.expovariate(1 / 40),
+            }, ts=start_ts + i)
+        store.flush()
+        elapsed = time.perf_counter() - start
+
+        size = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp))
+        print(f"Recorded {seconds} samples in {elapsed:.1f}s ({seconds / elapsed:.0f} samples/s)")
+        print(f"On-disk size (db + wal): {size / 1e6:.1f} MB")
+        for table in ("metrics_1s", "metrics_1m", "metrics_1h"):
+            count = store.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            print(f"  {table}: {count} rows")
+
+        end_ts = start_ts + seconds
+        for label, span in (("last minute", 60), ("last hour", 3600), ("last day", 86400), ("full range", seconds)):
+            start = time.perf_counter()
+            timestamps, series = store.query(end_ts - span, end_ts)
+            print(f"query {label:<12} {len(timestamps):>4} points in {(time.perf_counter() - start) * 1000:.1f} ms")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Benchmark: async NetworkScanner vs the original 50-thread connect_ex sweep on a simulated LAN.
+
+Builds a fake subnet on loopback (127.77.0.0/22 by default, every 127.x address is local on Linux):
+- "devices": an address with a listener on the port sending an SSH banner, like a Pi with SSH
+  up; every other one also answers rpi_server's HELLO on port 5000, like a Pi running Nexus
+- "silent" hosts: a listener whose accept queue is full, so SYNs are dropped and the
+  connect hangs, like an address with nothing behind it on a real LAN
+- the rest refuse at once (RST), like a host that is up without the port open
+Then sweeps it with both scanners and reports time and hosts found, plus a streamed rescan that
+already knows the devices (as from the devices table) and how soon it reports them, and how
+quickly a cancelled scan stops. Reverse lookups are made to take --dns-delay seconds (a LAN
+without PTR records), to show devices are reported without waiting on DNS and that a second
+scan gets the names from the resolver's cache. Last, a sweep of both ports with every open
+port identified, against the single-port sweep.
+Linux only (binds 127.x.y.z). Usage: python benchmarks/bench_network_scanner.py [--cidr 127.77.0.0/22]
+       [--silent 0.9] [--devices 20] [--dns-delay 1.0] [--skip-threaded]
+"""
+import argparse
+import asyncio
+import ipaddress
+import os
+import random
+import resource
+import selectors
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import network_scanner
+import rpi_protocol as protocol
+from network_scanner import RPI_SERVER_PORT, AsyncScanner, HostnameResolver, NetworkScanner
+
+SSH_BANNER = b"SSH-2.0-OpenSSH_9.2p1 Raspbian-2+deb12u3\r\n"
+
+
+def build_lan(cidr, port, silent_fraction, devices, seed):
+    """Open listeners for the simulated hosts; returns (device ips, Nexus ips, silent count, sockets to keep open)."""
+    hosts = [str(host) for host in ipaddress.ip_network(cidr).hosts()]
+    rng = random.Random(seed)
+    device_ips = rng.sample(hosts, devices)
+    nexus_ips = set(device_ips[::2])
+    device_ips = set(device_ips)
+    sockets = []
+    services = {} # listener -> what it answers
+    silent = 0
+    for ip in hosts:
+        if ip in device_ips:
+            for listen_port, service in ((port, "ssh"), (RPI_SERVER_PORT, "nexus")):
+                if service == "nexus" and ip not in nexus_ips:
+                    continue
+                listener = socket.socket()
+                listener.bind((ip, listen_port))
+                listener.listen(128)
+                sockets.append(listener)
+                services[listener] = service
+        elif rng.random() < silent_fraction:
+            # backlog 0 takes one connection; fill it and later SYNs are dropped
+            listener = socket.socket()
+            listener.bind((ip, port))
+            listener.listen(0)
+            filler = socket.create_connection((ip, port), timeout=2)
+            sockets += [listener, filler]
+            silent += 1
+    threading.Thread(target=serve_devices, args=(services,), daemon=True).start()
+    return device_ips, nexus_ips, silent, sockets
+
+
+def serve_devices(services):
+    """Answer like the simulated Pis: sshd sends its banner, rpi_server answers a HELLO with its own."""
+    selector = selectors.DefaultSelector()
+    for listener, service in services.items():
+        listener.setblocking(False)
+        selector.register(listener, selectors.EVENT_READ, service)
+    while True:
+        for key, _ in selector.select():
+            sock, service = key.fileobj, key.data
+            if service in ("ssh", "nexus"):
+                try:
+                    conn, _ = sock.accept()
+                except OSError:
+                    continue
+                conn.setblocking(False)
+                if service == "ssh":
+                    conn.send(SSH_BANNER)
+                selector.register(conn, selectors.EVENT_READ, "conn-" + service)
+                continue
+            try:
+                data = sock.recv(4096)
+            except OSError:
+                data = b""
+            if data.startswith(protocol.MAGIC) and service == "conn-nexus":
+                agreed = protocol.negotiate({"version": protocol.PROTOCOL_VERSION, "features": []})
+                sock.send(protocol.MAGIC + protocol.encode_json(protocol.HELLO, agreed))
+            elif not data:
+                selector.unregister(sock)
+                sock.close()
+
+
+def slow_dns(delay):
+    """gethostbyaddr that takes delay seconds, like a DNS server with no PTR records that times out."""
+    def gethostbyaddr(ip):
+        time.sleep(delay)
+        return f"pi-{ip.replace('.', '-')}", [], [ip]
+    return gethostbyaddr
+
+
+def threaded_scan(hosts, port):
+    """The pre-asyncio NetworkScanner.scan_network, minus the hostname lookup: 50 threads, 0.5s connect_ex."""
+    found = []
+
+    def check_port(ip):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(0.5)
+        if sock.connect_ex((ip, port)) == 0:
+            found.append(ip)
+        sock.close()
+
+    with ThreadPoolExecutor(max_workers=50) as executor:
+        for ip in hosts:
+            executor.submit(check_port, ip)
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cidr", default="127.77.0.0/22")
+    parser.add_argument("--port", type=int, default=2222)
+    parser.add_argument("--silent", type=float, default=0.9, help="fraction of non-device hosts that never answer")
+    parser.add_argument("--devices", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=512)
+    parser.add_argument("--seed", type=int, default=3)
+    parser.add_argument("--dns-delay", type=float, default=1.0, help="seconds each reverse lookup takes")
+    parser.add_argument("--skip-threaded", action="store_true")
+    args = parser.parse_args()
+
+    # Three fds per silent host, plus the scanner's own (two per host when sweeping two ports)
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    needed = 3 * ipaddress.ip_network(args.cidr).num_addresses + 2 * args.concurrency + 256
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(needed, hard), hard))
+
+    network_scanner.socket.gethostbyaddr = slow_dns(args.dns_delay)
+    device_ips, nexus_ips, silent, sockets = build_lan(args.cidr, args.port, args.silent, args.devices, args.seed)
+    hosts = [str(host) for host in ipaddress.ip_network(args.cidr).hosts()]
+    print(f"{args.cidr}: {len(hosts)} hosts, {len(device_ips)} devices ({len(nexus_ips)} running Nexus), {silent} silent, "
+          f"{len(hosts) - len(device_ips) - silent} refusing, port {args.port}")
+    print(f"{'scanner':<30}{'time':>9}{'found':>8}{'missed':>8}   (reverse lookups take {args.dns_delay:g}s)")
+    try:
+        if not args.skip_threaded:
+            start = time.perf_counter()
+            found = threaded_scan(hosts, args.port)
+            elapsed = time.perf_counter() - start
+            print(f"{'threaded (50 x 0.5s)':<30}{elapsed:>8.2f}s{len(found):>8}{len(device_ips - set(found)):>8}")
+
+        scanner = AsyncScanner(args.port, concurrency=args.concurrency)
+        start = time.perf_counter()
+        found = asyncio.run(scanner.scan(args.cidr))
+        elapsed = time.perf_counter() - start
+        label = f"async ({scanner.concurrency} in flight)"
+        print(f"{label:<30}{elapsed:>8.2f}s{len(found):>8}{len(device_ips - set(found)):>8}"
+              f"   timeout settled at {scanner.rtt.timeout():.2f}s")
+
+        # Cold cache: devices are reported while their names are still being looked up
+        resolver = HostnameResolver()
+        for label in ("sweep, cold name cache", "sweep, warm name cache"):
+            reported, named = [], []
+            start = time.perf_counter()
+            scan = NetworkScanner(resolver).start_scan(
+                args.port, args.cidr, concurrency=args.concurrency,
+                on_device=lambda device: reported.append(time.perf_counter() - start),
+                on_hostname=lambda device: named.append(time.perf_counter() - start))
+            devices = list(scan)
+            elapsed = time.perf_counter() - start
+            found = {device["ip"] for device in devices}
+            names = sum(1 for device in scan.devices if device["hostname"])
+            print(f"{label:<30}{elapsed:>8.2f}s{len(found):>8}{len(device_ips - found):>8}"
+                  f"   first device after {reported[0] * 1000:.0f}ms, {names} named"
+                  + (f" (last name after {named[-1]:.2f}s)" if named else ""))
+        print(f"{'':<30}resolver: {resolver.stats}")
+
+        # Streaming: time until each known device is reported
+        reported = []
+        start = time.perf_counter()
+        scan = NetworkScanner(resolver).start_scan(
+            args.port, args.cidr, known=sorted(device_ips), concurrency=args.concurrency,
+            on_device=lambda device: reported.append(time.perf_counter() - start))
+        found = {device["ip"] for device in scan}
+        elapsed = time.perf_counter() - start
+        print(f"{'rescan, known devices first':<30}{elapsed:>8.2f}s{len(found):>8}{len(device_ips - found):>8}"
+              f"   first reported after {reported[0] * 1000:.0f}ms, all {len(reported)} after {reported[-1] * 1000:.0f}ms")
+
+        start = time.perf_counter()
+        scan = NetworkScanner(resolver).start_scan(args.port, args.cidr, concurrency=args.concurrency)
+        time.sleep(0.2)
+        scan.cancel()
+        stopped = scan.wait(5)
+        elapsed = time.perf_counter() - start
+        print(f"{'cancelled after 0.2s':<30}{elapsed:>8.2f}s{len(scan.devices):>8}{'':>8}"
+              f"   {'stopped' if stopped else 'still running'} after {scan.done}/{scan.total} hosts")
+
+        # Both ports in one pass, every open one asked what it is
+        start = time.perf_counter()
+        devices = NetworkScanner(resolver).scan_network(
+            (args.port, RPI_SERVER_PORT), args.cidr, concurrency=args.concurrency, identify=True)
+        elapsed = time.perf_counter() - start
+        found = {device["ip"] for device in devices}
+        kinds = {}
+        for device in devices:
+            kinds[device["kind"]] = kinds.get(device["kind"], 0) + 1
+        wrong = sum(1 for device in devices if ("Nexus" in device["kind"]) != (device["ip"] in nexus_ips))
+        label = f"{args.port}+{RPI_SERVER_PORT}, identified"
+        print(f"{label:<30}{elapsed:>8.2f}s{len(found):>8}{len(device_ips - found):>8}   "
+              + ", ".join(f"{count} {kind}" for kind, count in sorted(kinds.items())) + f", {wrong} misclassified")
+    finally:
+        for s in sockets:
+            s.close()
+
+
+if __name__ == "__main__":
+    main()
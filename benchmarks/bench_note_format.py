@@ -0,0 +1,172 @@
+"""
+Benchmark: legacy JSON tag-range note format vs. v2 merged runs on a 100k-character note.
+
+Measures serialized size and save/load time. Save includes reading tag ranges into the
+format and is timed on a run of edits (one character typed before each save, the way
+autosave sees them); load includes applying formatting to a Tk Text widget when a display
+is available.
+Usage: python benchmarks/bench_note_format.py [--chars 100000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+import note_format
+
+SIZES = ["12", "14", "16", "18", "20", "24", "32"]
+EDIT_ROUNDS = 20 # Saves timed after edits; the best one is reported
+
+
+def make_note(rng, chars, switch_rate):
+    """Text with short lines, and flat per-tag index tuples shaped like Text.tag_ranges output."""
+    lines = []
+    total = 0
+    while total < chars:
+        line = "".join(rng.choice("abcdefghij klmnop") for _ in range(rng.randint(20, 80)))
+        lines.append(line)
+        total += len(line) + 1
+    text = "\n".join(lines)[:chars]
+
+    # Font changes every few words; Tk keeps one range per contiguous run of a tag
+    tag_ranges = {f"font_{size}": [] for size in SIZES}
+    line_no, col = 1, 0
+    size = "14"
+    run_start = "1.0"
+    for i, ch in enumerate(text):
+        if rng.random() < switch_rate:
+            tag_ranges[f"font_{size}"] += (run_start, f"{line_no}.{col}")
+            size = rng.choice(SIZES)
+            run_start = f"{line_no}.{col}"
+        if ch == "\n":
+            line_no, col = line_no + 1, 0
+        else:
+            col += 1
+    tag_ranges[f"font_{size}"] += (run_start, f"{line_no}.{col}")
+    return text, {name: ranges for name, ranges in tag_ranges.items() if ranges}
+
+
+def edit_states(rng, text, tag_ranges, count):
+    """
+    count successive (text, tag_ranges) states, each one character typed into the one before.
+    Indexes after the insert on its line move right, like Tk's; every index string is a
+    fresh object, as Text.tag_ranges returns on each call.
+    """
+    ranges = {name: [tuple(map(int, index.split("."))) for index in indexes] for name, indexes in tag_ranges.items()}
+    line_lengths = [len(line) for line in text.split("\n")]
+    states = []
+    for _ in range(count):
+        line = rng.randrange(len(line_lengths)) + 1
+        col = rng.randint(0, line_lengths[line - 1])
+        offset = sum(line_lengths[:line - 1]) + line - 1 + col
+        text = text[:offset] + "x" + text[offset:]
+        line_lengths[line - 1] += 1
+        ranges = {name: [(l, c + 1) if l == line and c >= col else (l, c) for l, c in indexes]
+                  for name, indexes in ranges.items()}
+        states.append((text, {name: tuple(f"{l}.{c}" for l, c in indexes) for name, indexes in ranges.items()}))
+    return states
+
+
+def legacy_encode(text, tag_ranges):
+    # What save_state used to do: pair up the flat ranges, then dump them as strings
+    tags = {}
+    for name, ranges in tag_ranges.items():
+        pairs = []
+        for i in range(0, len(ranges), 2):
+            pairs.append((str(ranges[i]), str(ranges[i + 1])))
+        tags[name] = pairs
+    return json.dumps({"content": text, "tags": tags})
+
+
+def best_of(fn, rounds=5):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chars", type=int, default=100000)
+    parser.add_argument("--switch-rate", type=float, default=0.1, help="Chance per character of a font change")
+    args = parser.parse_args()
+    text, tag_ranges = make_note(random.Random(3), args.chars, args.switch_rate)
+    range_count = sum(len(r) // 2 for r in tag_ranges.values())
+
+    legacy = legacy_encode(text, tag_ranges)
+    current = note_format.encode_note(text, tag_ranges)
+    print(f"{len(text)} chars, {range_count} tag ranges")
+    print(f"  serialized size: legacy {len(legacy) / 1024:.0f} KB, v2 {len(current) / 1024:.0f} KB")
+    def cold(fn, *args):
+        note_format._last = None # Forget the previous call, as after opening another note
+        return fn(*args)
+
+    states = edit_states(random.Random(4), text, tag_ranges, EDIT_ROUNDS)
+    edits = iter(states)
+    legacy_time = best_of(lambda: legacy_encode(*next(edits)), EDIT_ROUNDS)
+    first_time = best_of(lambda: cold(note_format.encode_note, text, tag_ranges))
+    edits = iter(states)
+    print(f"  save after an edit: legacy {legacy_time:.1f} ms, "
+          f"v2 {best_of(lambda: note_format.encode_note(*next(edits)), EDIT_ROUNDS):.1f} ms "
+          f"(first save of a note {first_time:.1f} ms)")
+    print(f"  parse: legacy {best_of(lambda: json.loads(legacy)):.1f} ms, "
+          f"v2 {best_of(lambda: note_format.decode_note(current)):.1f} ms, "
+          f"legacy via decode_note {best_of(lambda: cold(note_format.decode_note, legacy)):.1f} ms")
+
+    # End to end: encode, then store through database.save_section_content (FTS + revision history).
+    # Each round saves the next edit state, so every save is a real change.
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_NAME = os.path.join(tmp, "bench.db")
+        database.init_db()
+        legacy_id = database.create_section("bench", "legacy")
+        current_id = database.create_section("bench", "v2")
+        def save(section_id, encode):
+            database.save_section_content(section_id, encode(*next(edits)))
+        edits = iter(states)
+        legacy_time = best_of(lambda: save(legacy_id, legacy_encode))
+        edits = iter(states)
+        note_format.encode_note(text, tag_ranges)
+        print(f"  save to database: legacy {legacy_time:.1f} ms, "
+              f"v2 {best_of(lambda: save(current_id, note_format.encode_note)):.1f} ms")
+        database.wait_for_compactions()
+        database.close_connection()
+
+    try:
+        import tkinter
+        root = tkinter.Tk()
+    except Exception as e:
+        print(f"  (skipping Tk load timing: {e})")
+        return
+    widget = tkinter.Text(root)
+    for size in SIZES:
+        widget.tag_config(f"font_{size}", font=("Roboto", int(size)))
+
+    def load_legacy():
+        widget.delete("1.0", "end")
+        data = json.loads(legacy)
+        widget.insert("1.0", data["content"])
+        for name, ranges in data["tags"].items():
+            for start, end in ranges:
+                widget.tag_add(name, start, end)
+
+    def load_current():
+        widget.delete("1.0", "end")
+        body, runs = note_format.decode_note(current)
+        insert_args = []
+        for chunk, size in note_format.iter_runs(body, runs):
+            insert_args.extend((chunk, (f"font_{size}",) if size else ()))
+        widget.insert("1.0", *insert_args)
+
+    print(f"  Tk load: legacy {best_of(load_legacy, 3):.1f} ms, v2 {best_of(load_current, 3):.1f} ms")
+    root.destroy()
+
+
+if __name__ == "__main__":
+    main()
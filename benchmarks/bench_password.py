@@ -0,0 +1,47 @@
+"""
+Benchmark: password hashing cost per KDF, and what calibration picks on this machine.
+
+Usage: python benchmarks/bench_password.py [--target 0.25]
+"""
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import password_utils
+
+
+def time_hash(hasher, rounds=3):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        hasher.hash("correct horse battery staple")
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--target", type=float, default=password_utils.TARGET_SECONDS)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    for _ in range(10000):
+        hashlib.sha256(b"correct horse battery staple").hexdigest()
+    print(f"legacy sha256:   {(time.perf_counter() - start) / 10000 * 1e6:.2f} us per hash (unsalted, do not use)")
+
+    hasher_classes = [password_utils.PBKDF2Hasher]
+    if hasattr(hashlib, "scrypt"):
+        hasher_classes.insert(0, password_utils.ScryptHasher)
+    for hasher_class in hasher_classes:
+        start = time.perf_counter()
+        hasher = hasher_class.calibrate(args.target)
+        calibration = time.perf_counter() - start
+        print(f"{hasher.algorithm + ':':<16} {time_hash(hasher):.0f} ms per hash with {hasher.params()} "
+              f"(calibration took {calibration:.1f}s)")
+
+    print(f"default on this machine: {password_utils.default_hasher_class().algorithm}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark: revision history cost of small edits to a 1 MB note.
+
+Reports history bytes per save, the total bytes each save writes (WAL growth after a
+checkpoint, so it includes the note's chunks and their FTS rows) and save latency.
+Runs against a scratch database in a temp directory, never against users.db.
+Usage: python benchmarks/bench_revisions.py [--size 1000000] [--saves 100]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+
+WORDS = "the quick brown fox jumps over a lazy dog while sensors report kernel network notes".split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=1000000)
+    parser.add_argument("--saves", type=int, default=100)
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    words = []
+    length = 0
+    while length < args.size:
+        word = rng.choice(WORDS) + rng.choice(["", "", "", ".", ",", "\n"])
+        words.append(word)
+        length += len(word) + 1
+    text = " ".join(words)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_NAME = os.path.join(tmp, "bench.db")
+        database.init_db()
+        database.create_section("bench", "Big note")
+        section_id = database.get_sections("bench")[0][0]
+        database.save_section_content(section_id, json.dumps({"content": text, "tags": {}}))
+
+        cursor = database.get_connection().cursor()
+        wal = database.DB_NAME + "-wal"
+        history_bytes = []
+        written_bytes = []
+        save_times = []
+        for i in range(args.saves):
+            pos = rng.randrange(len(text))
+            text = text[:pos] + f" edit {i} " + text[pos:]
+            blob = json.dumps({"content": text, "tags": {"font_16": [["1.0", f"1.{i}"]]}})
+            database.wait_for_compactions()
+            cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+            start = time.perf_counter()
+            database.save_section_content(section_id, blob)
+            save_times.append((time.perf_counter() - start) * 1000)
+            written_bytes.append(os.path.getsize(wal))
+            cursor.execute("SELECT length(data) FROM note_revisions WHERE section_id = ? ORDER BY revision DESC LIMIT 1", (section_id,))
+            history_bytes.append(cursor.fetchone()[0])
+
+        deltas = sorted(history_bytes)
+        print(f"Note size: {len(blob) / 1e6:.2f} MB, {args.saves} single-edit saves")
+        print(f"  history bytes per save: median {deltas[len(deltas) // 2]} B, "
+              f"max {deltas[-1]} B (max is a periodic full snapshot)")
+        written = sorted(written_bytes)
+        print(f"  bytes written per save: median {written[len(written) // 2] / 1e3:.0f} KB, "
+              f"max {written[-1] / 1e3:.0f} KB")
+        print(f"  save latency: median {sorted(save_times)[len(save_times) // 2]:.1f} ms, max {max(save_times):.1f} ms")
+
+        revisions = [row[0] for row in database.get_revisions(section_id)]
+        start = time.perf_counter()
+        for revision in revisions:
+            database.get_revision_content(section_id, revision)
+        per_revision = (time.perf_counter() - start) * 1000 / len(revisions)
+        print(f"  reconstruct any revision: {per_revision:.1f} ms average over {len(revisions)} revisions")
+        database.wait_for_compactions()
+        database.close_connection()
+
+
+if __name__ == "__main__":
+    main()
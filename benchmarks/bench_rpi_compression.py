@@ -0,0 +1,170 @@
+"""
+Benchmark: rpi_server responses with and without negotiated deflate over a throttled link.
+
+Starts the async server on loopback behind a proxy that limits each direction to --rate KB/s
+(roughly a congested Pi Wi-Fi link) and counts the bytes it forwards. Runs typical command
+outputs through a streaming client once with deflate offered and once without, and reports
+bytes on the wire and end-to-end latency (command sent -> EXIT received).
+Sample logs are generated into a temp directory.
+Usage: python benchmarks/bench_rpi_compression.py [--rate 1000] [--runs 3]
+"""
+import argparse
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from rpi_client import RPIConnection
+from rpi_protocol import STREAM, DEFLATE, CHUNK, EXIT, OUTPUT
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("server did not start")
+
+
+def write_samples(directory):
+    """journalctl- and dmesg-like logs with realistic repetition."""
+    rng = random.Random(7)
+    services = ["systemd[1]", "sshd[812]", "kernel", "NetworkManager[455]", "cron[390]", "dhcpcd[402]",
+                "wpa_supplicant[431]", "python3[1290]", "avahi-daemon[388]", "rsyslogd[377]"]
+    messages = [
+        "Started Session {n} of user pi.", "Accepted publickey for pi from 192.168.1.{n} port 5{n}2 ssh2",
+        "wlan0: carrier acquired", "(root) CMD (run-parts /etc/cron.hourly)", "eth0: no IPv6 routers present",
+        "Starting Daily apt download activities...", "[*] Accepted connection from 192.168.1.{n}:4{n}21",
+        "Under-voltage detected! (0x00050005)", "brcmfmac: brcmf_cfg80211_set_power_mgmt: power save enabled",
+        "Finished Clean php session files.", "pam_unix(sshd:session): session opened for user pi(uid=1000)",
+    ]
+    start = 1_700_000_000
+    with open(os.path.join(directory, "journal.log"), "w") as f:
+        for i in range(25000):
+            ts = time.strftime("%b %d %H:%M:%S", time.gmtime(start + i * 7))
+            f.write(f"{ts} raspberrypi {rng.choice(services)}: {rng.choice(messages).format(n=rng.randint(2, 254))}\n")
+    with open(os.path.join(directory, "dmesg.log"), "w") as f:
+        for i in range(4000):
+            f.write(f"[{i * 0.0137:12.6f}] {rng.choice(messages).format(n=rng.randint(2, 254))}\n")
+
+
+def throttle_proxy(listen_port, target_port, rate, counters):
+    """Forward connections to target_port, each direction limited to rate bytes/s."""
+    listener = socket.socket()
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(("127.0.0.1", listen_port))
+    listener.listen(16)
+
+    def pipe(src, dst, key):
+        try:
+            while True:
+                data = src.recv(16384)
+                if not data:
+                    break
+                counters[key] += len(data)
+                dst.sendall(data)
+                time.sleep(len(data) / rate)
+        except OSError:
+            pass
+        finally:
+            for s in (src, dst):
+                try:
+                    s.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def accept_loop():
+        while True:
+            client, _ = listener.accept()
+            upstream = socket.create_connection(("127.0.0.1", target_port))
+            for sock in (client, upstream):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=pipe, args=(client, upstream, "up"), daemon=True).start()
+            threading.Thread(target=pipe, args=(upstream, client, "down"), daemon=True).start()
+
+    threading.Thread(target=accept_loop, daemon=True).start()
+
+
+def run_command(connection, command):
+    connection.send_command(command)
+    size = 0
+    while True:
+        frame_type, value = connection.receive()
+        if frame_type == CHUNK:
+            size += len(value.encode("utf-8"))
+        elif frame_type in (EXIT, OUTPUT):
+            return size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rate", type=int, default=1000, help="link speed per direction in KB/s")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_samples(tmp)
+        commands = [
+            ("uptime", "uptime"),
+            ("ps aux", "ps aux"),
+            ("dmesg (4k lines)", f"cat {tmp}/dmesg.log"),
+            ("journalctl (25k lines)", f"cat {tmp}/journal.log"),
+            ("random base64 (400KB)", "head -c 300000 /dev/urandom | base64"),
+        ]
+
+        server_port, proxy_port = free_port(), free_port()
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "rpi_server.py"), "--host", "127.0.0.1",
+             "--port", str(server_port), "--timeout", "0"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for_port(server_port)
+            counters = {"up": 0, "down": 0}
+            throttle_proxy(proxy_port, server_port, args.rate * 1024, counters)
+
+            results = {}
+            for label, features in (("raw", (STREAM,)), ("deflate", (STREAM, DEFLATE))):
+                connection = RPIConnection("127.0.0.1", proxy_port, features=features)
+                connection.connect()
+                for name, command in commands:
+                    run_command(connection, command) # Warm-up: page cache, zlib dictionary
+                    wire, times, size = 0, [], 0
+                    for _ in range(args.runs):
+                        before = counters["down"]
+                        start = time.perf_counter()
+                        size = run_command(connection, command)
+                        times.append(time.perf_counter() - start)
+                        wire += counters["down"] - before
+                    results[(label, name)] = (size, wire / args.runs, sorted(times)[len(times) // 2])
+                connection.close()
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+    print(f"Link throttled to {args.rate} KB/s per direction, median of {args.runs} runs")
+    print(f"{'output':<24}{'size':>10}{'raw wire':>11}{'deflate wire':>14}{'ratio':>7}"
+          f"{'raw ms':>9}{'deflate ms':>12}")
+    for name, _ in commands:
+        size, raw_wire, raw_time = results[("raw", name)]
+        _, deflate_wire, deflate_time = results[("deflate", name)]
+        print(f"{name:<24}{size / 1024:>8.1f}KB{raw_wire / 1024:>9.1f}KB{deflate_wire / 1024:>12.1f}KB"
+              f"{raw_wire / max(deflate_wire, 1):>7.1f}{raw_time * 1000:>9.0f}{deflate_time * 1000:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Load test: drive rpi_server on loopback with concurrent RPIFrame-style clients.
+
+Starts the server as a subprocess, then runs --clients client threads for --duration seconds.
+Each client holds one RPIConnection (framed, streaming, deflate, like RPIFrame) and issues
+commands drawn from a weighted --mix, waiting for each reply before sending the next.
+Server RSS, thread count and CPU time are sampled from /proc while the test runs.
+
+Prints one JSON document (or writes it to --output) with throughput, p50/p95/p99 latency
+overall and per command kind, errors and server resource use, so runs can be compared over time.
+The threaded server only speaks the legacy protocol, which has no reply boundaries:
+use a mix without "large" against it. Linux only (reads /proc).
+Usage: python benchmarks/bench_rpi_load.py [--clients 20] [--duration 10]
+           [--mix echo=50,large=10,slow=10,greeting=30] [--server-arg=--workers=8] [--output run.json]
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from rpi_client import RPIConnection
+from rpi_protocol import CHUNK, EXIT, OUTPUT, ERROR
+
+# Command kinds available to --mix
+COMMANDS = {
+    "echo": ["echo hello"],
+    "large": ["seq 1 200000"], # ~1.3MB of output
+    "slow": ["sleep 0.5"],
+    "greeting": ["hello", "help"], # Answered by the server without a fork
+}
+DEFAULT_MIX = "echo=50,large=10,slow=10,greeting=30"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("server did not start")
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in COMMANDS:
+            raise SystemExit(f"unknown command kind {kind!r}, pick from {', '.join(COMMANDS)}")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def summarize(latencies):
+    ms = [latency * 1000 for latency in latencies]
+    return {
+        "count": len(ms),
+        "mean": round(sum(ms) / len(ms), 3) if ms else None,
+        "p50": round(percentile(ms, 0.50), 3) if ms else None,
+        "p95": round(percentile(ms, 0.95), 3) if ms else None,
+        "p99": round(percentile(ms, 0.99), 3) if ms else None,
+        "max": round(max(ms), 3) if ms else None,
+    }
+
+
+class ServerMonitor(threading.Thread):
+    """Samples a process's RSS, threads and CPU time from /proc."""
+
+    def __init__(self, pid, interval=0.2):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.rss = []
+        self.threads = []
+        self.running = True
+        self.clock_ticks = os.sysconf("SC_CLK_TCK")
+
+    def cpu_seconds(self):
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self.clock_ticks # utime + stime
+
+    def sample(self):
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    self.rss.append(int(line.split()[1]) / 1024)
+                elif line.startswith("Threads:"):
+                    self.threads.append(int(line.split()[1]))
+
+    def run(self):
+        while self.running:
+            try:
+                self.sample()
+            except OSError:
+                break
+            time.sleep(self.interval)
+
+
+def client_loop(index, port, mix, deadline, results, errors, seed):
+    rng = random.Random(seed + index)
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    try:
+        connection = RPIConnection("127.0.0.1", port, timeout=10)
+        connection.connect()
+    except Exception as e:
+        errors.append(f"connect: {e}")
+        return
+    try:
+        while time.time() < deadline:
+            kind = rng.choices(kinds, weights)[0]
+            command = rng.choice(COMMANDS[kind])
+            start = time.perf_counter()
+            connection.send_command(command)
+            while True:
+                frame_type, value = connection.receive()
+                if frame_type == CHUNK:
+                    continue
+                if frame_type == ERROR or (frame_type == EXIT and (value.get("error") or value.get("code"))):
+                    errors.append(f"{kind}: {value}")
+                if frame_type in (EXIT, OUTPUT, ERROR):
+                    break
+            results.append((kind, time.perf_counter() - start))
+    except Exception as e:
+        errors.append(f"{type(e).__name__}: {e}")
+    finally:
+        connection.close()
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="kind=weight,... with kinds " + ", ".join(COMMANDS))
+    parser.add_argument("--mode", choices=["async", "threaded"], default="async")
+    parser.add_argument("--server-arg", action="append", default=[], help="extra rpi_server.py argument (repeatable)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    port = free_port()
+    command = [sys.executable, os.path.join(ROOT, "rpi_server.py"), "--mode", args.mode, "--host", "127.0.0.1",
+               "--port", str(port), "--max-connections", str(args.clients + 16)] + args.server_arg
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    results, errors = [], []
+    try:
+        wait_for_port(port)
+        time.sleep(0.2)
+        monitor = ServerMonitor(server.pid)
+        cpu_before = monitor.cpu_seconds()
+        monitor.start()
+
+        start = time.time()
+        deadline = start + args.duration
+        threads = [
+            threading.Thread(target=client_loop, args=(i, port, mix, deadline, results, errors, args.seed))
+            for i in range(args.clients)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - start
+
+        monitor.running = False
+        monitor.join()
+        cpu_used = monitor.cpu_seconds() - cpu_before
+    finally:
+        server.terminate()
+        server.wait(timeout=15)
+
+    by_kind = {}
+    for kind, latency in results:
+        by_kind.setdefault(kind, []).append(latency)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": git_revision(),
+        "config": {
+            "mode": args.mode,
+            "clients": args.clients,
+            "duration_s": args.duration,
+            "mix": mix,
+            "server_args": args.server_arg,
+            "seed": args.seed,
+        },
+        "totals": {
+            "requests": len(results),
+            "errors": len(errors),
+            "elapsed_s": round(elapsed, 3),
+            "throughput_rps": round(len(results) / elapsed, 2),
+        },
+        "latency_ms": {"all": summarize([latency for _, latency in results])},
+        "server": {
+            "rss_mb_peak": round(max(monitor.rss), 2) if monitor.rss else None,
+            "rss_mb_mean": round(sum(monitor.rss) / len(monitor.rss), 2) if monitor.rss else None,
+            "threads_max": max(monitor.threads) if monitor.threads else None,
+            "cpu_seconds": round(cpu_used, 3),
+        },
+        "error_samples": errors[:10],
+    }
+    for kind in mix:
+        report["latency_ms"][kind] = summarize(by_kind.get(kind, []))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark: rpi_server threaded vs async mode under many held connections.
+
+Starts each server mode on loopback as a subprocess, opens --clients idle connections
+(a stuck or slow client), then reports how many the server is holding, its RSS and thread
+count (from /proc), virtual size (each thread reserves a stack, which is what
+runs a 32-bit Pi out of address space first), and the round-trip time of a command from one more client.
+The threaded server's listen(5) backlog drops SYNs during the burst of connects (each costs a
+1s retransmit), so its connect column grows with --clients. Linux only (reads /proc/<pid>/status).
+Usage: python benchmarks/bench_rpi_server.py [--clients 500]
+"""
+import argparse
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER = os.path.join(ROOT, "rpi_server.py")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def proc_status(pid):
+    status = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            status[key] = value.split()[0] if value.split() else ""
+    return int(status["VmRSS"]) / 1024, int(status["VmSize"]) / 1024, int(status["Threads"])
+
+
+def wait_for_port(port, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("server did not start")
+
+
+def round_trip(port, command="echo ping"):
+    start = time.perf_counter()
+    with socket.create_connection(("127.0.0.1", port), timeout=10) as s:
+        s.sendall(command.encode())
+        reply = s.recv(4096).decode()
+    return (time.perf_counter() - start) * 1000, reply.strip()
+
+
+def run_mode(mode, clients):
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, SERVER, "--mode", mode, "--host", "127.0.0.1", "--port", str(port),
+         "--max-connections", str(clients + 10)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    held = []
+    try:
+        wait_for_port(port)
+        time.sleep(0.2)
+        idle_rss, _, idle_threads = proc_status(server.pid)
+
+        start = time.perf_counter()
+        for _ in range(clients):
+            held.append(socket.create_connection(("127.0.0.1", port), timeout=10))
+        connect_time = time.perf_counter() - start
+        # Give the server time to accept everything in its backlog
+        time.sleep(1.0)
+        rss, vm, threads = proc_status(server.pid)
+        rtt, reply = round_trip(port)
+        held_count = len(os.listdir(f"/proc/{server.pid}/fd"))
+
+        return {
+            "mode": mode,
+            "idle_rss": idle_rss,
+            "rss": rss,
+            "vm": vm,
+            "threads": threads,
+            "idle_threads": idle_threads,
+            "fds": held_count,
+            "connect_s": connect_time,
+            "rtt_ms": rtt,
+            "reply": reply,
+        }
+    finally:
+        for s in held:
+            s.close()
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=500)
+    args = parser.parse_args()
+
+    # Each held connection is one fd here and one in the server
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    needed = args.clients + 64
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(needed, hard), hard))
+
+    print(f"{args.clients} idle clients held open")
+    print(f"{'mode':<10}{'RSS idle':>10}{'RSS held':>10}{'KB/client':>11}{'VM':>10}{'threads':>9}{'fds':>6}{'connect':>9}{'cmd RTT':>10}")
+    for mode in ("threaded", "async"):
+        r = run_mode(mode, args.clients)
+        per_client = (r["rss"] - r["idle_rss"]) * 1024 / args.clients
+        print(f"{r['mode']:<10}{r['idle_rss']:>8.1f}MB{r['rss']:>8.1f}MB{per_client:>11.1f}"
+              f"{r['vm']:>8.0f}MB{r['threads']:>9}{r['fds']:>6}{r['connect_s']:>8.1f}s{r['rtt_ms']:>8.1f}ms   reply={r['reply']!r}")
+
+
+if __name__ == "__main__":
+    main()
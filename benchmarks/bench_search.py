@@ -0,0 +1,72 @@
+"""
+Benchmark: database.search_notes latency on a synthetic 50k-note corpus.
+
+Runs against a scratch database in a temp directory, never against users.db.
+Usage: python benchmarks/bench_search.py [--notes 50000]
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+
+SYLLABLES = "ka ri to mu sen pa lo vi ne da ru shi mo te ga bo".split()
+
+
+def make_vocabulary(rng, size=30000):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def make_note(rng, vocabulary, weights, words=120):
+    # Zipf-like word frequencies, roughly what real prose looks like
+    text = " ".join(rng.choices(vocabulary, cum_weights=weights, k=words))
+    return json.dumps({"content": text, "tags": {"font_14": [["1.0", "1.20"]]}})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--notes", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    rng = random.Random(42)
+    vocabulary = make_vocabulary(rng)
+    weights = list(itertools.accumulate(1.0 / rank for rank in range(1, len(vocabulary) + 1)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_NAME = os.path.join(tmp, "bench.db")
+        database.init_db()
+
+        start = time.perf_counter()
+        with database.transaction(immediate=True) as cursor:
+            cursor.executemany("INSERT INTO user_notes (username, title, content) VALUES (?, ?, ?)",
+                               ((f"user{i % 5}", f"Note {i}", make_note(rng, vocabulary, weights)) for i in range(args.notes)))
+        print(f"Indexed {args.notes} notes in {time.perf_counter() - start:.1f}s")
+
+        # Whole words and as-you-type prefixes, drawn from the same distribution as the notes
+        queries = []
+        for _ in range(args.queries):
+            word = rng.choices(vocabulary, cum_weights=weights)[0]
+            queries.append(word if rng.random() < 0.5 else word[:max(3, len(word) - 2)])
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            database.search_notes("user0", query)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        print(f"search_notes over {len(queries)} queries: "
+              f"p50 {timings[len(timings) // 2]:.2f} ms, p95 {timings[int(len(timings) * 0.95)]:.2f} ms, "
+              f"max {timings[-1]:.2f} ms")
+        database.close_connection()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark: init_db cost at startup on a database with many legacy 'notes' rows.
+
+Compares the old behaviour (full legacy scan plus a lookup per row on every launch)
+with the versioned one-shot migration. Runs against scratch databases in a temp directory.
+Usage: python benchmarks/bench_startup.py [--rows 20000]
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+
+
+def make_legacy_db(path, rows):
+    """Schema as it was before versioned migrations, plus a populated legacy notes table."""
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, username TEXT UNIQUE NOT NULL,
+            gmail TEXT NOT NULL, password_hash TEXT NOT NULL, rpi_enabled INTEGER DEFAULT 0,
+            rpi_ip TEXT, rpi_user TEXT, rpi_pass TEXT, rpi_port INTEGER DEFAULT 5000
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE user_notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT NOT NULL, title TEXT NOT NULL,
+            content TEXT, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(username) REFERENCES users(username)
+        )
+    ''')
+    conn.execute("CREATE TABLE notes (username TEXT, content TEXT)")
+    conn.executemany("INSERT INTO notes VALUES (?, ?)", ((f"user{i}", f"old note {i}") for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+def legacy_migrate(path):
+    """The pre-versioning migrate_legacy_notes, run by every init_db."""
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='notes'")
+    if cursor.fetchone():
+        cursor.execute("SELECT username, content FROM notes")
+        for username, content in cursor.fetchall():
+            if content:
+                cursor.execute("SELECT id FROM user_notes WHERE username = ? AND title = 'General'", (username,))
+                if not cursor.fetchone():
+                    cursor.execute("INSERT INTO user_notes (username, title, content) VALUES (?, 'General', ?)", (username, content))
+        conn.commit()
+    conn.close()
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        template = os.path.join(tmp, "template.db")
+        make_legacy_db(template, args.rows)
+
+        old_db = os.path.join(tmp, "old.db")
+        shutil.copy(template, old_db)
+        first = timed(lambda: legacy_migrate(old_db))
+        later = timed(lambda: legacy_migrate(old_db))
+        print(f"Old per-launch scan, {args.rows} legacy rows:")
+        print(f"  first launch {first:.0f} ms, every later launch {later:.0f} ms")
+
+        new_db = os.path.join(tmp, "new.db")
+        shutil.copy(template, new_db)
+        database.DB_NAME = new_db
+        first = timed(database.init_db)
+        later = timed(database.init_db)
+        database.close_connection()
+        print("Versioned one-shot migration (whole init_db, including the FTS backfill):")
+        print(f"  first launch {first:.0f} ms, every later launch {later:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
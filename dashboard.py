@@ -3,6 +3,7 @@ from tkinter import messagebox
 from config import *
 from frames.chatbot import ChatbotFrame
 from frames.rpi import RPIFrame
+from frames.fleet import FleetFrame
 from frames.notes import NotesFrame
 from frames.system import SystemFrame
 from frames.settings import SettingsFrame
@@ -18,20 +19,21 @@ class MainView(ctk.CTkFrame):
         # Sidebar
         self.sidebar = ctk.CTkFrame(self, width=240, corner_radius=0, fg_color=COLOR_SIDEBAR)
         self.sidebar.grid(row=0, column=0, sticky="nsew")
-        self.sidebar.grid_rowconfigure(6, weight=1)
+        self.sidebar.grid_rowconfigure(7, weight=1)
 
         self.logo_label = ctk.CTkLabel(self.sidebar, text="AI CONTROL", font=FONT_HEADER)
         self.logo_label.grid(row=0, column=0, padx=20, pady=(40, 30))
 
         self.chatbot_btn = self.create_nav_btn("CHATBOT", self.show_chatbot, 1)
         self.rpi_btn = self.create_nav_btn("RPI CONTROL", self.show_rpi, 2)
-        self.notes_btn = self.create_nav_btn("MY NOTES", self.show_notes, 3)
-        self.system_btn = self.create_nav_btn("SYSTEM INFO", self.show_system, 4)
-        self.settings_btn = self.create_nav_btn("SETTINGS", self.show_settings, 5)
+        self.fleet_btn = self.create_nav_btn("FLEET", self.show_fleet, 3)
+        self.notes_btn = self.create_nav_btn("MY NOTES", self.show_notes, 4)
+        self.system_btn = self.create_nav_btn("SYSTEM INFO", self.show_system, 5)
+        self.settings_btn = self.create_nav_btn("SETTINGS", self.show_settings, 6)
 
         # Account Section
         self.account_frame = ctk.CTkFrame(self.sidebar, fg_color="transparent")
-        self.account_frame.grid(row=7, column=0, padx=20, pady=30, sticky="s")
+        self.account_frame.grid(row=8, column=0, padx=20, pady=30, sticky="s")
         
         self.account_icon = ctk.CTkLabel(self.account_frame, text="👤", font=("Arial", 36))
         self.account_icon.pack()
@@ -46,12 +48,13 @@ class MainView(ctk.CTkFrame):
 
         self.chatbot_frame = ChatbotFrame(self.content_area)
         self.rpi_frame = RPIFrame(self.content_area)
+        self.fleet_frame = FleetFrame(self.content_area)
         self.notes_frame = NotesFrame(self.content_area, self.master)
         self.system_frame = SystemFrame(self.content_area)
         self.settings_frame = SettingsFrame(self.content_area, self.logout_callback, self.system_frame, self.notes_frame)
 
-        self.frames = [self.chatbot_frame, self.rpi_frame, self.notes_frame, self.system_frame, self.settings_frame]
-        self.buttons = [self.chatbot_btn, self.rpi_btn, self.notes_btn, self.system_btn, self.settings_btn]
+        self.frames = [self.chatbot_frame, self.rpi_frame, self.fleet_frame, self.notes_frame, self.system_frame, self.settings_frame]
+        self.buttons = [self.chatbot_btn, self.rpi_btn, self.fleet_btn, self.notes_btn, self.system_btn, self.settings_btn]
 
         self.current_frame = None
         self.show_chatbot()
@@ -68,6 +71,7 @@ class MainView(ctk.CTkFrame):
         username = user_info.get("username", "User")
         self.account_name.configure(text=username)
         self.notes_frame.set_user(username)
+        self.fleet_frame.set_user(username)
         self.settings_frame.set_user_info(user_info, self.update_rpi_info)
         
         if not user_info.get("rpi_enabled", False):
@@ -84,6 +88,7 @@ class MainView(ctk.CTkFrame):
     def update_rpi_info(self, ip, user, pwd, port):
         """Callback from settings to update RPI info in the current session."""
         self.rpi_frame.set_rpi_info(ip, user, pwd, port)
+        self.fleet_frame.load_devices() # The account's Pi is saved to the inventory too
 
     def switch_frame(self, frame_to_show, active_btn):
         # Auto-save previous frame if supported
@@ -133,6 +138,10 @@ class MainView(ctk.CTkFrame):
     def show_rpi(self):
         self.switch_frame(self.rpi_frame, self.rpi_btn)
 
+    def show_fleet(self):
+        self.switch_frame(self.fleet_frame, self.fleet_btn)
+        self.fleet_frame.load_devices()
+
     def show_notes(self):
         self.switch_frame(self.notes_frame, self.notes_btn)
         self.notes_frame.load_notes()
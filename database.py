@@ -1,180 +1,1041 @@
 import sqlite3
-import hashlib
+import threading
+import gzip
+import io
+import itertools
+import json
+import re
+from contextlib import contextmanager
+import delta_utils
+import password_utils
 
 DB_NAME = "users.db"
+BUSY_TIMEOUT = 5.0 # Seconds to wait on a locked database before giving up
+
+# --- Connection Management ---
+# Each thread keeps one long-lived connection instead of reconnecting per call.
+# Connections run in autocommit mode; transactions are opened explicitly by transaction().
+_local = threading.local()
+
+def _open_connection(db_name):
+    conn = sqlite3.connect(db_name, timeout=BUSY_TIMEOUT, isolation_level=None)
+    conn.execute(f"PRAGMA busy_timeout = {int(BUSY_TIMEOUT * 1000)}")
+    conn.execute("PRAGMA journal_mode = WAL")
+    # WAL only needs an fsync at checkpoint time with synchronous=NORMAL
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+def get_connection():
+    """Return this thread's connection, opening it on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "db_name", None) != DB_NAME:
+        # DB_NAME changed (e.g. benchmarks pointing at a scratch file), reconnect
+        if getattr(_local, "db_name", None) is not None:
+            invalidate_section_cache()
+        close_connection()
+        conn = _open_connection(DB_NAME)
+        _local.conn = conn
+        _local.db_name = DB_NAME
+        _local.depth = 0
+    return conn
+
+def close_connection():
+    """Close this thread's connection, if any."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+    _local.conn = None
+    _local.db_name = None
+    _local.depth = 0
+
+@contextmanager
+def transaction(immediate=False):
+    """
+    Yield a cursor inside a transaction on this thread's connection.
+    Commits on success, rolls back on error. Nested calls join the outer transaction.
+    Use immediate=True for writes to take the write lock up front.
+    """
+    conn = get_connection()
+    if _local.depth > 0:
+        _local.depth += 1
+        try:
+            yield conn.cursor()
+        finally:
+            _local.depth -= 1
+        return
+
+    conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    _local.depth = 1
+    try:
+        yield conn.cursor()
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    else:
+        conn.execute("COMMIT")
+    finally:
+        _local.depth = 0
 
 def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    with transaction(immediate=True) as cursor:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                username TEXT UNIQUE NOT NULL,
+                gmail TEXT NOT NULL,
+                password_hash TEXT NOT NULL,
+                rpi_enabled INTEGER DEFAULT 0,
+                rpi_ip TEXT,
+                rpi_user TEXT,
+                rpi_pass TEXT,
+                rpi_port INTEGER DEFAULT 5000
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_notes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL,
+                title TEXT NOT NULL,
+                content TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY(username) REFERENCES users(username)
+            )
+        ''')
+    run_migrations()
+
+# --- Schema Migrations ---
+# Each migration runs once, in order, and bumps PRAGMA user_version to its position in MIGRATIONS.
+# Never edit or reorder an existing migration; append a new one instead.
+
+def _column_exists(cursor, table, column):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return any(row[1] == column for row in cursor.fetchall())
+
+def _migrate_add_rpi_port(cursor):
+    """Databases created before rpi_port existed."""
+    if not _column_exists(cursor, "users", "rpi_port"):
+        cursor.execute("ALTER TABLE users ADD COLUMN rpi_port INTEGER DEFAULT 5000")
+
+def _migrate_user_notes_indexes(cursor):
+    """Serve get_sections from an index scan instead of a table scan plus sort."""
+    # Includes title so the section listing never has to touch the (large) content rows
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_notes_username_updated ON user_notes (username, updated_at DESC, title)")
+
+# Plain text of a note: the "content" field of the rich-text JSON blob, or the raw value for legacy plain text
+_NOTE_TEXT_SQL = "CASE WHEN json_valid({col}) AND json_type({col}, '$.content') = 'text' THEN json_extract({col}, '$.content') ELSE {col} END"
+
+def _migrate_notes_fts(cursor):
+    """Full-text index over note titles and bodies, kept in sync with user_notes by triggers."""
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+            title, body, username UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3 4'
+        )
+    ''')
+    new_text = _NOTE_TEXT_SQL.format(col="new.content")
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS user_notes_fts_insert AFTER INSERT ON user_notes BEGIN
+            INSERT INTO notes_fts (rowid, title, body, username) VALUES (new.id, new.title, {new_text}, new.username);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS user_notes_fts_delete AFTER DELETE ON user_notes BEGIN
+            DELETE FROM notes_fts WHERE rowid = old.id;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS user_notes_fts_update AFTER UPDATE OF title, content, username ON user_notes BEGIN
+            DELETE FROM notes_fts WHERE rowid = old.id;
+            INSERT INTO notes_fts (rowid, title, body, username) VALUES (new.id, new.title, {new_text}, new.username);
+        END
+    ''')
+    cursor.execute("DELETE FROM notes_fts")
+    cursor.execute(f"INSERT INTO notes_fts (rowid, title, body, username) SELECT id, title, {_NOTE_TEXT_SQL.format(col='content')}, username FROM user_notes")
+
+def _migrate_note_revisions(cursor):
+    """Save history: a full snapshot every few revisions, compact deltas in between."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS note_revisions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            section_id INTEGER NOT NULL,
+            revision INTEGER NOT NULL,
+            is_snapshot INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(section_id, revision)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS user_notes_revisions_delete AFTER DELETE ON user_notes BEGIN
+            DELETE FROM note_revisions WHERE section_id = old.id;
+        END
+    ''')
+
+def _migrate_app_settings(cursor):
+    """Small key/value store for app-wide settings (e.g. calibrated KDF cost)."""
+    cursor.execute("CREATE TABLE IF NOT EXISTS app_settings (key TEXT PRIMARY KEY, value TEXT)")
+
+def _migrate_user_notes_size(cursor):
+    """Store content size next to the listing columns so the section index never reads note bodies."""
+    # A plain column kept up to date by the writers: SQLite won't serve a generated column from an index
+    if not _column_exists(cursor, "user_notes", "size"):
+        cursor.execute("ALTER TABLE user_notes ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("UPDATE user_notes SET size = length(content) WHERE content IS NOT NULL")
+    cursor.execute("DROP INDEX IF EXISTS idx_user_notes_username_updated")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_notes_listing ON user_notes (username, updated_at DESC, title, size)")
+
+def _migrate_legacy_notes(cursor):
+    """Copy notes from the old single-note 'notes' table into a 'General' section, once."""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='notes'")
+    if not cursor.fetchone():
+        return
+    # One set-based statement instead of a lookup per row; first non-empty note per user,
+    # skipping users that already have a 'General' section. The old table is kept for safety.
+    cursor.execute('''
+        INSERT INTO user_notes (username, title, content, size)
+        SELECT n.username, 'General', n.content, length(n.content)
+        FROM notes n
+        WHERE n.rowid IN (
+            SELECT MIN(rowid) FROM notes WHERE content IS NOT NULL AND content != '' GROUP BY username
+        )
+        AND NOT EXISTS (
+            SELECT 1 FROM user_notes u WHERE u.username = n.username AND u.title = 'General'
+        )
+    ''')
+
+def _migrate_rpi_devices(cursor):
+    """Inventory of Pis per user, seeded with each user's configured Pi."""
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
+        CREATE TABLE IF NOT EXISTS rpi_devices (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL,
             name TEXT NOT NULL,
-            username TEXT UNIQUE NOT NULL,
-            gmail TEXT NOT NULL,
-            password_hash TEXT NOT NULL,
-            rpi_enabled INTEGER DEFAULT 0,
-            rpi_ip TEXT,
+            ip TEXT NOT NULL,
+            port INTEGER NOT NULL DEFAULT 5000,
             rpi_user TEXT,
             rpi_pass TEXT,
-            rpi_port INTEGER DEFAULT 5000
+            group_name TEXT NOT NULL DEFAULT '',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(username, ip, port),
+            FOREIGN KEY(username) REFERENCES users(username)
         )
     ''')
-    try:
-        cursor.execute("ALTER TABLE users ADD COLUMN rpi_port INTEGER DEFAULT 5000")
-        conn.commit()
-    except sqlite3.OperationalError:
-        pass
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_notes (
+        INSERT OR IGNORE INTO rpi_devices (username, name, ip, port, rpi_user, rpi_pass)
+        SELECT username, rpi_ip, rpi_ip, COALESCE(rpi_port, 5000), rpi_user, rpi_pass
+        FROM users WHERE rpi_ip IS NOT NULL AND rpi_ip != ''
+    ''')
+
+def _migrate_devices(cursor):
+    """Hosts found by network scans, so a rescan can start from what was seen before."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS devices (
+            ip TEXT PRIMARY KEY,
+            mac TEXT,
+            hostname TEXT,
+            open_ports TEXT NOT NULL DEFAULT '[]',
+            first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_devices_last_seen ON devices (last_seen DESC)")
+
+def _migrate_device_kind(cursor):
+    """What the last scan made of a device ("SSH only", "Nexus server running", ...)."""
+    if not _column_exists(cursor, "devices", "kind"):
+        cursor.execute("ALTER TABLE devices ADD COLUMN kind TEXT")
+
+def _migrate_note_chunks(cursor):
+    """Large notes stored in chunks, so a save writes and re-indexes only the chunks an edit touched."""
+    # Chunked notes have content NULL and chunks = their manifest (see CHUNKED_NOTE_SIZE)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS note_chunks (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL,
-            title TEXT NOT NULL,
-            content TEXT,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(username) REFERENCES users(username)
+            section_id INTEGER NOT NULL,
+            data TEXT NOT NULL
         )
     ''')
-    conn.commit()
-    conn.close()
-    migrate_legacy_notes()
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_note_chunks_section ON note_chunks (section_id)")
+    if not _column_exists(cursor, "user_notes", "chunks"):
+        cursor.execute("ALTER TABLE user_notes ADD COLUMN chunks TEXT")
+    # Lets search_notes skip grouping hits by section for users with no chunked notes
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_notes_chunked ON user_notes (username) WHERE chunks IS NOT NULL")
+
+    # notes_fts gains section_id: a note's own row (rowid = note id) holds its title and, unless
+    # chunked, its body; each current chunk has a body-only row with rowid = -chunk id
+    for trigger in ("user_notes_fts_insert", "user_notes_fts_delete", "user_notes_fts_update"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    cursor.execute("DROP TABLE IF EXISTS notes_fts")
+    cursor.execute('''
+        CREATE VIRTUAL TABLE notes_fts USING fts5(
+            title, body, username UNINDEXED, section_id UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3 4'
+        )
+    ''')
+    new_text = _NOTE_TEXT_SQL.format(col="new.content")
+    cursor.execute(f'''
+        CREATE TRIGGER user_notes_fts_insert AFTER INSERT ON user_notes BEGIN
+            INSERT INTO notes_fts (rowid, title, body, username, section_id) VALUES (new.id, new.title, {new_text}, new.username, new.id);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER user_notes_fts_delete AFTER DELETE ON user_notes BEGIN
+            DELETE FROM notes_fts WHERE rowid = old.id;
+            DELETE FROM notes_fts WHERE rowid IN (SELECT -value FROM json_each(old.chunks, '$.ids'));
+            DELETE FROM note_chunks WHERE section_id = old.id;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER user_notes_fts_update AFTER UPDATE OF title, content, username ON user_notes BEGIN
+            DELETE FROM notes_fts WHERE rowid = old.id;
+            INSERT INTO notes_fts (rowid, title, body, username, section_id) VALUES (new.id, new.title, {new_text}, new.username, new.id);
+        END
+    ''')
+    cursor.execute(f"INSERT INTO notes_fts (rowid, title, body, username, section_id) SELECT id, title, {_NOTE_TEXT_SQL.format(col='content')}, username, id FROM user_notes")
+
+MIGRATIONS = [
+    _migrate_add_rpi_port,
+    _migrate_user_notes_indexes,
+    _migrate_notes_fts,
+    _migrate_note_revisions,
+    _migrate_app_settings,
+    _migrate_user_notes_size,
+    _migrate_legacy_notes,
+    _migrate_rpi_devices,
+    _migrate_devices,
+    _migrate_device_kind,
+    _migrate_note_chunks,
+]
+
+def get_schema_version():
+    with transaction() as cursor:
+        cursor.execute("PRAGMA user_version")
+        return cursor.fetchone()[0]
+
+def run_migrations():
+    """Apply any migrations newer than the database's user_version."""
+    with transaction(immediate=True) as cursor:
+        cursor.execute("PRAGMA user_version")
+        version = cursor.fetchone()[0]
+        for index, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            migration(cursor)
+            # user_version is transactional, so a failed migration leaves it untouched
+            cursor.execute(f"PRAGMA user_version = {index}")
+
+def get_setting(key, default=None):
+    with transaction() as cursor:
+        cursor.execute("SELECT value FROM app_settings WHERE key = ?", (key,))
+        row = cursor.fetchone()
+    return json.loads(row[0]) if row else default
+
+def set_setting(key, value):
+    with transaction(immediate=True) as cursor:
+        cursor.execute("INSERT OR REPLACE INTO app_settings (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+# --- Password Hashing ---
+# The KDF and its cost are calibrated once per database to ~password_utils.TARGET_SECONDS
+# and stored in app_settings, so every hash on this machine uses the same parameters.
+# These calls are deliberately slow: run them off the Tk thread.
+
+_hasher = None
+_hasher_lock = threading.Lock()
+
+def get_password_hasher():
+    global _hasher
+    with _hasher_lock:
+        if _hasher is None:
+            config = get_setting("password_hasher")
+            if config and config.get("algorithm") in password_utils.HASHERS:
+                _hasher = password_utils.hasher_from_params(config["algorithm"], config["params"])
+            else:
+                _hasher = password_utils.default_hasher_class().calibrate()
+                set_setting("password_hasher", {"algorithm": _hasher.algorithm, "params": _hasher.params()})
+        return _hasher
 
 def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+    return get_password_hasher().hash(password)
 
 def register_user(name, username, gmail, password, rpi_enabled=0, rpi_ip=None, rpi_user=None, rpi_pass=None, rpi_port=5000):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
     try:
         password_hash = hash_password(password)
-        cursor.execute("INSERT INTO users (name, username, gmail, password_hash, rpi_enabled, rpi_ip, rpi_user, rpi_pass, rpi_port) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", 
-                       (name, username, gmail, password_hash, int(rpi_enabled), rpi_ip, rpi_user, rpi_pass, rpi_port))
-        conn.commit()
+        with transaction(immediate=True) as cursor:
+            cursor.execute("INSERT INTO users (name, username, gmail, password_hash, rpi_enabled, rpi_ip, rpi_user, rpi_pass, rpi_port) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", 
+                           (name, username, gmail, password_hash, int(rpi_enabled), rpi_ip, rpi_user, rpi_pass, rpi_port))
+            if rpi_ip:
+                _remember_device(cursor, username, rpi_ip, rpi_port, rpi_user, rpi_pass)
         return True
     except sqlite3.IntegrityError:
         return False
-    finally:
-        conn.close()
 
 def user_exists(username):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT 1 FROM users WHERE username = ?", (username,))
-    exists = cursor.fetchone() is not None
-    conn.close()
-    return exists
+    with transaction() as cursor:
+        cursor.execute("SELECT 1 FROM users WHERE username = ?", (username,))
+        return cursor.fetchone() is not None
 
 def update_user_rpi_info(username, rpi_ip, rpi_user, rpi_pass, rpi_port=5000):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
     try:
-        cursor.execute("UPDATE users SET rpi_ip = ?, rpi_user = ?, rpi_pass = ?, rpi_port = ? WHERE username = ?", 
-                       (rpi_ip, rpi_user, rpi_pass, rpi_port, username))
-        conn.commit()
+        with transaction(immediate=True) as cursor:
+            cursor.execute("UPDATE users SET rpi_ip = ?, rpi_user = ?, rpi_pass = ?, rpi_port = ? WHERE username = ?", 
+                           (rpi_ip, rpi_user, rpi_pass, rpi_port, username))
+            if rpi_ip:
+                _remember_device(cursor, username, rpi_ip, rpi_port, rpi_user, rpi_pass)
         return True
     except Exception as e:
         print(f"Update RPI info error: {e}")
         return False
-    finally:
-        conn.close()
 
 def login_user(username, password):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    password_hash = hash_password(password)
-    cursor.execute("SELECT name, username, gmail, rpi_enabled, rpi_ip, rpi_user, rpi_pass, rpi_port FROM users WHERE username = ? AND password_hash = ?", (username, password_hash))
-    user = cursor.fetchone()
-    conn.close()
-    
-    if user:
-        return {
-            "name": user[0],
-            "username": user[1],
-            "gmail": user[2],
-            "rpi_enabled": bool(user[3]),
-            "rpi_ip": user[4],
-            "rpi_user": user[5],
-            "rpi_pass": user[6],
-            "rpi_port": user[7]
-        }
-    return None
-
-def migrate_legacy_notes():
-    """Migrate data from old 'notes' table to 'user_notes' if it exists."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    # Check if old table exists
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='notes'")
-    if cursor.fetchone():
-        try:
-            cursor.execute("SELECT username, content FROM notes")
-            old_notes = cursor.fetchall()
-            
-            for username, content in old_notes:
-                if content:
-                    # Check if already migrated (avoid duplicates if run multiple times)
-                    cursor.execute("SELECT id FROM user_notes WHERE username = ? AND title = 'General'", (username,))
-                    if not cursor.fetchone():
-                        cursor.execute("INSERT INTO user_notes (username, title, content) VALUES (?, 'General', ?)", (username, content))
-            
-            conn.commit()
-            # Optionally drop old table, but keeping it for safety for now
-            # cursor.execute("DROP TABLE notes") 
-        except Exception as e:
-            print(f"Migration error: {e}")
-            
-    conn.close()
+    with transaction() as cursor:
+        cursor.execute("SELECT name, username, gmail, rpi_enabled, rpi_ip, rpi_user, rpi_pass, rpi_port, password_hash FROM users WHERE username = ?", (username,))
+        user = cursor.fetchone()
+
+    hasher = get_password_hasher()
+    if not user:
+        # Spend the same time as a real check so response time doesn't reveal which usernames exist
+        hasher.hash(password)
+        return None
+
+    matches, needs_rehash = password_utils.verify_password(password, user[8], hasher)
+    if not matches:
+        return None
+    if needs_rehash:
+        # Transparently upgrade legacy SHA-256 (or outdated cost) hashes
+        new_hash = hasher.hash(password)
+        with transaction(immediate=True) as cursor:
+            cursor.execute("UPDATE users SET password_hash = ? WHERE username = ?", (new_hash, username))
+
+    return {
+        "name": user[0],
+        "username": user[1],
+        "gmail": user[2],
+        "rpi_enabled": bool(user[3]),
+        "rpi_ip": user[4],
+        "rpi_user": user[5],
+        "rpi_pass": user[6],
+        "rpi_port": user[7]
+    }
+
+# --- RPi Device Inventory ---
+# Every Pi a user manages. The Pi configured on the account (users.rpi_ip) is kept in here too.
+
+DEVICE_COLUMNS = ("id", "name", "ip", "port", "rpi_user", "rpi_pass", "group_name")
+
+def _remember_device(cursor, username, ip, port, rpi_user, rpi_pass):
+    cursor.execute('''
+        INSERT INTO rpi_devices (username, name, ip, port, rpi_user, rpi_pass) VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(username, ip, port) DO UPDATE SET rpi_user = excluded.rpi_user, rpi_pass = excluded.rpi_pass
+    ''', (username, ip, ip, port or 5000, rpi_user, rpi_pass))
+
+def get_devices(username, group=None):
+    """Return the user's devices as dicts, optionally only one group, ordered by group and name."""
+    query = f"SELECT {', '.join(DEVICE_COLUMNS)} FROM rpi_devices WHERE username = ?"
+    params = [username]
+    if group is not None:
+        query += " AND group_name = ?"
+        params.append(group)
+    with transaction() as cursor:
+        cursor.execute(query + " ORDER BY group_name, name COLLATE NOCASE", params)
+        return [dict(zip(DEVICE_COLUMNS, row)) for row in cursor.fetchall()]
+
+def get_device_groups(username):
+    with transaction() as cursor:
+        cursor.execute("SELECT DISTINCT group_name FROM rpi_devices WHERE username = ? AND group_name != '' ORDER BY group_name", (username,))
+        return [row[0] for row in cursor.fetchall()]
+
+def add_device(username, name, ip, port=5000, rpi_user=None, rpi_pass=None, group_name=""):
+    """Returns the new device id, or None if the user already has a device at ip:port."""
+    try:
+        with transaction(immediate=True) as cursor:
+            cursor.execute("INSERT INTO rpi_devices (username, name, ip, port, rpi_user, rpi_pass, group_name) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                           (username, name or ip, ip, port or 5000, rpi_user, rpi_pass, group_name or ""))
+            return cursor.lastrowid
+    except sqlite3.IntegrityError:
+        return None
+
+def update_device(device_id, **fields):
+    fields = {key: value for key, value in fields.items() if key in DEVICE_COLUMNS and key != "id"}
+    if not fields:
+        return
+    assignments = ", ".join(f"{key} = ?" for key in fields)
+    with transaction(immediate=True) as cursor:
+        cursor.execute(f"UPDATE rpi_devices SET {assignments} WHERE id = ?", (*fields.values(), device_id))
+
+def delete_device(device_id):
+    with transaction(immediate=True) as cursor:
+        cursor.execute("DELETE FROM rpi_devices WHERE id = ?", (device_id,))
+
+# --- Discovered Devices ---
+# What network scans have seen, shared by all users of this machine. open_ports is a JSON list.
+
+def get_discovered_devices(port=None):
+    """Devices seen by earlier scans (with port open, if given), most recently seen first."""
+    query = "SELECT ip, mac, hostname, open_ports, kind, last_seen FROM devices"
+    params = ()
+    if port is not None:
+        query += " WHERE EXISTS (SELECT 1 FROM json_each(devices.open_ports) WHERE value = ?)"
+        params = (port,)
+    with transaction() as cursor:
+        cursor.execute(query + " ORDER BY last_seen DESC", params)
+        rows = cursor.fetchall()
+    return [{"ip": ip, "mac": mac, "hostname": hostname, "open_ports": json.loads(ports), "kind": kind,
+             "last_seen": last_seen} for ip, mac, hostname, ports, kind, last_seen in rows]
+
+def save_discovered_devices(devices, port=None):
+    """
+    Record scan hits ({"ip", "hostname", "mac"} dicts, plus "open_ports" and "kind" from
+    multi-port scans) as seen now. Devices without open_ports are recorded with port open.
+    """
+    with transaction(immediate=True) as cursor:
+        for device in devices:
+            hostname = device.get("hostname")
+            if hostname == "Unknown":
+                hostname = None # Keep a name we resolved before
+            cursor.execute('''
+                INSERT INTO devices (ip, mac, hostname, kind) VALUES (?, ?, ?, ?)
+                ON CONFLICT(ip) DO UPDATE SET
+                    mac = COALESCE(excluded.mac, devices.mac),
+                    hostname = COALESCE(excluded.hostname, devices.hostname),
+                    kind = COALESCE(excluded.kind, devices.kind),
+                    last_seen = CURRENT_TIMESTAMP
+            ''', (device["ip"], device.get("mac"), hostname, device.get("kind")))
+            for open_port in device.get("open_ports") or [port]:
+                cursor.execute('''
+                    UPDATE devices SET open_ports = json_insert(open_ports, '$[#]', ?)
+                    WHERE ip = ? AND NOT EXISTS (SELECT 1 FROM json_each(devices.open_ports) WHERE value = ?)
+                ''', (open_port, device["ip"], open_port))
 
 # --- Section Based Notes API ---
 
+# Per-user section index: username -> [[id, title, updated_at, size], ...] newest first.
+# Filled on first get_sections and kept coherent by every function here that changes sections,
+# so re-opening the notes tab costs no SQL. Writes from another process are not seen.
+_section_cache = {}
+_section_cache_lock = threading.Lock()
+_section_cache_stats = {"hits": 0, "misses": 0}
+
+def get_section_index(username):
+    """Return the user's sections as (id, title, updated_at, size) tuples, newest first."""
+    with _section_cache_lock:
+        entries = _section_cache.get(username)
+        if entries is not None:
+            _section_cache_stats["hits"] += 1
+            return [tuple(entry) for entry in entries]
+        _section_cache_stats["misses"] += 1
+
+    with transaction() as cursor:
+        cursor.execute("SELECT id, title, updated_at, size FROM user_notes WHERE username = ? ORDER BY updated_at DESC", (username,))
+        rows = cursor.fetchall()
+    with _section_cache_lock:
+        _section_cache[username] = [list(row) for row in rows]
+    return rows
+
 def get_sections(username):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, title, updated_at FROM user_notes WHERE username = ? ORDER BY updated_at DESC", (username,))
-    sections = cursor.fetchall()
-    conn.close()
-    return sections
+    return [(sec_id, title, updated) for sec_id, title, updated, _ in get_section_index(username)]
+
+def get_section_cache_stats():
+    with _section_cache_lock:
+        return dict(_section_cache_stats, users=len(_section_cache))
+
+def invalidate_section_cache(username=None):
+    """Drop cached section indexes (all users if username is None)."""
+    with _section_cache_lock:
+        if username is None:
+            _section_cache.clear()
+        else:
+            _section_cache.pop(username, None)
+
+def _cache_put_section(username, row):
+    """Insert or move a section to the front of its user's cached index."""
+    with _section_cache_lock:
+        entries = _section_cache.get(username)
+        if entries is None:
+            return
+        entries[:] = [entry for entry in entries if entry[0] != row[0]]
+        entries.insert(0, list(row))
+
+def _cache_remove_section(section_id):
+    with _section_cache_lock:
+        for entries in _section_cache.values():
+            entries[:] = [entry for entry in entries if entry[0] != section_id]
 
 def create_section(username, title):
-    """Create a new note section."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO user_notes (username, title, content) VALUES (?, ?, '')", (username, title))
-    conn.commit()
-    conn.close()
+    """Create a new note section. Returns its id."""
+    with transaction(immediate=True) as cursor:
+        cursor.execute("INSERT INTO user_notes (username, title, content) VALUES (?, ?, '')", (username, title))
+        section_id = cursor.lastrowid
+        cursor.execute("SELECT id, title, updated_at, size FROM user_notes WHERE id = ?", (section_id,))
+        row = cursor.fetchone()
+    _cache_put_section(username, row)
+    return section_id
 
 def delete_section(section_id):
     """Delete a note section."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM user_notes WHERE id = ?", (section_id,))
-    conn.commit()
-    conn.close()
+    with transaction(immediate=True) as cursor:
+        cursor.execute("DELETE FROM user_notes WHERE id = ?", (section_id,))
+    _cache_remove_section(section_id)
 
 def delete_all_sections(username):
     """Delete all note sections for a user."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM user_notes WHERE username = ?", (username,))
-    conn.commit()
-    conn.close()
+    with transaction(immediate=True) as cursor:
+        cursor.execute("DELETE FROM user_notes WHERE username = ?", (username,))
+    with _section_cache_lock:
+        _section_cache[username] = []
+
+# Notes this large are stored in chunks (note_chunks) instead of user_notes.content, so a
+# save writes and re-indexes only the chunks it changed rather than the whole note. The
+# manifest in user_notes.chunks is {"head", "tail", "escaped", "ids"}: the content is head,
+# then the chunks in order, then tail. For rich-text notes the chunks split the JSON string
+# literal of the "content" field ("escaped"), so they can be indexed on their own.
+CHUNKED_NOTE_SIZE = 64 * 1024
+
+_CONTENT_FIELD = re.compile(r'"content"\s*:\s*"')
+
+def _split_note(content):
+    """Return (head, text, tail, escaped) with content == head + text + tail."""
+    try:
+        note = json.loads(content)
+    except ValueError:
+        note = None
+    if isinstance(note, dict) and isinstance(note.get("content"), str):
+        for match in _CONTENT_FIELD.finditer(content):
+            text, end = json.decoder.scanstring(content, match.end())
+            if text == note["content"]:
+                return content[:match.end()], content[match.end():end - 1], content[end - 1:], True
+    return "", content, "", False
+
+def _chunk_body(chunk, escaped):
+    return json.loads(f'"{chunk}"') if escaped else chunk
+
+def _load_chunks(cursor, manifest):
+    cursor.execute("SELECT id, data FROM note_chunks WHERE id IN (SELECT value FROM json_each(?, '$.ids'))", (json.dumps(manifest),))
+    chunks = dict(cursor.fetchall())
+    return [chunks[chunk_id] for chunk_id in manifest["ids"]]
+
+def _join_chunks(manifest, chunks):
+    return manifest["head"] + "".join(chunks) + manifest["tail"]
+
+def _store_chunks(cursor, section_id, username, content, manifest=None, chunks=()):
+    """
+    Store content as chunks, reusing those of the previous manifest (and its loaded chunks)
+    that didn't change. Returns the new manifest.
+    """
+    head, text, tail, escaped = _split_note(content)
+    old_ids = manifest["ids"] if manifest else []
+    if manifest is None or manifest["escaped"] != escaped:
+        chunks = ()
+    ids = []
+    for chunk in delta_utils.chunk_text(text, "\\n" if escaped else "\n", chunks):
+        if isinstance(chunk, int):
+            ids.append(old_ids[chunk])
+            continue
+        cursor.execute("INSERT INTO note_chunks (section_id, data) VALUES (?, ?)", (section_id, chunk))
+        ids.append(cursor.lastrowid)
+        cursor.execute("INSERT INTO notes_fts (rowid, body, username, section_id) VALUES (?, ?, ?, ?)",
+                       (-cursor.lastrowid, _chunk_body(chunk, escaped), username, section_id))
+    # Dropped chunks leave the index now; their rows go once no revision needs them (_collect_chunks)
+    kept = set(ids)
+    cursor.executemany("DELETE FROM notes_fts WHERE rowid = ?", [(-chunk_id,) for chunk_id in old_ids if chunk_id not in kept])
+    return {"head": head, "tail": tail, "escaped": escaped, "ids": ids}
+
+def _chunked_content(cursor, chunks):
+    manifest = json.loads(chunks)
+    return _join_chunks(manifest, _load_chunks(cursor, manifest))
 
 def get_section_content(section_id):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT content FROM user_notes WHERE id = ?", (section_id,))
-    result = cursor.fetchone()
-    conn.close()
+    with transaction() as cursor:
+        cursor.execute("SELECT content, chunks FROM user_notes WHERE id = ?", (section_id,))
+        result = cursor.fetchone()
+        if result and result[1]:
+            return _chunked_content(cursor, result[1])
     return result[0] if result else ""
 
 def save_section_content(section_id, content):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("UPDATE user_notes SET content = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?", (content, section_id))
-    conn.commit()
-    conn.close()
+    with transaction(immediate=True) as cursor:
+        cursor.execute("SELECT content, chunks, username FROM user_notes WHERE id = ?", (section_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return
+        previous, manifest, username = row
+        if manifest:
+            manifest = json.loads(manifest)
+            chunks = _load_chunks(cursor, manifest)
+            previous = _join_chunks(manifest, chunks)
+        if previous == content:
+            return # Nothing to write
+        if manifest:
+            new_manifest = _store_chunks(cursor, section_id, username, content, manifest, chunks)
+            # Leaves content out of the SET so the note's own FTS row isn't rewritten
+            cursor.execute("UPDATE user_notes SET chunks = ?, size = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                           (json.dumps(new_manifest), len(content), section_id))
+        elif len(content) >= CHUNKED_NOTE_SIZE:
+            new_manifest = _store_chunks(cursor, section_id, username, content)
+            cursor.execute("UPDATE user_notes SET content = NULL, chunks = ?, size = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                           (json.dumps(new_manifest), len(content), section_id))
+        else:
+            new_manifest = None
+            cursor.execute("UPDATE user_notes SET content = ?, size = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?", (content, len(content), section_id))
+        revision = _record_revision(cursor, section_id, previous or "", content, manifest or None, new_manifest)
+        cursor.execute("SELECT id, title, updated_at, size FROM user_notes WHERE id = ?", (section_id,))
+        entry = cursor.fetchone()
+    _cache_put_section(username, entry)
+    if revision % COMPACT_EVERY == 0:
+        _compact_in_background(section_id)
+
+# --- Revision History ---
+
+SNAPSHOT_INTERVAL = 20 # Max deltas between full snapshots, bounds reconstruction cost
+KEEP_RECENT_REVISIONS = 50 # Compaction never thins the newest revisions
+COMPACT_EVERY = 100 # Compact a section's history every this many saves
+
+# note_revisions.is_snapshot: 0 = delta against the previous revision, 1 = packed full text,
+# 2 = manifest of a chunked note (the chunks it names are kept until no revision needs them)
+CHUNKED_SNAPSHOT = 2
+
+def _encode_revision(previous, content, since_snapshot, manifest=None):
+    """Return (is_snapshot, data) for storing content after previous (manifest if content is chunked)."""
+    if previous is None or since_snapshot >= SNAPSHOT_INTERVAL:
+        return _snapshot(content, manifest)
+    delta = delta_utils.make_delta(previous, content)
+    # A rewrite of most of the note is cheaper to store (and replay) as a snapshot.
+    # Compare against the raw size to avoid compressing the whole note on every save.
+    if len(delta) * 8 > len(content):
+        return _snapshot(content, manifest)
+    return 0, delta
+
+def _snapshot(content, manifest):
+    if manifest is not None:
+        return CHUNKED_SNAPSHOT, json.dumps(manifest)
+    return 1, delta_utils.pack_full(content)
+
+def _decode_revision(cursor, content, is_snapshot, data):
+    if is_snapshot == CHUNKED_SNAPSHOT:
+        manifest = json.loads(data)
+        return _join_chunks(manifest, _load_chunks(cursor, manifest))
+    return delta_utils.unpack_full(data) if is_snapshot else delta_utils.apply_delta(content, data)
+
+def _record_revision(cursor, section_id, previous, content, previous_manifest=None, manifest=None):
+    cursor.execute("SELECT MAX(revision), MAX(CASE WHEN is_snapshot THEN revision END) FROM note_revisions WHERE section_id = ?", (section_id,))
+    last, last_snapshot = cursor.fetchone()
+    if last is None:
+        # First save since history began: keep what was there as the base revision
+        last = last_snapshot = 0
+        if previous:
+            last = last_snapshot = 1
+            cursor.execute("INSERT INTO note_revisions (section_id, revision, is_snapshot, data, size) VALUES (?, 1, ?, ?, ?)",
+                           (section_id, *_snapshot(previous, previous_manifest), len(previous)))
+        else:
+            previous = None
+
+    revision = last + 1
+    is_snapshot, data = _encode_revision(previous, content, revision - last_snapshot, manifest)
+    cursor.execute("INSERT INTO note_revisions (section_id, revision, is_snapshot, data, size) VALUES (?, ?, ?, ?, ?)",
+                   (section_id, revision, is_snapshot, data, len(content)))
+    return revision
+
+def _collect_chunks(cursor, section_id):
+    """Delete a section's chunks that neither the note nor any revision snapshot refers to."""
+    cursor.execute('''
+        DELETE FROM note_chunks WHERE section_id = ? AND id NOT IN (
+            SELECT value FROM user_notes, json_each(user_notes.chunks, '$.ids') WHERE user_notes.id = ?
+            UNION ALL
+            SELECT value FROM note_revisions, json_each(note_revisions.data, '$.ids') WHERE section_id = ? AND is_snapshot = ?
+        )
+    ''', (section_id, section_id, section_id, CHUNKED_SNAPSHOT))
+    return cursor.rowcount
+
+# section_id -> thread compacting it; saves run on the Tk thread and must not wait for compaction
+_compactions = {}
+_compactions_lock = threading.Lock()
+
+def _compact_in_background(section_id):
+    with _compactions_lock:
+        if section_id in _compactions:
+            return # Already being compacted
+        thread = _compactions[section_id] = threading.Thread(target=_compact_worker, args=(section_id,), daemon=True)
+    thread.start()
+
+def _compact_worker(section_id):
+    try:
+        compact_revisions(section_id)
+    except sqlite3.Error as e:
+        print(f"Revision compaction error: {e}")
+    finally:
+        close_connection()
+        with _compactions_lock:
+            _compactions.pop(section_id, None)
+
+def wait_for_compactions(timeout=None):
+    """Block until background compactions have finished (e.g. before deleting a scratch database)."""
+    with _compactions_lock:
+        threads = list(_compactions.values())
+    for thread in threads:
+        thread.join(timeout)
+
+def get_revisions(section_id):
+    """List a section's revisions as (revision, created_at, size), newest first."""
+    with transaction() as cursor:
+        cursor.execute("SELECT revision, created_at, size FROM note_revisions WHERE section_id = ? ORDER BY revision DESC", (section_id,))
+        return cursor.fetchall()
+
+def get_revision_content(section_id, revision):
+    """Rebuild a revision from its nearest snapshot. Returns None if it doesn't exist."""
+    with transaction() as cursor:
+        cursor.execute("SELECT MAX(revision) FROM note_revisions WHERE section_id = ? AND revision <= ? AND is_snapshot != 0", (section_id, revision))
+        base = cursor.fetchone()[0]
+        if base is None:
+            return None
+        cursor.execute("SELECT revision, is_snapshot, data FROM note_revisions WHERE section_id = ? AND revision BETWEEN ? AND ? ORDER BY revision",
+                       (section_id, base, revision))
+        rows = cursor.fetchall()
+        if rows[-1][0] != revision:
+            return None
+        content = None
+        for _, is_snapshot, data in rows:
+            content = _decode_revision(cursor, content, is_snapshot, data)
+    return content
+
+def restore_revision(section_id, revision):
+    """Make an old revision the current content (recorded as a new revision)."""
+    content = get_revision_content(section_id, revision)
+    if content is None:
+        return False
+    save_section_content(section_id, content)
+    return True
+
+def compact_revisions(section_id, keep_recent=KEEP_RECENT_REVISIONS):
+    """
+    Thin old history: keep the newest keep_recent revisions and, before that, the last revision of each day.
+    Kept revisions are re-encoded against their new predecessor, and chunks (of a chunked note)
+    that no kept revision needs are deleted. Returns the number of revisions removed.
+    """
+    with transaction(immediate=True) as cursor:
+        removed = _thin_revisions(cursor, section_id, keep_recent)
+        _collect_chunks(cursor, section_id)
+    return removed
+
+def _thin_revisions(cursor, section_id, keep_recent):
+    cursor.execute("SELECT revision, is_snapshot, data, size, created_at FROM note_revisions WHERE section_id = ? ORDER BY revision", (section_id,))
+    rows = cursor.fetchall()
+    if len(rows) <= keep_recent:
+        return 0
+
+    keep = {row[0] for row in rows[-keep_recent:]}
+    last_of_day = {}
+    for row in rows[:-keep_recent]:
+        last_of_day[str(row[4])[:10]] = row[0]
+    keep.update(last_of_day.values())
+    if len(keep) == len(rows):
+        return 0
+
+    new_rows = []
+    content = previous = None
+    since_snapshot = 0
+    for revision, is_snapshot, data, size, created_at in rows:
+        content = _decode_revision(cursor, content, is_snapshot, data)
+        if revision not in keep:
+            continue
+        new_snapshot, new_data = _encode_revision(previous, content, since_snapshot)
+        if new_snapshot and is_snapshot == CHUNKED_SNAPSHOT:
+            new_snapshot, new_data = is_snapshot, data # Its chunks are stored already
+        since_snapshot = 1 if new_snapshot else since_snapshot + 1
+        new_rows.append((section_id, revision, new_snapshot, new_data, size, created_at))
+        previous = content
+
+    cursor.execute("DELETE FROM note_revisions WHERE section_id = ?", (section_id,))
+    cursor.executemany("INSERT INTO note_revisions (section_id, revision, is_snapshot, data, size, created_at) VALUES (?, ?, ?, ?, ?, ?)", new_rows)
+    return len(rows) - len(new_rows)
+
+def _fts_terms(query):
+    """Turn free text into FTS5 terms: one per word, the last one as a prefix."""
+    terms = ['"' + term.replace('"', '""') + '"' for term in query.split()]
+    if terms:
+        terms[-1] += "*" # Match while the user is still typing the last word
+    return terms
+
+# Above this many matches (for the searching user) bm25 ranking costs more than it is worth,
+# so the most recently edited matches are shown instead
+RANKED_SEARCH_MAX_MATCHES = 2000
+
+def search_notes(username, query, limit=50):
+    """
+    Full-text search over a user's sections.
+    Returns a list of (id, title, updated_at, snippet) tuples, best match first.
+    """
+    terms = _fts_terms(query)
+    if not terms:
+        return []
+    with transaction() as cursor:
+        cursor.execute("SELECT count(*) FROM (SELECT 1 FROM notes_fts WHERE notes_fts MATCH ? AND notes_fts.username = ? LIMIT ?)",
+                       (" ".join(terms), username, RANKED_SEARCH_MAX_MATCHES))
+        ranked = cursor.fetchone()[0] < RANKED_SEARCH_MAX_MATCHES
+        cursor.execute("SELECT 1 FROM user_notes WHERE username = ? AND chunks IS NOT NULL LIMIT 1", (username,))
+        if cursor.fetchone():
+            return _search_chunked(cursor, username, terms, ranked, limit)
+        # Title hits weigh more than body hits
+        order = "bm25(notes_fts, 10.0, 1.0)" if ranked else "n.updated_at DESC"
+        cursor.execute(f'''
+            SELECT n.id, n.title, n.updated_at, snippet(notes_fts, 1, '[', ']', '…', 12)
+            FROM notes_fts
+            JOIN user_notes n ON n.id = notes_fts.rowid
+            WHERE notes_fts MATCH ? AND notes_fts.username = ?
+            ORDER BY {order}
+            LIMIT ?
+        ''', (" ".join(terms), username, limit))
+        return cursor.fetchall()
+
+def _search_chunked(cursor, username, terms, ranked, limit):
+    # A chunked note is a title row plus a row per chunk (see CHUNKED_NOTE_SIZE), so rows matching
+    # any term are grouped by section and a section must match every term in one of its rows
+    every_term = "".join(" AND h.section_id IN (SELECT section_id FROM notes_fts WHERE notes_fts MATCH ? AND username = ?)"
+                         for _ in terms) if len(terms) > 1 else ""
+    params = [" OR ".join(terms), username]
+    for term in terms if every_term else ():
+        params += [term, username]
+    score, order = ("bm25(notes_fts, 10.0, 1.0)", "h.score") if ranked else ("0", "n.updated_at DESC")
+    # MATERIALIZED: FTS5 can't compute bm25 for a row once the query has been flattened into the GROUP BY
+    cursor.execute(f'''
+        WITH hits AS MATERIALIZED (
+            SELECT section_id, {score} AS score FROM notes_fts WHERE notes_fts MATCH ? AND username = ?
+        )
+        SELECT n.id, n.title, n.updated_at
+        FROM (SELECT section_id, min(score) AS score FROM hits GROUP BY section_id) h
+        JOIN user_notes n ON n.id = h.section_id
+        WHERE 1{every_term}
+        ORDER BY {order}
+        LIMIT ?
+    ''', params + [limit])
+    rows = cursor.fetchall()
+    # Snippets only for the sections shown, from each one's best matching row with a body. Picked
+    # out by rowid, which (unlike section_id) doesn't load every hit; the + keeps FTS5 from re-running
+    # the match once per rowid
+    shown = json.dumps([row[0] for row in rows])
+    cursor.execute('''
+        SELECT section_id, bm25(notes_fts), snippet(notes_fts, 1, '[', ']', '…', 12) FROM notes_fts
+        WHERE notes_fts MATCH ? AND +rowid IN (
+            SELECT value FROM json_each(?)
+            UNION ALL
+            SELECT -chunk.value FROM user_notes, json_each(user_notes.chunks, '$.ids') AS chunk
+            WHERE user_notes.id IN (SELECT value FROM json_each(?)) AND user_notes.chunks IS NOT NULL
+        ) AND body IS NOT NULL
+    ''', (" OR ".join(terms), shown, shown))
+    snippets = {}
+    for section_id, _, snippet in sorted(cursor.fetchall(), key=lambda hit: hit[1], reverse=True):
+        snippets[section_id] = snippet
+    return [(section_id, title, updated_at, snippets.get(section_id, "")) for section_id, title, updated_at in rows]
+
+# --- Bulk Import / Export ---
+# Archives are JSON Lines, one section per line: {"title": ..., "content": ..., "updated_at": ...}
+# Both functions stream, so memory stays flat regardless of archive size.
+
+EXPORT_FETCH_SIZE = 500
+IMPORT_BATCH_SIZE = 5000 # Rows per executemany / transaction
+
+def export_notes(username, stream, compress=False):
+    """Write a user's sections to a binary stream as JSON Lines (gzip if compress). Returns the count."""
+    out = gzip.GzipFile(fileobj=stream, mode="wb") if compress else stream
+    count = 0
+    try:
+        with transaction() as cursor:
+            cursor.execute("SELECT title, content, chunks, updated_at FROM user_notes WHERE username = ? ORDER BY id", (username,))
+            chunk_cursor = cursor.connection.cursor()
+            while True:
+                rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+                if not rows:
+                    break
+                out.write(b"".join(
+                    json.dumps({"title": title, "content": _chunked_content(chunk_cursor, chunks) if chunks else content or "",
+                                "updated_at": updated_at}, ensure_ascii=False).encode("utf-8") + b"\n"
+                    for title, content, chunks, updated_at in rows
+                ))
+                count += len(rows)
+    finally:
+        if compress:
+            out.close() # Writes the gzip trailer, leaves the underlying stream open
+    return count
+
+def _iter_import_rows(username, stream):
+    if not hasattr(stream, "peek"):
+        stream = io.BufferedReader(stream)
+    # Detect gzip by its magic bytes, so callers don't need to know how the archive was written
+    if stream.peek(2)[:2] == b"\x1f\x8b":
+        stream = gzip.GzipFile(fileobj=stream, mode="rb")
+    for line_no, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Invalid note record on line {line_no}: {e}") from None
+        if not isinstance(record, dict):
+            raise ValueError(f"Invalid note record on line {line_no}: expected an object")
+        title = record.get("title")
+        content = record.get("content") or ""
+        updated_at = record.get("updated_at")
+        if not isinstance(title, str):
+            raise ValueError(f"Invalid note record on line {line_no}: title must be a string")
+        if not isinstance(content, str):
+            raise ValueError(f"Invalid note record on line {line_no}: content must be a string")
+        if updated_at is not None and not isinstance(updated_at, str):
+            raise ValueError(f"Invalid note record on line {line_no}: updated_at must be a string")
+        yield (username, title, content, len(content), updated_at)
+
+def import_notes(username, stream):
+    """
+    Add sections from a JSON Lines binary stream (plain or gzip) to a user's notes.
+    All or nothing: rows are inserted in batches inside one transaction, so a bad record
+    (ValueError) leaves the notes as they were. Returns the count.
+    """
+    rows = _iter_import_rows(username, stream)
+    count = 0
+    try:
+        with transaction(immediate=True) as cursor:
+            while True:
+                batch = list(itertools.islice(rows, IMPORT_BATCH_SIZE))
+                if not batch:
+                    break
+                cursor.executemany("INSERT INTO user_notes (username, title, content, size, updated_at) VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))", batch)
+                count += len(batch)
+    finally:
+        invalidate_section_cache(username)
+    return count
+
+def main(argv=None):
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Nexus database tools")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("init", help="Create or migrate the database (default)")
+    export_cmd = commands.add_parser("export", help="Export a user's notes as JSON Lines")
+    export_cmd.add_argument("username")
+    export_cmd.add_argument("file", help="Output path, or - for stdout")
+    export_cmd.add_argument("--gzip", action="store_true", help="gzip-compress the output")
+    import_cmd = commands.add_parser("import", help="Import notes from JSON Lines (plain or gzip)")
+    import_cmd.add_argument("username")
+    import_cmd.add_argument("file", help="Input path, or - for stdin")
+    args = parser.parse_args(argv)
 
-if __name__ == "__main__":
     init_db()
-    print("Database initialized.")
+    if args.command == "export":
+        if args.file == "-":
+            count = export_notes(args.username, sys.stdout.buffer, compress=args.gzip)
+        else:
+            with open(args.file, "wb") as f:
+                count = export_notes(args.username, f, compress=args.gzip)
+        print(f"Exported {count} sections.", file=sys.stderr)
+    elif args.command == "import":
+        if args.file == "-":
+            count = import_notes(args.username, sys.stdin.buffer)
+        else:
+            with open(args.file, "rb") as f:
+                count = import_notes(args.username, f)
+        print(f"Imported {count} sections.", file=sys.stderr)
+    else:
+        print("Database initialized.")
+
+if __name__ == "__main__":
+    main()
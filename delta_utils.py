@@ -0,0 +1,162 @@
+import json
+import zlib
+
+# Deltas are zlib-compressed JSON lists of ops against the previous text:
+#   [0, start, length]  copy old[start:start + length]
+#   [1, "text"]         insert literal text
+# The diff trims the common prefix/suffix, then anchors on a short window of the new
+# middle found in the old middle and recurses on either side. All matching is done with
+# slice compares and str.find, so a 1 MB note diffs in milliseconds.
+ANCHOR_LEN = 32
+MAX_DEPTH = 40
+
+def _common_prefix_len(a, b):
+    # Binary search on slice equality, which compares in C instead of char by char
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def _common_suffix_len(a, b, limit):
+    lo, hi = 0, min(len(a), len(b), limit)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def _emit(ops, op):
+    # Merge with the previous op when contiguous, keeps deltas small
+    if ops and ops[-1][0] == op[0]:
+        last = ops[-1]
+        if op[0] == 1:
+            last[1] += op[1]
+            return
+        if last[1] + last[2] == op[1]:
+            last[2] += op[2]
+            return
+    ops.append(op)
+
+def _diff(old, o1, o2, new, n1, n2, ops, depth):
+    a = old[o1:o2]
+    b = new[n1:n2]
+    prefix = _common_prefix_len(a, b)
+    suffix = _common_suffix_len(a, b, min(len(a), len(b)) - prefix)
+    if prefix:
+        _emit(ops, [0, o1, prefix])
+    _diff_middle(old, o1 + prefix, o2 - suffix, new, n1 + prefix, n2 - suffix, ops, depth)
+    if suffix:
+        _emit(ops, [0, o2 - suffix, suffix])
+
+def _diff_middle(old, o1, o2, new, n1, n2, ops, depth):
+    if n1 == n2:
+        return
+    if o1 < o2 and n2 - n1 >= ANCHOR_LEN * 4 and depth < MAX_DEPTH:
+        for fraction in (0.5, 0.25, 0.75):
+            at = n1 + int((n2 - n1 - ANCHOR_LEN) * fraction)
+            pos = old.find(new[at:at + ANCHOR_LEN], o1, o2)
+            if pos != -1:
+                _diff(old, o1, pos, new, n1, at, ops, depth + 1)
+                _diff(old, pos, o2, new, at, n2, ops, depth + 1)
+                return
+    _emit(ops, [1, new[n1:n2]])
+
+def make_delta(old, new):
+    """Return a compressed delta that turns old into new."""
+    ops = []
+    _diff(old, 0, len(old), new, 0, len(new), ops, 0)
+    return zlib.compress(json.dumps(ops, separators=(",", ":")).encode("utf-8"))
+
+def apply_delta(old, delta):
+    """Rebuild the new text from old and a delta made by make_delta."""
+    parts = []
+    for op in json.loads(zlib.decompress(delta).decode("utf-8")):
+        if op[0] == 0:
+            parts.append(old[op[1]:op[1] + op[2]])
+        else:
+            parts.append(op[1])
+    return "".join(parts)
+
+# Chunking: large notes are stored as a list of chunks so a save only writes the chunks an
+# edit touched. Cuts are content-defined: a chunk ends after a line picked by that line's
+# checksum (once the chunk is MIN_CHUNK long), so an insert or delete moves no cuts except
+# the ones around it and later chunks come out unchanged. A chunk with no picked line within
+# MAX_CHUNK is cut after a space instead.
+CHUNK_SIZE = 8192 # Roughly the average chunk, on top of MIN_CHUNK
+MIN_CHUNK = 2048
+MAX_CHUNK = 65536
+_UNSAFE_CUT = frozenset("\\u0123456789abcdefABCDEF") # Could split a JSON escape like \n or \u00e9
+
+def _chunk_end(text, start, newline):
+    limit = min(start + MAX_CHUNK, len(text))
+    pos = text.find(newline, start + MIN_CHUNK)
+    line_start = max(start, text.rfind(newline, start, max(start, pos)) + len(newline)) if pos != -1 else start
+    while pos != -1 and pos + len(newline) <= limit:
+        end = pos + len(newline)
+        line = text[line_start:end]
+        # Longer lines are likelier cuts, which keeps chunks near CHUNK_SIZE whatever the line length
+        if zlib.crc32(line.encode("utf-8", "surrogatepass")) % CHUNK_SIZE < len(line):
+            return end
+        line_start = end
+        pos = text.find(newline, end)
+    if limit == len(text):
+        return limit
+    cut = text.rfind(" ", start + MIN_CHUNK, limit)
+    if cut != -1:
+        return cut + 1
+    cut = limit
+    while cut > start + MIN_CHUNK and text[cut - 1] in _UNSAFE_CUT:
+        cut -= 1
+    return cut if cut > start + MIN_CHUNK else len(text)
+
+def chunk_text(text, newline="\n", previous=()):
+    """
+    Split text into chunks, reusing previous (the chunks of the text before an edit) where
+    they still fit. Returns a list of chunks: an int is the index of an unchanged chunk of
+    previous, a str is a new one. newline is the line separator as it appears in text
+    ("\\n" inside a JSON string literal).
+    """
+    old = "".join(previous)
+    prefix = _common_prefix_len(old, text)
+    suffix = _common_suffix_len(old, text, min(len(old), len(text)) - prefix)
+    shift = len(text) - len(old)
+    old_starts = {}
+    offset = 0
+    for i, chunk in enumerate(previous):
+        old_starts[offset] = i
+        offset += len(chunk)
+
+    chunks = []
+    start = 0
+    # A cut depends on at most MAX_CHUNK of text after the chunk's start, so chunks that far
+    # ahead of the edit come out the same
+    for i, chunk in enumerate(previous):
+        if start + MAX_CHUNK > prefix:
+            break
+        chunks.append(i)
+        start += len(chunk)
+    while start < len(text):
+        if start >= len(text) - suffix and start - shift in old_starts:
+            # Back on an old cut inside the unchanged tail: the rest is the old chunks
+            chunks.extend(range(old_starts[start - shift], len(previous)))
+            break
+        end = _chunk_end(text, start, newline)
+        i = old_starts.get(start)
+        if i is not None and previous[i] == text[start:end]:
+            chunks.append(i)
+        else:
+            chunks.append(text[start:end])
+        start = end
+    return chunks
+
+def pack_full(text):
+    return zlib.compress(text.encode("utf-8"))
+
+def unpack_full(data):
+    return zlib.decompress(data).decode("utf-8")
@@ -0,0 +1,281 @@
+import customtkinter as ctk
+from tkinter import messagebox
+import threading
+import database
+import rpi_fleet
+from config import *
+
+ALL_GROUPS = "All groups"
+STREAM_FLUSH_MS = 100 # Output from all devices is batched into one UI update per this many ms
+MAX_CARD_CHARS = 5000 # Each device card shows only the tail of its output
+
+STATUS_COLORS = {
+    "pending": "gray60",
+    "running": COLOR_PRIMARY,
+    "ok": COLOR_SUCCESS,
+    "failed": COLOR_ACCENT_2,
+    "timeout": COLOR_DANGER,
+    "error": COLOR_DANGER,
+    "cancelled": "gray60",
+}
+
+class FleetFrame(ctk.CTkFrame):
+    """Run one command on many Pis at once; each device's output fills its own card as it arrives."""
+
+    def __init__(self, master):
+        super().__init__(master, fg_color="transparent")
+        self.grid_columnconfigure(1, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+
+        self.header_frame = ctk.CTkFrame(self, fg_color="transparent")
+        self.header_frame.grid(row=0, column=0, columnspan=2, padx=20, pady=(20, 10), sticky="ew")
+        self.header_frame.grid_columnconfigure(0, weight=1)
+
+        self.header_label = ctk.CTkLabel(self.header_frame, text="Fleet", font=FONT_HEADER)
+        self.header_label.grid(row=0, column=0, sticky="w")
+
+        self.group_menu = ctk.CTkOptionMenu(self.header_frame, values=[ALL_GROUPS], width=160, command=self.load_devices)
+        self.group_menu.grid(row=0, column=1, padx=10)
+
+        self.add_btn = ctk.CTkButton(self.header_frame, text="Add Device", width=120, height=30,
+                                     fg_color=COLOR_CARD, hover_color=COLOR_PRIMARY,
+                                     command=self.show_add_device_popup)
+        self.add_btn.grid(row=0, column=2)
+
+        # Device picker
+        self.device_scroll = ctk.CTkScrollableFrame(self, width=240, fg_color=COLOR_CARD, corner_radius=15)
+        self.device_scroll.grid(row=1, column=0, padx=(20, 10), pady=(0, 20), sticky="ns")
+        self.device_scroll.grid_columnconfigure(0, weight=1)
+
+        # Per-device results
+        self.results_scroll = ctk.CTkScrollableFrame(self, fg_color="transparent")
+        self.results_scroll.grid(row=1, column=1, padx=(10, 20), pady=(0, 20), sticky="nsew")
+        self.results_scroll.grid_columnconfigure(0, weight=1)
+
+        self.input_frame = ctk.CTkFrame(self, fg_color="transparent")
+        self.input_frame.grid(row=2, column=0, columnspan=2, padx=40, pady=(0, 10), sticky="ew")
+        self.input_frame.grid_columnconfigure(0, weight=1)
+
+        self.entry = ctk.CTkEntry(self.input_frame, placeholder_text="Command for the selected devices...", height=50,
+                                  font=FONT_MONO, corner_radius=25)
+        self.entry.grid(row=0, column=0, padx=(0, 15), sticky="ew")
+        self.entry.bind("<Return>", self.run_command)
+
+        self.timeout_entry = ctk.CTkEntry(self.input_frame, width=70, height=50, font=FONT_BODY, corner_radius=25,
+                                          placeholder_text="Timeout")
+        self.timeout_entry.insert(0, f"{rpi_fleet.DEVICE_TIMEOUT:g}")
+        self.timeout_entry.grid(row=0, column=1, padx=(0, 15))
+
+        self.run_btn = ctk.CTkButton(self.input_frame, text="Run", width=100, height=50, corner_radius=25, font=FONT_BODY,
+                                     fg_color=COLOR_SUCCESS, hover_color="#1e5c29",
+                                     command=self.run_command)
+        self.run_btn.grid(row=0, column=2)
+
+        self.stop_btn = ctk.CTkButton(self.input_frame, text="Stop", width=80, height=50, corner_radius=25, font=FONT_BODY,
+                                      fg_color=COLOR_DANGER, hover_color="#8a1f15",
+                                      command=self.stop_run)
+
+        self.summary_label = ctk.CTkLabel(self, text="", font=FONT_SMALL, text_color="#95a5a6")
+        self.summary_label.grid(row=3, column=0, columnspan=2, pady=(0, 20))
+
+        self.username = None
+        self.devices = []
+        self.device_vars = {}
+        self.run = None
+        self.cards = {}
+
+        # Workers append to pending_output, the Tk thread drains it
+        self.output_lock = threading.Lock()
+        self.pending_output = {}
+        self.flush_scheduled = False
+
+    def set_user(self, username):
+        self.username = username
+        self.load_devices()
+
+    def load_devices(self, *_):
+        if not self.username:
+            return
+        groups = database.get_device_groups(self.username)
+        self.group_menu.configure(values=[ALL_GROUPS] + groups)
+        group = self.group_menu.get()
+        if group != ALL_GROUPS and group not in groups:
+            self.group_menu.set(ALL_GROUPS)
+            group = ALL_GROUPS
+        self.devices = database.get_devices(self.username, None if group == ALL_GROUPS else group)
+
+        for widget in self.device_scroll.winfo_children():
+            widget.destroy()
+        previous = self.device_vars
+        self.device_vars = {}
+        if not self.devices:
+            ctk.CTkLabel(self.device_scroll, text="No devices yet.\nUse Add Device.", font=FONT_SMALL,
+                         text_color="gray60").grid(row=0, column=0, pady=20)
+        for row, device in enumerate(self.devices):
+            selected = previous[device["id"]].get() if device["id"] in previous else True
+            var = ctk.BooleanVar(value=selected)
+            self.device_vars[device["id"]] = var
+            label = f"{device['name']}\n{device['ip']}:{device['port']}"
+            ctk.CTkCheckBox(self.device_scroll, text=label, variable=var, font=FONT_SMALL).grid(
+                row=row, column=0, padx=10, pady=5, sticky="w")
+            ctk.CTkButton(self.device_scroll, text="✕", width=28, height=28, fg_color="transparent",
+                          hover_color=COLOR_DANGER, command=lambda d=device: self.remove_device(d)).grid(
+                row=row, column=1, padx=(0, 5))
+
+    def selected_devices(self):
+        return [device for device in self.devices if self.device_vars[device["id"]].get()]
+
+    def show_add_device_popup(self):
+        if not self.username:
+            return
+        popup = ctk.CTkToplevel(self)
+        popup.title("Add Device")
+        popup.geometry("380x480")
+        popup.attributes("-topmost", True)
+
+        entries = {}
+        for key, placeholder in (("name", "Name"), ("ip", "IP Address"), ("port", "Port (Default: 5000)"),
+                                 ("group_name", "Group (optional)"), ("rpi_user", "Username (optional)"),
+                                 ("rpi_pass", "Password (optional)")):
+            entry = ctk.CTkEntry(popup, placeholder_text=placeholder, width=300, height=40, font=FONT_BODY,
+                                 show="*" if key == "rpi_pass" else None)
+            entry.pack(pady=(20 if not entries else 5, 5))
+            entries[key] = entry
+
+        def save():
+            values = {key: entry.get().strip() for key, entry in entries.items()}
+            if not values["ip"]:
+                messagebox.showwarning("Warning", "Please enter an IP address.", parent=popup)
+                return
+            try:
+                port = int(values["port"] or 5000)
+            except ValueError:
+                messagebox.showerror("Error", "Invalid port number.", parent=popup)
+                return
+            device_id = database.add_device(self.username, values["name"], values["ip"], port,
+                                            values["rpi_user"] or None, values["rpi_pass"] or None,
+                                            values["group_name"])
+            if device_id is None:
+                messagebox.showerror("Error", f"{values['ip']}:{port} is already in your devices.", parent=popup)
+                return
+            popup.destroy()
+            self.load_devices()
+
+        ctk.CTkButton(popup, text="Save", width=150, height=35, font=FONT_BODY,
+                      fg_color=COLOR_PRIMARY, text_color=COLOR_BG, hover_color=COLOR_SECONDARY,
+                      command=save).pack(pady=20)
+
+    def remove_device(self, device):
+        if messagebox.askyesno("Remove Device", f"Remove {device['name']} ({device['ip']}:{device['port']})?"):
+            database.delete_device(device["id"])
+            self.load_devices()
+
+    def run_command(self, event=None):
+        command = self.entry.get().strip()
+        if not command or self.run:
+            return
+        devices = self.selected_devices()
+        if not devices:
+            self.summary_label.configure(text="Select at least one device.")
+            return
+        try:
+            timeout = float(self.timeout_entry.get())
+        except ValueError:
+            timeout = rpi_fleet.DEVICE_TIMEOUT
+
+        for widget in self.results_scroll.winfo_children():
+            widget.destroy()
+        self.cards = {}
+        self.pending_output = {}
+
+        self.run = rpi_fleet.FleetRun(devices, command, timeout=timeout,
+                                      on_output=self.on_output, on_result=self.on_result, on_finished=self.on_finished)
+        for result in self.run.results:
+            self.cards[id(result)] = self.create_card(result)
+        self.summary_label.configure(text=f"Running on {len(devices)} devices...")
+        self.update_buttons()
+        self.run.start()
+
+    def create_card(self, result):
+        card = ctk.CTkFrame(self.results_scroll, fg_color=COLOR_CARD, corner_radius=15)
+        card.pack(fill="x", pady=5)
+        card.grid_columnconfigure(0, weight=1)
+        title = ctk.CTkLabel(card, text=f"{result.name}  ({result.device['ip']}:{result.device.get('port') or 5000})",
+                             font=FONT_BODY, anchor="w")
+        title.grid(row=0, column=0, padx=15, pady=(10, 0), sticky="ew")
+        status = ctk.CTkLabel(card, text="pending", font=FONT_SMALL, text_color=STATUS_COLORS["pending"])
+        status.grid(row=0, column=1, padx=15, pady=(10, 0))
+        output = ctk.CTkTextbox(card, height=110, font=FONT_MONO, fg_color=COLOR_BG, wrap="none")
+        output.grid(row=1, column=0, columnspan=2, padx=10, pady=10, sticky="ew")
+        output.configure(state="disabled")
+        return {"status": status, "output": output, "text": ""}
+
+    # Called on worker threads
+    def on_output(self, result, text):
+        with self.output_lock:
+            self.pending_output.setdefault(id(result), []).append(text)
+            if not self.flush_scheduled:
+                self.flush_scheduled = True
+                self.master.after(STREAM_FLUSH_MS, self.flush_output)
+
+    def on_result(self, result):
+        self.master.after(0, self.show_result, result)
+
+    def on_finished(self, run):
+        self.master.after(0, self.finish_run, run)
+
+    def flush_output(self):
+        with self.output_lock:
+            pending = self.pending_output
+            self.pending_output = {}
+            self.flush_scheduled = False
+        for key, parts in pending.items():
+            card = self.cards.get(key)
+            if card is None:
+                continue
+            card["text"] = (card["text"] + "".join(parts))[-MAX_CARD_CHARS:]
+            card["output"].configure(state="normal")
+            card["output"].delete("1.0", "end")
+            card["output"].insert("end", card["text"])
+            card["output"].see("end")
+            card["output"].configure(state="disabled")
+        if self.run and not self.run.finished.is_set():
+            for result in self.run.results:
+                card = self.cards.get(id(result))
+                if result.status == "running" and card and card["status"].cget("text") == "pending":
+                    card["status"].configure(text="running", text_color=STATUS_COLORS["running"])
+
+    def show_result(self, result):
+        self.flush_output()
+        card = self.cards.get(id(result))
+        if card is None:
+            return
+        text = result.status
+        if result.elapsed is not None:
+            text += f" · {result.elapsed:.1f}s"
+        if result.code not in (None, 0):
+            text += f" · exit {result.code}"
+        if result.error:
+            text += f" · {result.error}"
+        card["status"].configure(text=text, text_color=STATUS_COLORS.get(result.status, COLOR_TEXT))
+
+    def finish_run(self, run):
+        if run is not self.run:
+            return
+        self.flush_output()
+        summary = ", ".join(f"{count} {status}" for status, count in sorted(run.summary().items()))
+        self.summary_label.configure(text=f"{len(run.results)} devices in {run.elapsed:.1f}s: {summary}")
+        self.run = None
+        self.update_buttons()
+
+    def stop_run(self):
+        if self.run:
+            self.run.cancel()
+
+    def update_buttons(self):
+        if self.run:
+            self.run_btn.configure(state="disabled")
+            self.stop_btn.grid(row=0, column=3, padx=(15, 0))
+        else:
+            self.run_btn.configure(state="normal")
+            self.stop_btn.grid_remove()
@@ -1,10 +1,9 @@
 import customtkinter as ctk
 from tkinter import messagebox
 import database
+import note_format
 from config import *
 
-import json
-
 class NotesFrame(ctk.CTkFrame):
     def __init__(self, master, app_instance):
         super().__init__(master, fg_color="transparent")
@@ -13,6 +12,8 @@ class NotesFrame(ctk.CTkFrame):
         self.current_section_id = None
         self.dirty = False
         self.current_font_size = "14"
+        self.section_buttons = {} # section_id -> sidebar button
+        self.search_job = None
         
         # Grid Layout: Left Sidebar (Sections) | Right Main (Editor)
         self.grid_columnconfigure(0, weight=1) # Sidebar
@@ -22,20 +23,24 @@ class NotesFrame(ctk.CTkFrame):
         # --- Left Sidebar: Sections ---
         self.left_panel = ctk.CTkFrame(self, corner_radius=20, fg_color=COLOR_SIDEBAR)
         self.left_panel.grid(row=0, column=0, sticky="nsew", padx=(20, 10), pady=20)
-        self.left_panel.grid_rowconfigure(1, weight=1)
+        self.left_panel.grid_rowconfigure(2, weight=1)
         self.left_panel.grid_columnconfigure(0, weight=1)
 
         self.sections_label = ctk.CTkLabel(self.left_panel, text="Sections", font=FONT_SUBHEADER)
         self.sections_label.grid(row=0, column=0, padx=20, pady=(20, 10), sticky="w")
 
+        self.search_entry = ctk.CTkEntry(self.left_panel, placeholder_text="Search notes...", height=35, font=FONT_SMALL)
+        self.search_entry.grid(row=1, column=0, padx=20, pady=(0, 5), sticky="ew")
+        self.search_entry.bind("<KeyRelease>", self.on_search_key)
+
         self.sections_scroll = ctk.CTkScrollableFrame(self.left_panel, fg_color="transparent")
-        self.sections_scroll.grid(row=1, column=0, sticky="nsew", padx=10, pady=10)
+        self.sections_scroll.grid(row=2, column=0, sticky="nsew", padx=10, pady=10)
         
         self.add_section_btn = ctk.CTkButton(self.left_panel, text="+ Add Section", height=40, font=FONT_BODY,
                                              fg_color=COLOR_PRIMARY, hover_color=COLOR_SECONDARY,
                                              text_color=COLOR_BG,
                                              command=self.add_section_dialog)
-        self.add_section_btn.grid(row=2, column=0, padx=20, pady=20, sticky="ew")
+        self.add_section_btn.grid(row=3, column=0, padx=20, pady=20, sticky="ew")
 
         # --- Right Main: Editor ---
         self.right_panel = ctk.CTkFrame(self, corner_radius=20, fg_color=COLOR_CARD)
@@ -84,14 +89,17 @@ class NotesFrame(ctk.CTkFrame):
 
     def set_user(self, username):
         self.username = username
+        self.search_entry.delete(0, "end")
         self.load_sections()
 
     def load_sections(self):
-        # Clear existing buttons
-        for widget in self.sections_scroll.winfo_children():
-            widget.destroy()
-            
         if not self.username:
+            self.render_section_buttons([])
+            return
+
+        # Keep showing search results while a query is active
+        if self.search_entry.get().strip():
+            self.run_search()
             return
 
         sections = database.get_sections(self.username)
@@ -101,16 +109,55 @@ class NotesFrame(ctk.CTkFrame):
             database.create_section(self.username, "General")
             sections = database.get_sections(self.username)
 
-        for sec_id, title, updated in sections:
-            btn = ctk.CTkButton(self.sections_scroll, text=title, height=40, corner_radius=10,
-                                fg_color="transparent", hover_color=COLOR_CARD, border_width=1, border_color=COLOR_CARD,
-                                anchor="w", command=lambda i=sec_id, t=title, u=updated: self.load_note_content(i, t, u))
-            btn.pack(fill="x", pady=5)
+        self.render_section_buttons(sections)
             
         # Load first section by default if nothing selected
         if sections and not self.current_section_id:
             self.load_note_content(sections[0][0], sections[0][1], sections[0][2])
 
+    def render_section_buttons(self, sections, snippets=None):
+        # Clear existing buttons
+        for widget in self.sections_scroll.winfo_children():
+            widget.destroy()
+        self.section_buttons = {}
+
+        for sec_id, title, updated in sections:
+            text = title
+            if snippets and snippets.get(sec_id):
+                text = f"{title}\n{snippets[sec_id]}"
+            btn = ctk.CTkButton(self.sections_scroll, text=text, height=40, corner_radius=10,
+                                fg_color="transparent", hover_color=COLOR_CARD, border_width=1, border_color=COLOR_CARD,
+                                anchor="w", command=lambda i=sec_id, t=title, u=updated: self.load_note_content(i, t, u))
+            btn.pack(fill="x", pady=5)
+            self.section_buttons[sec_id] = btn
+        self.highlight_active_section()
+
+    def highlight_active_section(self):
+        for sec_id, btn in self.section_buttons.items():
+            if sec_id == self.current_section_id:
+                btn.configure(fg_color=COLOR_PRIMARY, text_color=COLOR_BG)
+            else:
+                btn.configure(fg_color="transparent", text_color=COLOR_TEXT)
+
+    def on_search_key(self, event=None):
+        # Debounce so a burst of keystrokes runs a single query
+        if self.search_job:
+            self.after_cancel(self.search_job)
+        self.search_job = self.after(150, self.run_search)
+
+    def run_search(self):
+        self.search_job = None
+        if not self.username:
+            return
+        query = self.search_entry.get().strip()
+        if not query:
+            self.load_sections()
+            return
+        results = database.search_notes(self.username, query)
+        sections = [(sec_id, title, updated) for sec_id, title, updated, _ in results]
+        snippets = {sec_id: snippet for sec_id, _, _, snippet in results}
+        self.render_section_buttons(sections, snippets)
+
     def load_note_content(self, section_id, title, updated_at):
         if self.dirty:
             self.save_state()
@@ -122,31 +169,20 @@ class NotesFrame(ctk.CTkFrame):
         content = database.get_section_content(section_id)
         self.textbox.delete("0.0", "end")
         
-        # Try to deserialize as JSON (Rich Text)
-        try:
-            data = json.loads(content)
-            if isinstance(data, dict) and "content" in data and "tags" in data:
-                self.textbox.insert("0.0", data["content"])
-                # Apply tags
-                for tag_name, ranges in data["tags"].items():
-                    for start, end in ranges:
-                        self.textbox._textbox.tag_add(tag_name, start, end)
-            else:
-                # Fallback for plain text or legacy format
-                self.textbox.insert("0.0", content)
-        except (json.JSONDecodeError, TypeError):
-            # Not JSON, treat as plain text
-            self.textbox.insert("0.0", content)
+        # Any stored format (v2 runs, legacy JSON tag ranges, plain text)
+        text, runs = note_format.decode_note(content)
+        # Insert all runs with their font tags in a single Tk call instead of one tag_add per range
+        insert_args = []
+        for chunk, size in note_format.iter_runs(text, runs):
+            insert_args.extend((chunk, (f"font_{size}",) if size else ()))
+        if insert_args:
+            self.textbox._textbox.insert("1.0", *insert_args)
             
         self.textbox.edit_modified(False)
         self.dirty = False
         
         # Highlight active section button
-        for widget in self.sections_scroll.winfo_children():
-            if widget.cget("text") == title:
-                widget.configure(fg_color=COLOR_PRIMARY, text_color=COLOR_BG)
-            else:
-                widget.configure(fg_color="transparent", text_color=COLOR_TEXT)
+        self.highlight_active_section()
 
     def add_section_dialog(self):
         if self.dirty:
@@ -215,25 +251,17 @@ class NotesFrame(ctk.CTkFrame):
         if self.username and self.current_section_id and self.dirty:
             # Serialize content and tags
             text_content = self.textbox.get("0.0", "end-1c") # -1c to remove trailing newline added by Text widget
-            tags_data = {}
+            tag_ranges = {}
             
             for size in self.font_sizes:
                 tag_name = f"font_{size}"
                 ranges = self.textbox._textbox.tag_ranges(tag_name)
-                # ranges is a flat tuple (start1, end1, start2, end2, ...)
-                # Convert to list of pairs
+                # ranges is a flat tuple (start1, end1, start2, end2, ...), which note_format takes as-is
                 if ranges:
-                    pairs = []
-                    for i in range(0, len(ranges), 2):
-                        pairs.append((str(ranges[i]), str(ranges[i+1])))
-                    tags_data[tag_name] = pairs
-            
-            data = {
-                "content": text_content,
-                "tags": tags_data
-            }
+                    tag_ranges[tag_name] = ranges
             
-            serialized_content = json.dumps(data)
+            # Stored as merged (size, length) runs, see note_format
+            serialized_content = note_format.encode_note(text_content, tag_ranges)
             database.save_section_content(self.current_section_id, serialized_content)
             self.dirty = False
             
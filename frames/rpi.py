@@ -1,8 +1,31 @@
 import customtkinter as ctk
 from config import *
-import socket
+import collections
+import random
 import threading
 import time
+import database
+from rpi_client import RPIConnection
+from rpi_protocol import ERROR, OUTPUT, CHUNK, EXIT, SUBSCRIBED, TELEMETRY, PONG
+
+STREAM_FLUSH_MS = 50 # Streamed output is batched into one UI update per this many ms
+MAX_BUBBLE_CHARS = 20000 # A streaming bubble shows only the tail of longer outputs
+TELEMETRY_INTERVAL = 2 # Seconds between health samples pushed by the server
+HEARTBEAT_INTERVAL = 5 # Seconds between PINGs to servers that support heartbeats
+DEAD_PEER_WINDOW = 15 # Seconds without hearing from the Pi before the connection counts as dead (setting "rpi_dead_peer_window")
+RECONNECT_BASE_DELAY = 1.0 # Backoff before the first reconnect attempt, doubled for each failure
+RECONNECT_MAX_DELAY = 60.0
+
+def reconnect_delay(attempt):
+    delay = min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2 ** attempt)
+    # Jitter, so a room full of clients doesn't hammer a rebooted Pi in lockstep
+    return random.uniform(delay / 2, delay)
+
+def format_rate(bytes_per_second):
+    rate = (bytes_per_second or 0) / 1024
+    if rate > 1024:
+        return f"{rate / 1024:.1f} MB/s"
+    return f"{rate:.1f} KB/s"
 
 class RPIFrame(ctk.CTkFrame):
     def __init__(self, master):
@@ -21,6 +44,10 @@ class RPIFrame(ctk.CTkFrame):
                                             fg_color=COLOR_CARD, hover_color=COLOR_PRIMARY,
                                             command=self.toggle_connection, state="disabled")
         self.connection_btn.grid(row=0, column=1, padx=20)
+
+        # Live Pi health, pushed by servers that support telemetry
+        self.telemetry_label = ctk.CTkLabel(self.header_frame, text="", font=FONT_SMALL, text_color="#95a5a6")
+        self.telemetry_label.grid(row=1, column=0, padx=(140, 0))
         
         self.chat_scroll = ctk.CTkScrollableFrame(self, fg_color="transparent")
         self.chat_scroll.grid(row=1, column=0, padx=20, pady=(0, 20), sticky="nsew")
@@ -39,12 +66,33 @@ class RPIFrame(ctk.CTkFrame):
                                       command=self.send_message)
         self.send_btn.grid(row=0, column=1)
 
+        # Shown while a streamed command is running
+        self.stop_btn = ctk.CTkButton(self.input_frame, text="Stop", width=80, height=50, corner_radius=25, font=FONT_BODY,
+                                      fg_color=COLOR_DANGER, hover_color="#8a1f15",
+                                      command=self.stop_command)
+
         self.rpi_ip = None
         self.rpi_user = None
         self.rpi_pass = None
         self.rpi_port = 5000
-        self.socket = None
+        self.connection = None
         self.connected = False
+
+        # Reconnect state: commands typed while the link is down wait in outbox
+        self.auto_reconnect = False
+        self.reconnecting = False
+        self.reconnect_stop = threading.Event()
+        self.outbox = collections.deque()
+        self.dead_peer_window = DEAD_PEER_WINDOW
+
+        # Streaming state: receive thread appends to pending_output, the Tk thread drains it
+        self.output_lock = threading.Lock()
+        self.pending_output = []
+        self.flush_scheduled = False
+        self.stream_bubble = None
+        self.stream_text = ""
+        self.running_commands = 0
+        self.cancel_requested = False
         
     def set_rpi_info(self, ip, user=None, pwd=None, port=5000):
         """Set RPI info and attempt connection if not already connected."""
@@ -60,13 +108,18 @@ class RPIFrame(ctk.CTkFrame):
             return # Already connected
             
         # Start connection in a separate thread
+        self.load_dead_peer_window()
         threading.Thread(target=self.connect_to_rpi, daemon=True).start()
 
     def toggle_connection(self):
         if self.connected:
             self.show_disconnect_popup()
+        elif self.reconnecting:
+            self.stop_reconnecting()
+            self.append_message("System", "Stopped reconnecting.")
         else:
             self.append_message("System", "Connecting...")
+            self.load_dead_peer_window()
             threading.Thread(target=self.connect_to_rpi, daemon=True).start()
 
     def show_disconnect_popup(self):
@@ -117,59 +170,251 @@ class RPIFrame(ctk.CTkFrame):
         self.disconnect_rpi()
 
     def disconnect_rpi(self):
-        if self.socket:
-            try:
-                self.socket.close()
-            except:
-                pass
+        self.stop_reconnecting()
+        connection = self.connection
         self.connected = False
-        self.socket = None
+        self.connection = None
+        if connection:
+            connection.close()
+        self.running_commands = 0
         self.update_ui_state()
         self.append_message("System", "Disconnected from RPi.")
 
+    def stop_reconnecting(self):
+        self.auto_reconnect = False
+        self.reconnect_stop.set()
+        self.reconnecting = False
+        if self.outbox:
+            self.append_message("System", f"Dropped {len(self.outbox)} unsent command(s).")
+            self.outbox.clear()
+        self.update_ui_state()
+
     def update_ui_state(self):
         if self.connected:
             self.connection_btn.configure(text="Disconnect", fg_color=COLOR_DANGER, state="normal")
             self.entry.configure(state="normal", placeholder_text="Enter command...")
             self.send_btn.configure(state="normal")
+        elif self.reconnecting:
+            # Commands typed now are queued and sent once the connection is back
+            self.connection_btn.configure(text="Stop Reconnecting", fg_color=COLOR_ACCENT_2, state="normal")
+            self.entry.configure(state="normal", placeholder_text="Reconnecting - commands will be sent when back")
+            self.send_btn.configure(state="normal")
+            self.telemetry_label.configure(text="")
         else:
             self.connection_btn.configure(text="Connect", fg_color=COLOR_SUCCESS, state="normal")
             self.entry.configure(state="disabled", placeholder_text="Disconnected - Click Connect to start")
             self.send_btn.configure(state="disabled")
+            self.telemetry_label.configure(text="")
+        self.update_stop_button()
+
+    def load_dead_peer_window(self):
+        # On the Tk thread: a worker reading settings would leave its own DB connection open
+        self.dead_peer_window = database.get_setting("rpi_dead_peer_window", DEAD_PEER_WINDOW)
 
-    def connect_to_rpi(self):
-        self.master.after(0, lambda: self.connection_btn.configure(state="disabled", text="Connecting..."))
-        self.append_message("System", f"Connecting to {self.rpi_ip}:{self.rpi_port}...")
+    def connect_to_rpi(self, reconnect=False):
+        """Open the connection (on a worker thread). Returns True on success."""
+        if not reconnect:
+            self.master.after(0, lambda: self.connection_btn.configure(state="disabled", text="Connecting..."))
+            self.master.after(0, self.append_message, "System", f"Connecting to {self.rpi_ip}:{self.rpi_port}...")
         try:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.settimeout(5)
-            self.socket.connect((self.rpi_ip, self.rpi_port))
-            self.socket.settimeout(None) # Remove timeout after connection
+            connection = RPIConnection(self.rpi_ip, self.rpi_port, timeout=5, heartbeat=True,
+                                       keepalive=self.dead_peer_window)
+            connection.connect()
+            if reconnect and self.reconnect_stop.is_set():
+                connection.close() # User gave up while we were connecting
+                return False
+            self.connection = connection
             self.connected = True
-            self.master.after(0, self.append_message, "System", "Connected to RPi!")
+            self.running_commands = 0
+            self.auto_reconnect = True
+            self.reconnecting = False
+            if reconnect:
+                self.master.after(0, self.append_message, "System", "Reconnected to RPi!")
+            elif connection.framed:
+                self.master.after(0, self.append_message, "System", "Connected to RPi!")
+            else:
+                self.master.after(0, self.append_message, "System",
+                                  "Connected to RPi! (older server, long commands and outputs may be cut up)")
             self.master.after(0, self.update_ui_state)
             
             # Start listening thread
-            threading.Thread(target=self.receive_messages, daemon=True).start()
+            threading.Thread(target=self.receive_messages, args=(connection,), daemon=True).start()
+            if connection.supports_heartbeat:
+                threading.Thread(target=self.heartbeat, args=(connection,), daemon=True).start()
+            if connection.supports_telemetry:
+                connection.subscribe(TELEMETRY_INTERVAL)
+            self.master.after(0, self.send_outbox)
+            return True
         except Exception as e:
-            self.master.after(0, self.append_message, "Error", f"Connection failed: {e}")
-            self.connected = False
-            self.master.after(0, self.update_ui_state)
+            if not reconnect:
+                self.master.after(0, self.append_message, "Error", f"Connection failed: {e}")
+                self.connected = False
+                self.master.after(0, self.update_ui_state)
+            return False
 
-    def receive_messages(self):
-        while self.connected:
+    def heartbeat(self, connection):
+        """PING the server regularly and declare the connection dead after dead_peer_window of silence."""
+        while connection is self.connection and self.connected:
+            time.sleep(min(HEARTBEAT_INTERVAL, self.dead_peer_window / 3))
+            if connection is not self.connection:
+                return
+            silence = time.monotonic() - connection.last_received
+            if silence > self.dead_peer_window:
+                self.connection_lost(connection, f"no reply from the Pi for {silence:.0f}s")
+                return
             try:
-                data = self.socket.recv(4096).decode('utf-8')
-                if not data:
-                    break
-                self.master.after(0, self.append_message, "RPi", data)
+                connection.ping()
+            except OSError as e:
+                self.connection_lost(connection, e)
+                return
+
+    def connection_lost(self, connection, reason):
+        """The link dropped under us (any thread): tidy up and start reconnecting."""
+        if connection is not self.connection or not self.connected:
+            return # Already handled, or a manual disconnect
+        self.connected = False
+        connection.close() # Unblocks the receive thread
+        self.master.after(0, self.handle_connection_lost, reason)
+
+    def handle_connection_lost(self, reason):
+        self.append_message("Error", f"Connection lost: {reason}")
+        if self.running_commands:
+            # Already sent, so not safe to send again: the Pi may have run them
+            self.flush_output()
+            self.append_message("System", f"{self.running_commands} running command(s) were cut off, their results are lost.")
+            self.stream_bubble = None
+            self.stream_text = ""
+            self.running_commands = 0
+            self.cancel_requested = False
+        if self.auto_reconnect and not self.reconnecting:
+            self.reconnecting = True
+            self.reconnect_stop.clear()
+            threading.Thread(target=self.reconnect_loop, daemon=True).start()
+        self.update_ui_state()
+
+    def reconnect_loop(self):
+        attempt = 0
+        while self.auto_reconnect and not self.connected:
+            delay = reconnect_delay(attempt)
+            self.master.after(0, self.append_message, "System", f"Reconnecting in {delay:.1f}s (attempt {attempt + 1})...")
+            if self.reconnect_stop.wait(delay):
+                return
+            if self.connect_to_rpi(reconnect=True):
+                return
+            attempt += 1
+
+    def send_outbox(self):
+        """Send commands queued while disconnected, in order."""
+        if self.outbox:
+            self.append_message("System", f"Sending {len(self.outbox)} queued command(s)...")
+        while self.outbox and self.connected:
+            if not self.send_command(self.outbox[0]):
+                return
+            self.outbox.popleft()
+
+    def receive_messages(self, connection):
+        while self.connected and connection is self.connection:
+            try:
+                frame_type, value = connection.receive()
+                if frame_type == CHUNK:
+                    with self.output_lock:
+                        self.pending_output.append(value)
+                        if not self.flush_scheduled:
+                            self.flush_scheduled = True
+                            self.master.after(STREAM_FLUSH_MS, self.flush_output)
+                elif frame_type == EXIT:
+                    self.master.after(0, self.finish_command, value)
+                elif frame_type == TELEMETRY:
+                    self.master.after(0, self.show_telemetry, value)
+                elif frame_type == SUBSCRIBED:
+                    if value.get("error"):
+                        self.master.after(0, lambda text=value["error"]: self.telemetry_label.configure(text=text))
+                elif frame_type == ERROR:
+                    self.master.after(0, self.append_message, "Error", value)
+                    if not connection.streaming:
+                        self.master.after(0, self.finish_command, None) # A refused command's only reply
+                elif frame_type == PONG:
+                    pass # Heartbeat reply; receive() already noted the time
+                else:
+                    # One framed message is one bubble, however large
+                    self.master.after(0, self.append_message, "RPi", value)
+                    if frame_type == OUTPUT:
+                        # Legacy servers may split one reply over several of these; finish_command
+                        # never counts below zero
+                        self.master.after(0, self.finish_command, None)
             except Exception as e:
-                if self.connected: # Only show error if we didn't manually disconnect
-                    self.master.after(0, self.append_message, "Error", f"Connection lost: {e}")
-                    self.connected = False
-                    self.master.after(0, self.update_ui_state)
+                self.connection_lost(connection, e) # No-op after a manual disconnect
                 break
 
+    def show_telemetry(self, sample):
+        if not self.connected:
+            return
+        parts = []
+        if sample["cpu"] is not None:
+            parts.append(f"CPU {sample['cpu']:.0f}%")
+        if sample["ram"] is not None:
+            parts.append(f"RAM {sample['ram']:.0f}%")
+        if sample["temp"] is not None:
+            parts.append(f"{sample['temp']:.1f}°C")
+        if sample["disk"] is not None:
+            parts.append(f"Disk {sample['disk']:.0f}%")
+        if sample["net_down"] is not None:
+            parts.append(f"↓ {format_rate(sample['net_down'])} | ↑ {format_rate(sample['net_up'])}")
+        self.telemetry_label.configure(text="  ·  ".join(parts))
+
+    def flush_output(self):
+        """Append streamed output that arrived since the last flush to the current bubble."""
+        with self.output_lock:
+            text = "".join(self.pending_output)
+            self.pending_output = []
+            self.flush_scheduled = False
+        if not text:
+            return
+        self.stream_text += text
+        shown = self.stream_text
+        if len(shown) > MAX_BUBBLE_CHARS:
+            shown = "... (earlier output trimmed)\n" + shown[-MAX_BUBBLE_CHARS:]
+            self.stream_text = self.stream_text[-MAX_BUBBLE_CHARS:]
+        if self.stream_bubble is None or not self.stream_bubble.winfo_exists():
+            self.stream_bubble = self.append_message("RPi", shown)
+        else:
+            self.stream_bubble.configure(text=shown)
+            self.chat_scroll._parent_canvas.yview_moveto(1.0)
+
+    def finish_command(self, result):
+        """End of one command's reply: result is the EXIT data, or None for a built-in OUTPUT."""
+        if result is not None:
+            self.flush_output()
+            code = result.get("code")
+            if result.get("error"):
+                self.append_message("Error", result["error"])
+            elif code is not None and code < 0 and self.cancel_requested:
+                self.append_message("System", "Command stopped.")
+            elif code:
+                self.append_message("System", f"Command exited with code {code}")
+            elif self.stream_bubble is None:
+                self.append_message("RPi", "(Command executed with no output)")
+        self.stream_bubble = None
+        self.stream_text = ""
+        self.running_commands = max(0, self.running_commands - 1)
+        if self.running_commands == 0:
+            self.cancel_requested = False
+        self.update_stop_button()
+
+    def stop_command(self):
+        if self.connection and self.running_commands:
+            self.cancel_requested = True
+            try:
+                self.connection.cancel()
+            except Exception as e:
+                self.append_message("Error", f"Failed to stop command: {e}")
+
+    def update_stop_button(self):
+        if self.connected and self.running_commands and self.connection and self.connection.streaming:
+            self.stop_btn.grid(row=0, column=2, padx=(15, 0))
+        else:
+            self.stop_btn.grid_remove()
+
     def send_message(self, event=None):
         message = self.entry.get()
         if not message or not message.strip():
@@ -178,14 +423,29 @@ class RPIFrame(ctk.CTkFrame):
         self.append_message("User", message)
         self.entry.delete(0, "end")
         
-        if self.connected and self.socket:
-            try:
-                self.socket.send(message.encode('utf-8'))
-            except Exception as e:
-                self.append_message("Error", f"Failed to send: {e}")
+        if self.connected and self.connection and not self.outbox:
+            if not self.send_command(message):
+                self.outbox.append(message)
+        elif self.reconnecting or self.outbox:
+            self.outbox.append(message)
+            self.append_message("System", "Queued, will be sent when the connection is back.")
         else:
             self.append_message("System", "Not connected to RPi.")
 
+    def send_command(self, message):
+        """Send one command, returns False (and starts reconnecting) if the link is dead."""
+        connection = self.connection
+        try:
+            connection.send_command(message)
+        except Exception as e:
+            self.connection_lost(connection, e)
+            return False
+        # Counted for every kind of server, so a link lost while a reply is due is reported
+        # the same way (the Stop button still only shows for streaming servers)
+        self.running_commands += 1
+        self.update_stop_button()
+        return True
+
     def append_message(self, sender, text):
         bubble_frame = ctk.CTkFrame(self.chat_scroll, fg_color="transparent")
         bubble_frame.pack(fill="x", pady=5)
@@ -209,3 +469,4 @@ class RPIFrame(ctk.CTkFrame):
             
         self.chat_scroll.update_idletasks()
         self.chat_scroll._parent_canvas.yview_moveto(1.0)
+        return bubble
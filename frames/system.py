@@ -10,6 +10,10 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 import matplotlib.pyplot as plt
 from config import *
+from metrics_store import MetricsStore
+
+HISTORY_POINTS = 120 # Points per history chart; one per chart pixel column is plenty
+HISTORY_REQUERY_TICKS = 60 # Refreshes between re-reads of the store; live samples fill the charts in between
 
 class SystemFrame(ctk.CTkFrame):
     def __init__(self, master):
@@ -30,6 +34,15 @@ class SystemFrame(ctk.CTkFrame):
         self.net_label = ctk.CTkLabel(self.info_frame, text="Network: Calculating...", font=FONT_BODY, text_color="gray70", anchor="w")
         self.net_label.pack(fill="x")
 
+        # History range: "Live" shows the last 60 samples, the others query the metrics store
+        self.history_ranges = {"Live": None, "1H": 3600, "24H": 86400, "7D": 7 * 86400}
+        self.range_selector = ctk.CTkSegmentedButton(self.info_frame, values=list(self.history_ranges),
+                                                     command=self.change_history_range)
+        self.range_selector.set("Live")
+        self.range_selector.pack(anchor="e", pady=(5, 0))
+        self.history_span = None
+        self.history_series = None # {metric: [values]} of the selected range, see load_history
+
         # --- Graphs Section ---
         self.graphs_frame = ctk.CTkFrame(self, fg_color="transparent")
         self.graphs_frame.grid(row=1, column=0, sticky="nsew", padx=20, pady=10)
@@ -43,6 +56,10 @@ class SystemFrame(ctk.CTkFrame):
         self.ram_data = [0] * 60
         self.gpu_data = [0] * 60
         self.disk_data = [0] * 60
+
+        # Samples persist across restarts; pick up where the last session left off
+        self.metrics = MetricsStore()
+        self.load_recent_history()
         
         # Create Charts (2x2 Grid)
         self.cpu_chart = self.create_chart(self.graphs_frame, 0, 0, "CPU Usage (%)", COLOR_ACCENT_1)
@@ -110,6 +127,69 @@ class SystemFrame(ctk.CTkFrame):
                 pass
         return None
 
+    def load_recent_history(self):
+        now = int(time.time())
+        timestamps, series = self.metrics.query(now - 60, now + 1, max_points=60)
+        for name, data in (("cpu", self.cpu_data), ("ram", self.ram_data), ("gpu", self.gpu_data), ("disk", self.disk_data)):
+            values = [value or 0 for value in series[name]]
+            if values:
+                data[-len(values):] = values
+
+    def change_history_range(self, value):
+        self.history_span = self.history_ranges[value]
+        self.history_series = None
+        self.refresh_charts()
+
+    def load_history(self):
+        # query() flushes the write buffer and aggregates the whole span, so it's only
+        # done on a range change and every HISTORY_REQUERY_TICKS refreshes
+        now = int(time.time())
+        timestamps, series = self.metrics.query(now - self.history_span, now + 1, max_points=HISTORY_POINTS)
+        self.history_series = {name: [value or 0 for value in values] for name, values in series.items()}
+        self.history_bucket = self.history_span / HISTORY_POINTS
+        self.history_bucket_end = (timestamps[-1] if timestamps else now) + self.history_bucket
+        self.history_bucket_samples = 1
+        self.history_ticks = 0
+
+    def add_history_sample(self, sample):
+        """Fold a live sample into the newest point, or start a new one once its bucket is over."""
+        now = time.time()
+        if now >= self.history_bucket_end:
+            while self.history_bucket_end <= now:
+                self.history_bucket_end += self.history_bucket
+            for name, value in sample.items():
+                values = self.history_series[name]
+                values.append(value)
+                del values[:-HISTORY_POINTS]
+            self.history_bucket_samples = 1
+            return
+        self.history_bucket_samples += 1
+        for name, value in sample.items():
+            values = self.history_series[name]
+            if values:
+                values[-1] += (value - values[-1]) / self.history_bucket_samples
+            else:
+                values.append(value)
+
+    def refresh_charts(self, sample=None):
+        if self.history_span is None:
+            self.update_chart(self.cpu_chart, self.cpu_data)
+            self.update_chart(self.ram_chart, self.ram_data)
+            self.update_chart(self.gpu_chart, self.gpu_data)
+            self.update_chart(self.disk_chart, self.disk_data)
+            return
+        if self.history_series is None or self.history_ticks >= HISTORY_REQUERY_TICKS:
+            self.load_history()
+        elif sample is not None:
+            self.add_history_sample(sample)
+        self.history_ticks += 1
+        for chart, name in ((self.cpu_chart, "cpu"), (self.ram_chart, "ram"), (self.gpu_chart, "gpu"), (self.disk_chart, "disk")):
+            self.update_chart(chart, self.history_series[name])
+
+    def destroy(self):
+        self.metrics.close()
+        super().destroy()
+
     def set_refresh_rate(self, seconds):
         self.refresh_rate = int(seconds * 1000)
 
@@ -131,13 +211,11 @@ class SystemFrame(ctk.CTkFrame):
             cpu_pct = psutil.cpu_percent()
             self.cpu_data.append(cpu_pct)
             self.cpu_data.pop(0)
-            self.update_chart(self.cpu_chart, self.cpu_data)
 
             # RAM
             ram = psutil.virtual_memory()
             self.ram_data.append(ram.percent)
             self.ram_data.pop(0)
-            self.update_chart(self.ram_chart, self.ram_data)
 
             # GPU
             gpu_info = self.get_gpu_info()
@@ -150,17 +228,17 @@ class SystemFrame(ctk.CTkFrame):
                 # Keep CPU info but don't append GPU info if not found
                 
             self.gpu_data.pop(0)
-            self.update_chart(self.gpu_chart, self.gpu_data)
 
             # Disk
             disk = psutil.disk_usage('/')
             self.disk_data.append(disk.percent)
             self.disk_data.pop(0)
-            self.update_chart(self.disk_chart, self.disk_data)
+            self.refresh_charts({"cpu": cpu_pct, "ram": ram.percent, "gpu": self.gpu_data[-1], "disk": disk.percent})
 
             # Network Speed
             net_io = psutil.net_io_counters()
             current_time = time.time()
+            download_kbps = upload_kbps = None
             
             if hasattr(self, 'last_net_io') and hasattr(self, 'last_time'):
                 time_diff = current_time - self.last_time
@@ -170,6 +248,7 @@ class SystemFrame(ctk.CTkFrame):
                     
                     upload_speed = (bytes_sent / time_diff) / 1024 # KB/s
                     download_speed = (bytes_recv / time_diff) / 1024 # KB/s
+                    upload_kbps, download_kbps = upload_speed, download_speed
                     
                     up_unit = "KB/s"
                     down_unit = "KB/s"
@@ -186,6 +265,15 @@ class SystemFrame(ctk.CTkFrame):
             self.last_net_io = net_io
             self.last_time = current_time
 
+            self.metrics.record({
+                "cpu": cpu_pct,
+                "ram": ram.percent,
+                "gpu": gpu_info[0] if gpu_info else None,
+                "disk": disk.percent,
+                "net_down": download_kbps,
+                "net_up": upload_kbps,
+            }, ts=current_time)
+
             self.after(self.refresh_rate, self.update_stats)
 
     def update_chart(self, chart_tuple, data):
@@ -194,6 +282,7 @@ class SystemFrame(ctk.CTkFrame):
         # Update line data
         x_data = range(len(data))
         line.set_data(x_data, data)
+        ax.set_xlim(0, max(len(data) - 1, 1))
         
         # Update fill_between
         # Remove old fill collection
@@ -0,0 +1,122 @@
+import math
+import sqlite3
+import time
+
+METRICS_DB_NAME = "metrics.db"
+
+# Metrics recorded per sample. Values are stored as integers scaled by SCALE
+# (23.4 -> 234), which SQLite packs into 1-2 bytes instead of an 8-byte REAL.
+METRICS = ("cpu", "ram", "gpu", "disk", "net_down", "net_up")
+SCALE = 10
+
+# (table, seconds per row, seconds kept). Each level is rolled up from the one above it.
+RESOLUTIONS = (
+    ("metrics_1s", 1, 2 * 24 * 3600),
+    ("metrics_1m", 60, 30 * 24 * 3600),
+    ("metrics_1h", 3600, 2 * 365 * 24 * 3600),
+)
+
+FLUSH_EVERY = 10 # Samples buffered in memory per batched insert
+MAX_SCAN_ROWS = 20000 # A query never reads more rows than this from one table
+
+class MetricsStore:
+    """
+    Append-only, downsampling time-series store for system metrics.
+    Samples are buffered and inserted in batches; complete minutes and hours are rolled up
+    on flush and old rows are dropped per RESOLUTIONS. Not thread-safe: use from one thread.
+    """
+
+    def __init__(self, path=METRICS_DB_NAME, flush_every=FLUSH_EVERY):
+        self.flush_every = flush_every
+        self.buffer = []
+        self.last_hour_rolled = None
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        columns = ", ".join(f"{metric} INTEGER" for metric in METRICS)
+        for table, _, _ in RESOLUTIONS:
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (ts INTEGER PRIMARY KEY, {columns})")
+
+    def record(self, values, ts=None):
+        """Buffer one sample. values maps metric name -> float; missing metrics are stored as NULL."""
+        ts = int(ts if ts is not None else time.time())
+        self.buffer.append((ts,) + tuple(
+            None if values.get(metric) is None else round(values[metric] * SCALE) for metric in METRICS
+        ))
+        if len(self.buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """Write buffered samples, then roll up and expire."""
+        if not self.buffer:
+            return
+        latest = self.buffer[-1][0]
+        placeholders = ", ".join("?" * (len(METRICS) + 1))
+        self.conn.execute("BEGIN")
+        try:
+            # Two samples in the same second: keep the newest
+            self.conn.executemany(f"INSERT OR REPLACE INTO metrics_1s VALUES ({placeholders})", self.buffer)
+            self._rollup(RESOLUTIONS[0], RESOLUTIONS[1], latest)
+            hour = latest - latest % 3600
+            if hour != self.last_hour_rolled:
+                # Hourly work: roll up hours and drop expired rows
+                self._rollup(RESOLUTIONS[1], RESOLUTIONS[2], latest)
+                self._expire(latest)
+                self.last_hour_rolled = hour
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.buffer = []
+
+    def _rollup(self, source, target, now):
+        source_table = source[0]
+        target_table, step, _ = target
+        # Only whole buckets that ended before the newest sample
+        end = now - now % step
+        last = self.conn.execute(f"SELECT MAX(ts) FROM {target_table}").fetchone()[0]
+        start = last + step if last is not None else 0
+        if start >= end:
+            return
+        averages = ", ".join(f"CAST(ROUND(AVG({metric})) AS INTEGER)" for metric in METRICS)
+        self.conn.execute(f'''
+            INSERT OR REPLACE INTO {target_table}
+            SELECT ts - ts % {step}, {averages} FROM {source_table}
+            WHERE ts >= ? AND ts < ? GROUP BY ts - ts % {step}
+        ''', (start, end))
+
+    def _expire(self, now):
+        for table, _, keep in RESOLUTIONS:
+            self.conn.execute(f"DELETE FROM {table} WHERE ts < ?", (now - keep,))
+
+    def query(self, start, end, max_points=300):
+        """
+        Return (timestamps, {metric: [values]}) for [start, end), downsampled to at most max_points.
+        Uses the finest stored resolution that still covers start and fits the scan budget.
+        """
+        self.flush()
+        span = max(end - start, 1)
+        newest = self.conn.execute("SELECT MAX(ts) FROM metrics_1s").fetchone()[0] or int(time.time())
+        table, step = RESOLUTIONS[-1][:2]
+        for candidate, candidate_step, keep in RESOLUTIONS:
+            if start >= newest - keep and span / candidate_step <= MAX_SCAN_ROWS:
+                table, step = candidate, candidate_step
+                break
+
+        bucket = max(step, math.ceil(span / max_points / step) * step)
+        averages = ", ".join(f"AVG({metric})" for metric in METRICS)
+        rows = self.conn.execute(f'''
+            SELECT ts - (ts - ?) % ?, {averages} FROM {table}
+            WHERE ts >= ? AND ts < ? GROUP BY 1 ORDER BY 1
+        ''', (start, bucket, start, end)).fetchall()
+
+        timestamps = [row[0] for row in rows]
+        series = {
+            metric: [None if row[i] is None else row[i] / SCALE for row in rows]
+            for i, metric in enumerate(METRICS, start=1)
+        }
+        return timestamps, series
+
+    def close(self):
+        self.flush()
+        self.conn.close()
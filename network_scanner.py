@@ -0,0 +1,644 @@
+import asyncio
+import collections
+import errno
+import ipaddress
+import queue
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import Future
+
+import psutil
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+import rpi_protocol as protocol
+
+# Network discovery: TCP connect scan over any set of IPv4 networks.
+# One asyncio loop keeps up to `concurrency` connects in flight, instead of a thread per
+# connect, and each connect's timeout follows the round-trip times seen so far (the way
+# TCP sizes its retransmit timer), so a quiet LAN is swept at LAN speed, not at a fixed
+# worst-case timeout.
+# Several ports can be swept at once: a host's ports are probed in parallel, so they cost
+# one round trip, not one sweep each, and every open port is asked what it is (SSH banner,
+# rpi_server HELLO) to tell a bare SSH box from a Pi already running the Nexus server.
+
+DEFAULT_PORT = 22
+RPI_SERVER_PORT = 5000
+DEVICE_PORTS = (DEFAULT_PORT, RPI_SERVER_PORT)
+CONCURRENCY = 512 # Connects in flight; each one also needs an ARP entry (Linux default table: 1024)
+FD_LIMIT = 512 # Assumed socket limit where it can't be read (Windows: select() handles 512 sockets)
+MIN_TIMEOUT = 0.3 # Seconds; floor for the adaptive timeout (Pis on Wi-Fi power save can be slow to wake)
+MAX_TIMEOUT = 2.0
+INITIAL_TIMEOUT = 1.0 # Used until the first host answers
+RECHECK_INTERVAL = 0.05 # How often a pending connect looks at the (shrinking) timeout again
+PROGRESS_INTERVAL = 0.1 # Seconds between on_progress calls
+BANNER_WAIT = 0.3 # Seconds an open port gets to speak first (SSH does) before it's sent a HELLO
+BANNER_TIMEOUT = 0.5 # Seconds to answer the HELLO
+BANNER_SIZE = 256
+HELLO_PORTS = (RPI_SERVER_PORT,) # rpi_server never speaks first: send the HELLO straight away
+HOSTNAME_TTL = 3600.0 # Seconds a resolved name is reused by later scans
+NEGATIVE_TTL = 300.0 # Seconds before an address without a PTR record is asked about again
+RESOLVER_WORKERS = 16 # Reverse lookups in flight; a missing PTR record can take seconds to fail
+MAX_CACHED_HOSTNAMES = 4096
+LOOKUP_GRACE = 1.0 # Seconds a finished sweep waits for outstanding hostnames
+MAX_HOSTS = 65536 # Refuse anything bigger than a /16 unless asked
+ARP_TABLE = "/proc/net/arp"
+ARP_COMPLETE = 0x2 # ATF_COM: the kernel has a MAC for this neighbour
+
+# Probe outcomes
+OPEN = "open"
+CLOSED = "closed" # Host answered with a reset: it's there, the port isn't
+TIMEOUT = "timeout"
+UNREACHABLE = "unreachable"
+
+# Services recognised on an open port
+SSH = "ssh"
+NEXUS = "nexus" # rpi_server, framed protocol
+NEXUS_LEGACY = "nexus-legacy" # rpi_server from before framing: runs the HELLO as a command and says so
+LEGACY_HELLO_REPLY = b"Error executing command: embedded null byte"
+
+def parse_targets(targets, max_hosts=MAX_HOSTS):
+    """
+    Expand CIDRs ("192.168.0.0/22"), single addresses or ip_network objects into a list
+    of host addresses (network and broadcast addresses excluded). Duplicates are dropped.
+    """
+    if isinstance(targets, (str, ipaddress.IPv4Network)):
+        targets = [targets]
+    hosts = []
+    seen = set()
+    for target in targets:
+        network = ipaddress.ip_network(target, strict=False)
+        if network.version != 4:
+            raise ValueError(f"{target}: only IPv4 networks can be swept")
+        if network.num_addresses > max_hosts + 2:
+            raise ValueError(f"{target}: {network.num_addresses} addresses is more than the {max_hosts} host limit")
+        for host in (network.hosts() if network.prefixlen < 31 else network):
+            if host not in seen:
+                seen.add(host)
+                hosts.append(host)
+        if len(hosts) > max_hosts:
+            raise ValueError(f"{len(hosts)} hosts is more than the {max_hosts} host limit")
+    return [str(host) for host in hosts]
+
+def interface_networks(include_loopback=False):
+    """{interface name: [IPv4Network, ...]} for interfaces that are up."""
+    stats = psutil.net_if_stats()
+    networks = {}
+    for name, addresses in psutil.net_if_addrs().items():
+        if name in stats and not stats[name].isup:
+            continue
+        for address in addresses:
+            if address.family != socket.AF_INET or not address.netmask:
+                continue
+            network = ipaddress.ip_network(f"{address.address}/{address.netmask}", strict=False)
+            if network.is_loopback and not include_loopback:
+                continue
+            networks.setdefault(name, []).append(network)
+    return networks
+
+def local_addresses():
+    return {address.address for addresses in psutil.net_if_addrs().values()
+            for address in addresses if address.family == socket.AF_INET}
+
+def parse_banner(data):
+    """{"service": SSH, NEXUS, NEXUS_LEGACY or None, "banner": text} from the first bytes a port sent."""
+    if data.startswith(b"SSH-"):
+        return {"service": SSH, "banner": data.split(b"\n", 1)[0].decode("ascii", errors="replace").strip()}
+    if data.startswith(protocol.MAGIC):
+        try:
+            length, frame_type = protocol.parse_header(data[len(protocol.MAGIC):][:protocol.HEADER.size])
+            start = len(protocol.MAGIC) + protocol.HEADER.size
+            hello = protocol.decode_json(data[start:start + length])
+        except (protocol.ProtocolError, struct.error):
+            frame_type = None # Cut short: not something we can read
+        if frame_type == protocol.HELLO:
+            return {"service": NEXUS, "banner": f"Nexus protocol v{hello.get('version')}",
+                    "features": hello.get("features", [])}
+    if data.startswith(LEGACY_HELLO_REPLY):
+        return {"service": NEXUS_LEGACY, "banner": "Nexus (legacy protocol)"}
+    return {"service": None, "banner": data.split(b"\n", 1)[0][:80].decode("utf-8", errors="replace").strip()}
+
+def classify(services):
+    """One-line description of a device from {port: parse_banner() result} of its open ports."""
+    found = {info["service"] for info in services.values()}
+    if NEXUS in found:
+        kind = "Nexus server running"
+    elif NEXUS_LEGACY in found:
+        kind = "Nexus server running (old version)"
+    elif SSH in found:
+        return "SSH only"
+    else:
+        return "Port " + ", ".join(map(str, sorted(services))) + " open"
+    return kind + (" + SSH" if SSH in found else "")
+
+def read_arp_table(path=ARP_TABLE):
+    """{ip: mac} for resolved entries of the kernel's neighbour table (empty where there is none)."""
+    table = {}
+    try:
+        with open(path) as f:
+            next(f, None) # Header
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 4 and int(fields[2], 16) & ARP_COMPLETE:
+                    table[fields[0]] = fields[3].lower()
+    except (OSError, ValueError):
+        pass
+    return table
+
+class RttEstimator:
+    """Smoothed connect round-trip time and variance (RFC 6298), turned into a probe timeout."""
+
+    def __init__(self, min_timeout=MIN_TIMEOUT, max_timeout=MAX_TIMEOUT, initial=INITIAL_TIMEOUT):
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.initial = min(max(initial, min_timeout), max_timeout)
+        self.srtt = None
+        self.rttvar = None
+        self.samples = 0
+
+    def add(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.samples += 1
+
+    def timeout(self):
+        if self.srtt is None:
+            return self.initial
+        return min(max(self.srtt + 4 * self.rttvar, self.min_timeout), self.max_timeout)
+
+class AsyncScanner:
+    """
+    TCP connect sweep of many hosts on one asyncio loop. port may be a list of ports, all
+    probed at once on each host. concurrency (hosts in flight) is capped by the process's
+    file descriptor limit. With identify, open ports are fingerprinted (see parse_banner).
+    """
+
+    def __init__(self, port=DEFAULT_PORT, concurrency=CONCURRENCY, min_timeout=MIN_TIMEOUT,
+                 max_timeout=MAX_TIMEOUT, initial_timeout=INITIAL_TIMEOUT, identify=False):
+        self.ports = (port,) if isinstance(port, int) else tuple(port)
+        self.port = self.ports[0]
+        self.identify = identify
+        soft_limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0] if resource else FD_LIMIT
+        self.concurrency = max(1, min(concurrency, (soft_limit - 64) // len(self.ports)))
+        self.rtt = RttEstimator(min_timeout, max_timeout, initial_timeout)
+        self.stats = {OPEN: 0, CLOSED: 0, TIMEOUT: 0, UNREACHABLE: 0} # Per port probed
+        self.hosts_done = 0
+
+    async def probe(self, ip, port, identify=False):
+        """
+        Try one TCP connect; returns (OPEN, CLOSED, TIMEOUT or UNREACHABLE, service).
+        service is parse_banner()'s verdict on an open port when identify is set, else None.
+        """
+        loop = asyncio.get_running_loop()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        start = loop.time()
+        connect = asyncio.ensure_future(loop.sock_connect(sock, (ip, port)))
+        try:
+            while True:
+                # The timeout shrinks as answers come in, so keep re-reading it
+                remaining = start + self.rtt.timeout() - loop.time()
+                if remaining <= 0:
+                    return TIMEOUT, None
+                done, _ = await asyncio.wait({connect}, timeout=min(remaining, RECHECK_INTERVAL))
+                if done:
+                    break
+            try:
+                connect.result()
+            except ConnectionRefusedError:
+                self.rtt.add(loop.time() - start)
+                return CLOSED, None
+            except OSError as e:
+                if e.errno in (errno.EHOSTUNREACH, errno.ENETUNREACH, errno.EHOSTDOWN):
+                    return UNREACHABLE, None
+                raise
+            self.rtt.add(loop.time() - start)
+            return OPEN, (await self.read_banner(sock, port) if identify else None)
+        finally:
+            if not connect.done():
+                connect.cancel()
+                # Let the cancellation unregister the fd before closing it, or a new socket
+                # reusing the number could lose its registration
+                await asyncio.wait({connect})
+            sock.close()
+
+    async def read_banner(self, sock, port):
+        loop = asyncio.get_running_loop()
+        data = b""
+        if port not in HELLO_PORTS:
+            data = await self._receive(loop, sock, BANNER_WAIT)
+        if not data:
+            # Quiet so far: maybe an rpi_server, which answers a HELLO (and ignores the
+            # connection otherwise). Empty features: nothing to negotiate for a peek.
+            try:
+                await loop.sock_sendall(sock, protocol.client_hello(()))
+            except OSError:
+                return parse_banner(b"")
+            data = await self._receive(loop, sock, BANNER_TIMEOUT)
+        return parse_banner(data)
+
+    async def _receive(self, loop, sock, timeout):
+        try:
+            return await asyncio.wait_for(loop.sock_recv(sock, BANNER_SIZE), timeout)
+        except (asyncio.TimeoutError, OSError):
+            return b""
+
+    async def probe_host(self, ip):
+        """Probe every port of one host at once; returns {port: (outcome, service)}."""
+        async def probe(port):
+            try:
+                return await self.probe(ip, port, self.identify)
+            except OSError:
+                return UNREACHABLE, None
+
+        results = await asyncio.gather(*(probe(port) for port in self.ports))
+        for outcome, _ in results:
+            self.stats[outcome] += 1
+        self.hosts_done += 1
+        return dict(zip(self.ports, results))
+
+    async def scan(self, targets, on_open=None):
+        """
+        Probe self.ports on every target host (see parse_targets). Returns the addresses with
+        any port open, in address order; on_open(ip, services) is called as each one is found,
+        services being {port: parse_banner() result or None} for its open ports.
+        """
+        return await self.scan_hosts(parse_targets(targets), on_open)
+
+    async def scan_hosts(self, hosts, on_open=None):
+        """scan() over an already expanded list of address strings, probed in the order given."""
+        pending = iter(hosts)
+        found = []
+
+        async def worker():
+            for ip in pending: # Shared iterator: each host is taken by exactly one worker
+                results = await self.probe_host(ip)
+                services = {port: service for port, (outcome, service) in results.items() if outcome == OPEN}
+                if services:
+                    found.append(ip)
+                    if on_open:
+                        on_open(ip, services)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(hosts)))))
+        return sorted(found, key=ipaddress.ip_address)
+
+class HostnameResolver:
+    """
+    Reverse DNS on its own pool of threads, with a TTL cache shared by every scan.
+    resolve(ip) returns a concurrent.futures.Future of the hostname (None when the address
+    has no name); cached answers come back already done, concurrent asks for the same
+    address share one lookup. Names that don't exist are cached for NEGATIVE_TTL.
+    """
+
+    def __init__(self, workers=RESOLVER_WORKERS, ttl=HOSTNAME_TTL, negative_ttl=NEGATIVE_TTL,
+                 max_entries=MAX_CACHED_HOSTNAMES):
+        self.workers = workers
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict() # ip -> (expires (monotonic), hostname or None)
+        self.inflight = {}
+        self.pending = queue.Queue()
+        self.threads = []
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "negative_hits": 0, "misses": 0, "shared": 0, "expired": 0}
+
+    def resolve(self, ip):
+        with self.lock:
+            entry = self.entries.get(ip)
+            if entry is not None:
+                expires, hostname = entry
+                if time.monotonic() < expires:
+                    self.entries.move_to_end(ip)
+                    self.stats["hits" if hostname else "negative_hits"] += 1
+                    future = Future()
+                    future.set_result(hostname)
+                    return future
+                del self.entries[ip]
+                self.stats["expired"] += 1
+            future = self.inflight.get(ip)
+            if future is not None:
+                self.stats["shared"] += 1
+                return future
+            self.stats["misses"] += 1
+            future = self.inflight[ip] = Future()
+            # Daemon threads rather than an executor: a lookup stuck on a dead DNS server
+            # mustn't hold up interpreter exit
+            if len(self.threads) < self.workers:
+                thread = threading.Thread(target=self._work, daemon=True)
+                self.threads.append(thread)
+                thread.start()
+        self.pending.put(ip)
+        return future
+
+    def cached(self, ip):
+        """The cached hostname for ip, or None (without starting a lookup)."""
+        with self.lock:
+            entry = self.entries.get(ip)
+        if entry is not None and time.monotonic() < entry[0]:
+            return entry[1]
+        return None
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def _work(self):
+        while True:
+            ip = self.pending.get()
+            ttl = self.negative_ttl
+            try:
+                hostname = socket.gethostbyaddr(ip)[0]
+                ttl = self.ttl
+            except socket.herror as e:
+                hostname = None
+                if e.errno == 2: # TRY_AGAIN: the DNS server didn't answer, don't remember that
+                    ttl = 0
+            except OSError:
+                hostname = None
+                ttl = 0
+            with self.lock:
+                if ttl:
+                    self.entries[ip] = (time.monotonic() + ttl, hostname)
+                    self.entries.move_to_end(ip)
+                    while len(self.entries) > self.max_entries:
+                        self.entries.popitem(last=False)
+                future = self.inflight.pop(ip)
+            future.set_result(hostname)
+
+# Shared by every NetworkScanner, so names found by one scan are there for the next
+hostname_resolver = HostnameResolver()
+
+class Scan:
+    """
+    One sweep running on its own thread and event loop. Found devices ({"ip", "hostname",
+    "mac", "open_ports", "services", "kind"}) are delivered as soon as each host answers: iterate over the Scan (one consumer)
+    or pass on_device. The hostname is only there if the resolver already knew it; otherwise
+    it's looked up in the background and on_hostname(device) gets the filled-in copy.
+    on_progress(done, total, found) is called every PROGRESS_INTERVAL, on_finished(scan)
+    once at the end. Callbacks run on the scan's thread. cancel() may be called from any thread.
+    """
+
+    _DONE = object()
+
+    def __init__(self, scanner, hosts, resolver, on_device=None, on_hostname=None, on_progress=None,
+                 on_finished=None):
+        self.scanner = scanner
+        self.hosts = hosts
+        self.resolver = resolver
+        self.on_device = on_device
+        self.on_hostname = on_hostname
+        self.on_progress = on_progress
+        self.on_finished = on_finished
+        self.cancelled = False
+        self.finished = threading.Event()
+        self.started = None
+        self.elapsed = None
+        self._devices = []
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._loop = None
+        self._task = None
+
+    @property
+    def total(self):
+        return len(self.hosts)
+
+    @property
+    def done(self):
+        return self.scanner.hosts_done
+
+    @property
+    def devices(self):
+        with self._lock:
+            return list(self._devices)
+
+    def start(self):
+        self.started = time.monotonic()
+        threading.Thread(target=asyncio.run, args=(self._run(),), daemon=True).start()
+        return self
+
+    def cancel(self):
+        """Stop probing; devices already reported stay reported."""
+        self.cancelled = True
+        with self._lock:
+            loop, task = self._loop, self._task
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                pass # Loop already closed: the scan is over anyway
+
+    def wait(self, timeout=None):
+        """Block until the scan is done or cancelled; returns True if it has finished."""
+        return self.finished.wait(timeout)
+
+    def __iter__(self):
+        while True:
+            device = self._queue.get()
+            if device is self._DONE:
+                return
+            yield device
+
+    def summary(self):
+        return {
+            "hosts": self.done,
+            "total": self.total,
+            "found": len(self._devices),
+            "seconds": self.elapsed if self.elapsed is not None else time.monotonic() - self.started,
+            "probe_timeout": self.scanner.rtt.timeout(),
+            "cancelled": self.cancelled,
+            **self.scanner.stats,
+        }
+
+    async def _run(self):
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.current_task()
+        lookups = set()
+        progress = asyncio.ensure_future(self._report_progress())
+        try:
+            if not self.cancelled:
+                def on_open(ip, services):
+                    lookup = self._found(ip, services)
+                    if lookup is not None:
+                        lookups.add(lookup)
+                await self.scanner.scan_hosts(self.hosts, on_open)
+                if lookups:
+                    # Names still missing after this are left to the cache for the next scan
+                    await asyncio.wait(lookups, timeout=LOOKUP_GRACE)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            for lookup in lookups:
+                lookup.cancel()
+            progress.cancel()
+            self.elapsed = time.monotonic() - self.started
+            if self.on_progress:
+                self.on_progress(self.done, self.total, len(self._devices))
+            self.finished.set()
+            self._queue.put(self._DONE)
+            if self.on_finished:
+                self.on_finished(self)
+
+    def _found(self, ip, services):
+        # Reported straight away; the name (if not cached) follows from the resolver's threads,
+        # so neither the probes nor the device wait on DNS
+        lookup = self.resolver.resolve(ip)
+        device = {"ip": ip, "hostname": lookup.result() if lookup.done() else None, "mac": read_arp_table().get(ip),
+                  "open_ports": sorted(services), "services": services,
+                  "kind": classify({port: service for port, service in services.items() if service})
+                  if self.scanner.identify else None}
+        with self._lock:
+            index = len(self._devices)
+            self._devices.append(device)
+        self._queue.put(device)
+        if self.on_device:
+            self.on_device(device)
+        if not lookup.done():
+            return asyncio.ensure_future(self._fill_hostname(index, lookup))
+        return None
+
+    async def _fill_hostname(self, index, lookup):
+        # shield: the lookup is shared with other scans, only stop waiting for it
+        hostname = await asyncio.shield(asyncio.wrap_future(lookup))
+        if hostname is None:
+            return
+        with self._lock:
+            device = self._devices[index] = dict(self._devices[index], hostname=hostname)
+        if self.on_hostname:
+            self.on_hostname(device)
+
+    async def _report_progress(self):
+        if not self.on_progress:
+            return
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            self.on_progress(self.done, self.total, len(self._devices))
+
+class NetworkScanner:
+    """Finds hosts with a port open on the local network(s); blocking front end to AsyncScanner."""
+
+    def __init__(self, resolver=None):
+        self.resolver = resolver or hostname_resolver
+        self.found_devices = []
+        self.last_scan = None
+
+    def get_local_ip(self):
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            # doesn't even have to be reachable
+            s.connect(('10.255.255.255', 1))
+            IP = s.getsockname()[0]
+        except Exception:
+            IP = '127.0.0.1'
+        finally:
+            s.close()
+        return IP
+
+    def local_networks(self, interface=None):
+        """Networks to sweep: those of one interface, or of every interface that is up."""
+        # Too-large networks (a /8 VPN, say) are skipped unless asked for by CIDR
+        networks = interface_networks()
+        if interface is not None:
+            if interface not in networks:
+                raise ValueError(f"No IPv4 network on interface {interface}")
+            return networks[interface]
+        found = [network for nets in networks.values() for network in nets if network.num_addresses <= MAX_HOSTS + 2]
+        if not found:
+            # No interface information: fall back to the /24 of the address we route from
+            found = [ipaddress.ip_network(f"{self.get_local_ip()}/24", strict=False)]
+        return found
+
+    def start_scan(self, port=DEFAULT_PORT, targets=None, interface=None, known=(), on_device=None,
+                   on_hostname=None, on_progress=None, on_finished=None, **options):
+        """
+        Start sweeping targets (CIDRs; default: the local networks) for hosts with port (or any
+        of a list of ports) open and return the running Scan. Hosts in known (e.g. from the
+        devices table) and in the kernel's ARP table are probed first. options go to
+        AsyncScanner, e.g. identify=True to fingerprint open ports.
+        """
+        return self.prepare_scan(port, targets, interface, known, on_device=on_device, on_hostname=on_hostname,
+                                 on_progress=on_progress, on_finished=on_finished, **options).start()
+
+    def prepare_scan(self, port=DEFAULT_PORT, targets=None, interface=None, known=(), on_device=None,
+                     on_hostname=None, on_progress=None, on_finished=None, **options):
+        """
+        Like start_scan, but the Scan isn't started: callbacks that need the Scan itself can be
+        set on it before calling its start().
+        """
+        if targets is None:
+            targets = self.local_networks(interface)
+        ports = ", ".join(map(str, [port] if isinstance(port, int) else port))
+        print(f"Scanning {', '.join(map(str, targets if isinstance(targets, list) else [targets]))} for port {ports}...")
+
+        own = local_addresses()
+        hosts = [ip for ip in parse_targets(targets) if ip not in own]
+        # Likely hosts first: they answer in one round trip and tune the timeout for the sweep
+        in_range = set(hosts)
+        candidates = [ip for ip in dict.fromkeys([*known, *read_arp_table()]) if ip in in_range]
+        skip = set(candidates)
+        hosts = candidates + [ip for ip in hosts if ip not in skip]
+
+        return Scan(AsyncScanner(port, **options), hosts, self.resolver, on_device=on_device,
+                    on_hostname=on_hostname, on_progress=on_progress, on_finished=on_finished)
+
+    def scan_network(self, port=DEFAULT_PORT, targets=None, interface=None, known=(), **options):
+        """Blocking sweep, see start_scan. Returns [{"ip": ..., "hostname": ..., "mac": ...}] in address order."""
+        scan = self.start_scan(port, targets, interface, known, **options)
+        scan.wait()
+        self.found_devices = sorted(scan.devices, key=lambda device: ipaddress.ip_address(device["ip"]))
+        self.last_scan = scan.summary()
+        return self.found_devices
+
+    def lookup_hostname(self, ip):
+        return self.resolver.resolve(ip).result() or "Unknown"
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Find hosts with a TCP port open")
+    parser.add_argument("targets", nargs="*", help="CIDRs or addresses (default: local networks)")
+    parser.add_argument("--port", type=int, action="append", help=f"Repeatable (default: {DEFAULT_PORT})")
+    parser.add_argument("--identify", action="store_true", help="Ask each open port what it is")
+    parser.add_argument("--interface", help="Sweep this interface's networks")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--min-timeout", type=float, default=MIN_TIMEOUT)
+    parser.add_argument("--max-timeout", type=float, default=MAX_TIMEOUT)
+    parser.add_argument("--list-interfaces", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.list_interfaces:
+        for name, networks in interface_networks().items():
+            print(f"{name:<12}{', '.join(map(str, networks))}")
+        return
+
+    def on_hostname(device):
+        print(f"{device['ip']:<16}{device['hostname']}")
+
+    scan = NetworkScanner().start_scan(args.port or DEFAULT_PORT, args.targets or None, args.interface,
+                                       on_hostname=on_hostname, concurrency=args.concurrency,
+                                       min_timeout=args.min_timeout, max_timeout=args.max_timeout,
+                                       identify=args.identify)
+    try:
+        for device in scan: # Printed as found (names may follow on their own line), Ctrl-C stops early
+            ports = ",".join(map(str, device["open_ports"]))
+            print(f"{device['ip']:<16}{ports:<12}{device['kind'] or '':<36}{device['hostname'] or ''}")
+    except KeyboardInterrupt:
+        scan.cancel()
+        scan.wait()
+    stats = scan.summary()
+    print(f"{stats['hosts']} hosts in {stats['seconds']:.2f}s, ports {stats[OPEN]} open, {stats[CLOSED]} closed, "
+          f"{stats[TIMEOUT]} no answer (timeout settled at {stats['probe_timeout']:.2f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import bisect
+import itertools
+import json
+import operator
+
+# Serialized note formats stored in user_notes.content:
+#
+#   v2 (current):  {"v": 2, "content": "<text>", "runs": [size, length, size, length, ...]}
+#       Formatting as consecutive runs covering the text from offset 0; size is the font
+#       size of the font_<size> tag, 0 for untagged. Adjacent runs of the same size are merged.
+#       Lengths are relative, so an edit only changes the runs it touches (small revision deltas).
+#   v1 (legacy):   {"content": "<text>", "tags": {"font_14": [["1.0", "1.5"], ...]}}
+#   plain text:    anything that isn't one of the above
+#
+# Every format keeps the text under "content", which the full-text index relies on.
+
+FORMAT_VERSION = 2
+
+def _line_starts(text):
+    """Character offset of the start of each line (Tk lines are 1-based)."""
+    # map() rather than a generator keeps this C-level; it runs on every save
+    return [0] + list(itertools.accumulate(map(operator.add, map(len, text.split("\n")), itertools.repeat(1))))
+
+def index_to_offset(index, line_starts):
+    """Convert a Tk "line.col" index to a character offset."""
+    line, col = str(index).split(".")
+    return line_starts[int(line) - 1] + int(col)
+
+def _parse_indexes(indexes):
+    """[line, col, line, col, ...] for "line.col" indexes, parsed in one C-level pass."""
+    return json.loads("[" + ",".join(map(str, indexes)).replace(".", ",") + "]")
+
+def _tag_spans(numbers, size, line_starts):
+    """(start, end, size) offsets for parsed [line, col, ...] numbers of one tag."""
+    offsets = [line_starts[line - 1] + col for line, col in zip(numbers[::2], numbers[1::2])]
+    return zip(offsets[::2], offsets[1::2], itertools.repeat(size))
+
+def _merge_spans(spans, start, end):
+    """Merged runs covering offsets start to end, from (start, end, size) spans sorted by start."""
+    runs = []
+    pos = start
+    last_size = None
+    for span_start, span_end, size in spans:
+        # Comparisons rather than max()/min(): this loop runs once per tag range
+        if span_start < pos:
+            span_start = pos # Font tags are exclusive; clip any overlap
+        if span_end > end:
+            span_end = end # Tk's trailing newline can be tagged too
+        if span_end <= span_start:
+            continue
+        if span_start > pos:
+            if last_size == 0:
+                runs[-1] += span_start - pos
+            else:
+                runs += (0, span_start - pos)
+                last_size = 0
+        if size == last_size:
+            runs[-1] += span_end - span_start
+        else:
+            runs += (size, span_end - span_start)
+            last_size = size
+        pos = span_end
+    if end > pos:
+        if last_size == 0:
+            runs[-1] += end - pos
+        else:
+            runs += (0, end - pos)
+    return runs
+
+def _common_prefix_length(a, b, limit):
+    """Length of the common prefix of two strings or tuples, at most limit (slice compares are C-level)."""
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def _common_suffix_length(a, b, limit):
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:len(a) - lo] == b[len(b) - mid:len(b) - lo]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def _slice_runs(runs, ends, start, end):
+    """The runs covering offsets start to end, given the runs' cumulative ends."""
+    if end <= start:
+        return []
+    first = bisect.bisect_right(ends, start)
+    last = bisect.bisect_left(ends, end)
+    piece = runs[2 * first:2 * last + 2]
+    piece[1] -= start - (ends[first] - runs[2 * first + 1])
+    piece[-1] -= ends[last] - end
+    return piece
+
+def _join_runs(first, second):
+    if first and second and first[-2] == second[0]:
+        return first[:-1] + [first[-1] + second[1]] + second[2:]
+    return first + second
+
+# Inputs and result of the last ranges_to_runs call: (text, {tag: indexes}, {tag: parsed
+# numbers}, runs). Autosave runs after every edit pause and an edit touches a line or two,
+# so the next call only redoes the runs of the lines that changed (see _patch_runs).
+_last = None
+
+def _patch_runs(text, tags, line_starts):
+    """
+    Runs for text and tags from the last call's runs, redoing only the lines where the text or
+    any tag's indexes differ. Returns (runs, {tag: numbers}), or None where that doesn't work
+    (first call, or lines were added or removed, which moves every index after them).
+    """
+    if _last is None:
+        return None
+    old_text, old_tags, old_numbers, old_runs = _last
+    text_len, old_len = len(text), len(old_text)
+
+    # The text differs only between its common prefix and suffix
+    limit = min(text_len, old_len)
+    prefix = _common_prefix_length(old_text, text, limit)
+    suffix = _common_suffix_length(old_text, text, limit - prefix)
+    if text.count("\n", prefix, text_len - suffix) != old_text.count("\n", prefix, old_len - suffix):
+        return None
+    if prefix == text_len == old_len:
+        first_line, last_line = len(line_starts), 0 # Same text: only the tags can widen the window
+    else:
+        first_line = bisect.bisect_right(line_starts, prefix)
+        last_line = bisect.bisect_right(line_starts, text_len - suffix)
+
+    # Tags that changed widen the window to the lines of their first and last differing index
+    for name in tags.keys() | old_tags.keys():
+        indexes, old_indexes = tags.get(name, ()), old_tags.get(name, ())
+        if indexes == old_indexes:
+            continue
+        shortest = min(len(indexes), len(old_indexes))
+        same_head = _common_prefix_length(old_indexes, indexes, shortest)
+        same_tail = _common_suffix_length(old_indexes, indexes, shortest - same_head)
+        for side in (indexes, old_indexes):
+            for i in (same_head, len(side) - same_tail - 1):
+                if same_head <= i < len(side):
+                    line = int(str(side[i]).split(".")[0])
+                    first_line, last_line = min(first_line, line), max(last_line, line)
+    if last_line < first_line:
+        return list(old_runs), old_numbers
+    last_line = min(last_line, len(line_starts) - 1) # The index after a tagged final newline
+    start = line_starts[first_line - 1]
+    end = min(line_starts[last_line], text_len)
+    old_end = end - (text_len - old_len)
+
+    numbers = {}
+    spans = []
+    for name, indexes in tags.items():
+        old_indexes = old_tags.get(name, ())
+        old_tag_numbers = old_numbers.get(name, [])
+        old_lines = old_tag_numbers[::2]
+        # Indexes on lines before and after the window are the old ones, unparsed
+        head = bisect.bisect_left(old_lines, first_line)
+        tail = len(old_lines) - bisect.bisect_right(old_lines, last_line)
+        inner_end = len(indexes) - tail
+        if (inner_end < head or indexes[:head] != old_indexes[:head]
+                or indexes[inner_end:] != old_indexes[len(old_indexes) - tail:]):
+            return None
+        inner = _parse_indexes(indexes[head:inner_end])
+        if any(line < first_line or line > last_line for line in inner[::2]):
+            return None
+        tag_numbers = old_tag_numbers[:2 * head] + inner + old_tag_numbers[len(old_tag_numbers) - 2 * tail:]
+        numbers[name] = tag_numbers
+        # Whole ranges, including any that run into the window from either side
+        spans.extend(_tag_spans(tag_numbers[2 * (head - head % 2):2 * (inner_end + inner_end % 2)],
+                                int(name.split("_", 1)[1]), line_starts))
+    spans.sort()
+
+    ends = list(itertools.accumulate(old_runs[1::2]))
+    runs = _join_runs(_slice_runs(old_runs, ends, 0, start), _merge_spans(spans, start, end))
+    return _join_runs(runs, _slice_runs(old_runs, ends, old_end, old_len)), numbers
+
+def ranges_to_runs(text, tag_ranges):
+    """
+    Build merged runs from {tag_name: (start1, end1, start2, end2, ...)} Tk indexes,
+    the flat shape Text.tag_ranges returns. Returns the flat [size, length, ...] list used by the v2 format.
+    """
+    global _last
+    tags = {name: tuple(ranges) for name, ranges in tag_ranges.items() if ranges}
+    line_starts = _line_starts(text)
+    patched = _patch_runs(text, tags, line_starts)
+    if patched is not None:
+        runs, numbers = patched
+    else:
+        numbers = {name: _parse_indexes(ranges) for name, ranges in tags.items()}
+        spans = []
+        for name, tag_numbers in numbers.items():
+            spans.extend(_tag_spans(tag_numbers, int(name.split("_", 1)[1]), line_starts))
+        spans.sort()
+        runs = _merge_spans(spans, 0, len(text))
+    _last = (text, tags, numbers, list(runs))
+    return runs
+
+def encode_note(text, tag_ranges):
+    """Serialize text plus {tag_name: Text.tag_ranges(tag_name)} to the v2 format."""
+    return json.dumps({"v": FORMAT_VERSION, "content": text, "runs": ranges_to_runs(text, tag_ranges)},
+                      separators=(",", ":"))
+
+def decode_note(serialized):
+    """
+    Parse any stored note format.
+    Returns (text, runs) with runs in the v2 flat [size, length, ...] form (empty for plain text).
+    """
+    try:
+        data = json.loads(serialized)
+    except (json.JSONDecodeError, TypeError):
+        return serialized or "", []
+    if not isinstance(data, dict) or not isinstance(data.get("content"), str):
+        return serialized, []
+
+    text = data["content"]
+    if "runs" in data:
+        return text, data["runs"]
+    if "tags" in data:
+        flat_ranges = {name: list(itertools.chain.from_iterable(pairs)) for name, pairs in data["tags"].items()}
+        return text, ranges_to_runs(text, flat_ranges)
+    return serialized, []
+
+def iter_runs(text, runs):
+    """Yield (chunk, size) pairs covering text; size is 0 for untagged text."""
+    pos = 0
+    for i in range(0, len(runs), 2):
+        length = runs[i + 1]
+        yield text[pos:pos + length], runs[i]
+        pos += length
+    if pos < len(text):
+        yield text[pos:], 0
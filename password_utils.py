@@ -0,0 +1,119 @@
+import hashlib
+import hmac
+import os
+import time
+
+# Encoded hash formats (stored in users.password_hash):
+#   scrypt$<n>$<r>$<p>$<salt hex>$<hash hex>
+#   pbkdf2_sha256$<iterations>$<salt hex>$<hash hex>
+#   <64 hex chars>  legacy unsalted SHA-256, only ever verified and upgraded
+
+TARGET_SECONDS = 0.25 # Calibrated cost aims for roughly this much time per hash
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+class ScryptHasher:
+    algorithm = "scrypt"
+
+    def __init__(self, n=2 ** 14, r=8, p=1):
+        self.n = n
+        self.r = r
+        self.p = p
+
+    def _derive(self, password, salt, n, r, p):
+        # maxmem must cover 128 * n * r bytes plus some slack or OpenSSL refuses
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r, dklen=HASH_BYTES)
+
+    def hash(self, password):
+        salt = os.urandom(SALT_BYTES)
+        digest = self._derive(password, salt, self.n, self.r, self.p)
+        return f"{self.algorithm}${self.n}${self.r}${self.p}${salt.hex()}${digest.hex()}"
+
+    def verify(self, password, encoded):
+        _, n, r, p, salt, digest = encoded.split("$")
+        candidate = self._derive(password, bytes.fromhex(salt), int(n), int(r), int(p))
+        return hmac.compare_digest(candidate, bytes.fromhex(digest))
+
+    def needs_update(self, encoded):
+        _, n, r, p, _, _ = encoded.split("$")
+        return (int(n), int(r), int(p)) != (self.n, self.r, self.p)
+
+    def params(self):
+        return {"n": self.n, "r": self.r, "p": self.p}
+
+    @classmethod
+    def calibrate(cls, target=TARGET_SECONDS, max_n=2 ** 17):
+        """Double n until one hash takes at least target seconds."""
+        hasher = cls()
+        while hasher.n < max_n:
+            start = time.perf_counter()
+            hasher.hash("calibration")
+            if time.perf_counter() - start >= target:
+                break
+            hasher.n *= 2
+        return hasher
+
+class PBKDF2Hasher:
+    algorithm = "pbkdf2_sha256"
+
+    def __init__(self, iterations=600000):
+        self.iterations = iterations
+
+    def hash(self, password):
+        salt = os.urandom(SALT_BYTES)
+        digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, self.iterations, HASH_BYTES)
+        return f"{self.algorithm}${self.iterations}${salt.hex()}${digest.hex()}"
+
+    def verify(self, password, encoded):
+        _, iterations, salt, digest = encoded.split("$")
+        candidate = hashlib.pbkdf2_hmac("sha256", password.encode(), bytes.fromhex(salt), int(iterations), HASH_BYTES)
+        return hmac.compare_digest(candidate, bytes.fromhex(digest))
+
+    def needs_update(self, encoded):
+        return int(encoded.split("$")[1]) != self.iterations
+
+    def params(self):
+        return {"iterations": self.iterations}
+
+    @classmethod
+    def calibrate(cls, target=TARGET_SECONDS, min_iterations=100000):
+        # PBKDF2 cost is linear in iterations, so one timed sample is enough
+        sample = 20000
+        start = time.perf_counter()
+        hashlib.pbkdf2_hmac("sha256", b"calibration", b"salt" * 4, sample, HASH_BYTES)
+        elapsed = max(time.perf_counter() - start, 1e-6)
+        return cls(max(min_iterations, int(sample * target / elapsed)))
+
+HASHERS = {hasher.algorithm: hasher for hasher in (ScryptHasher, PBKDF2Hasher)}
+
+def default_hasher_class():
+    # hashlib.scrypt needs OpenSSL 1.1+, fall back to PBKDF2 where it is missing
+    return ScryptHasher if hasattr(hashlib, "scrypt") else PBKDF2Hasher
+
+def hasher_from_params(algorithm, params):
+    return HASHERS[algorithm](**params)
+
+def is_legacy_hash(encoded):
+    return "$" not in encoded
+
+def verify_password(password, encoded, current_hasher):
+    """
+    Check password against a stored hash of any supported format.
+    Returns (matches, needs_rehash); needs_rehash means the caller should store current_hasher.hash(password).
+    """
+    if is_legacy_hash(encoded):
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(legacy, encoded), True
+
+    algorithm = encoded.split("$", 1)[0]
+    hasher_class = HASHERS.get(algorithm)
+    if hasher_class is None:
+        return False, False
+    if hasher_class.algorithm == current_hasher.algorithm:
+        hasher = current_hasher
+    else:
+        hasher = hasher_class()
+    if not hasher.verify(password, encoded):
+        return False, False
+    return True, hasher is not current_hasher or current_hasher.needs_update(encoded)
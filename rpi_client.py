@@ -0,0 +1,172 @@
+import codecs
+import socket
+import threading
+import time
+
+import rpi_protocol as protocol
+from rpi_protocol import (MAGIC, STREAM, DEFLATE, TELEMETRY_FEATURE, HEARTBEAT, HELLO, COMMAND, OUTPUT, ERROR, CHUNK,
+                          EXIT, CANCEL, SUBSCRIBE, SUBSCRIBED, TELEMETRY, PING, PONG, PING_STRUCT)
+
+def enable_keepalive(sock, idle):
+    """TCP keepalive probes after idle seconds of silence: dead-peer detection for servers without heartbeats."""
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    if hasattr(socket, "TCP_KEEPIDLE"): # Linux; elsewhere the OS defaults (hours) apply
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, max(1, int(idle)))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(1, int(idle) // 3))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3)
+    if hasattr(socket, "TCP_USER_TIMEOUT"):
+        # Keepalive stays quiet while sent data is unacknowledged (a command sent to a dead
+        # Pi), so also bound how long that may last
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_USER_TIMEOUT, int(max(1, idle) * 2 * 1000))
+
+class RPIConnection:
+    """
+    Client end of a connection to rpi_server. Negotiates the framed protocol on connect and
+    falls back to raw text with servers that predate it (framed is False then).
+    One thread may send while another receives.
+    heartbeat: offer the heartbeat feature. Only for callers that ping() regularly, since the
+    server drops a heartbeat client that stays quiet for its dead-peer window.
+    keepalive: seconds of silence before TCP keepalive probes start, used when the server
+    doesn't do heartbeats (None leaves keepalive off).
+    """
+
+    def __init__(self, host, port=5000, timeout=5, features=protocol.FEATURES, heartbeat=False, keepalive=None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.offered_features = tuple(f for f in features if f != HEARTBEAT or heartbeat)
+        self.keepalive = keepalive
+        self.sock = None
+        self.reader = None
+        self.codec = None
+        self.send_lock = threading.Lock() # Keeps frames in compression-stream order
+        self.framed = False
+        self.version = None
+        self.features = set()
+        self._decoder = None
+        self.last_received = None # time.monotonic() of the last data from the server
+
+    def connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.sendall(protocol.client_hello(self.offered_features))
+            reply = sock.recv(protocol.RECV_SIZE)
+            if not reply:
+                raise ConnectionError("server closed the connection")
+            # A short first read could be the start of MAGIC: wait for the rest before deciding
+            while len(reply) < len(MAGIC) and MAGIC.startswith(reply):
+                more = sock.recv(protocol.RECV_SIZE)
+                if not more:
+                    break
+                reply += more
+            if reply.startswith(MAGIC):
+                self.reader = protocol.FrameReader(sock, reply[len(MAGIC):])
+                frame_type, payload = self.reader.read_frame()
+                data = protocol.decode_json(payload)
+                if frame_type == ERROR:
+                    raise ConnectionError(data.get("message", "connection refused"))
+                if frame_type != HELLO:
+                    raise protocol.ProtocolError("expected HELLO")
+                self.framed = True
+                self.version = data["version"]
+                self.features = set(data.get("features", ()))
+                self.codec = protocol.FrameCodec(compress=DEFLATE in self.features)
+                self.reader.codec = self.codec
+            else:
+                # Old server: it tried to run the preamble and replied with an error, or it's full
+                text = reply.decode("utf-8", errors="replace")
+                if text.startswith("Server busy"):
+                    raise ConnectionError(text)
+            # Raw text and CHUNK frames can split a UTF-8 character
+            self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            if self.keepalive and HEARTBEAT not in self.features:
+                enable_keepalive(sock, self.keepalive)
+            sock.settimeout(None)
+        except BaseException:
+            sock.close()
+            raise
+        self.sock = sock
+        self.last_received = time.monotonic()
+
+    @property
+    def streaming(self):
+        return STREAM in self.features
+
+    def send_frame(self, frame_type, payload=b""):
+        with self.send_lock:
+            self.sock.sendall(self.codec.encode(frame_type, payload))
+
+    def send_command(self, text):
+        if self.framed:
+            self.send_frame(COMMAND, text)
+        else:
+            self.sock.sendall(text.encode("utf-8"))
+
+    def receive(self):
+        """
+        Block for the next message from the server: (frame type, text), (EXIT, {"code": ...})
+        at the end of a streamed command, (SUBSCRIBED, {...}), (TELEMETRY, sample dict) or
+        (PONG, round-trip seconds). PINGs from the server are answered here.
+        Legacy servers give (OUTPUT, chunk) per recv, since raw text has no message boundaries.
+        Raises ConnectionError when the server goes away.
+        """
+        if not self.framed:
+            data = self.sock.recv(4096)
+            if not data:
+                raise ConnectionError("connection closed")
+            self.last_received = time.monotonic()
+            return OUTPUT, self._decoder.decode(data)
+
+        frame_type, payload = self.reader.read_frame()
+        self.last_received = time.monotonic()
+        while frame_type == PING:
+            self.send_frame(PONG, payload)
+            frame_type, payload = self.reader.read_frame()
+            self.last_received = time.monotonic()
+        if frame_type == PONG:
+            if len(payload) == PING_STRUCT.size:
+                return PONG, self.last_received - PING_STRUCT.unpack(payload)[0]
+            return PONG, None
+        if frame_type == CHUNK:
+            return CHUNK, self._decoder.decode(payload)
+        if frame_type == EXIT:
+            self._decoder.reset()
+            return EXIT, protocol.decode_json(payload)
+        if frame_type == TELEMETRY:
+            return TELEMETRY, protocol.unpack_telemetry(payload)
+        if frame_type == SUBSCRIBED:
+            return SUBSCRIBED, protocol.decode_json(payload)
+        if frame_type == ERROR:
+            return ERROR, protocol.decode_json(payload).get("message", "")
+        return frame_type, payload.decode("utf-8", errors="replace")
+
+    @property
+    def supports_telemetry(self):
+        return TELEMETRY_FEATURE in self.features
+
+    @property
+    def supports_heartbeat(self):
+        return HEARTBEAT in self.features
+
+    def ping(self):
+        """Send a heartbeat; the server's PONG comes back through receive()."""
+        self.send_frame(PING, PING_STRUCT.pack(time.monotonic()))
+
+    def subscribe(self, interval):
+        """Ask for a TELEMETRY sample every interval seconds (0 stops them)."""
+        with self.send_lock:
+            self.sock.sendall(self.codec.encode_json(SUBSCRIBE, {"interval": interval}))
+
+    def cancel(self):
+        """Ask the server to kill the command that is streaming."""
+        if self.streaming:
+            self.send_frame(CANCEL)
+
+    def close(self):
+        if self.sock:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
@@ -0,0 +1,280 @@
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from rpi_client import RPIConnection
+from rpi_protocol import CHUNK, EXIT, OUTPUT, ERROR, ProtocolError
+
+# Fan-out: one command sent to many Pis at once, each over its own RPIConnection.
+# Devices run in parallel (up to MAX_WORKERS at a time), so a run takes about as long as
+# the slowest device rather than the sum of all of them.
+
+DEVICE_TIMEOUT = 30.0 # Seconds a device gets from connect to exit code
+CONNECT_TIMEOUT = 5.0
+KEEPALIVE_IDLE = 15.0 # Fleet runs don't ping, so a dead Pi is found by TCP keepalive instead
+MAX_WORKERS = 32
+LEGACY_IDLE = 0.5 # Old servers don't mark the end of a reply: it's done after this long without output
+MAX_DEVICE_OUTPUT = 1024 * 1024 # Characters kept per device, the rest is only streamed to on_output
+
+class DeviceResult:
+    """Outcome of the command on one device. status: pending, running, ok, failed, timeout, error or cancelled."""
+
+    def __init__(self, device):
+        self.device = device
+        self.status = "pending"
+        self.parts = []
+        self.size = 0
+        self.truncated = False
+        self.code = None
+        self.error = None
+        self.started = None
+        self.elapsed = None
+
+    @property
+    def name(self):
+        return self.device.get("name") or self.device["ip"]
+
+    @property
+    def output(self):
+        return "".join(self.parts)
+
+    @property
+    def done(self):
+        return self.status not in ("pending", "running")
+
+    def add_output(self, text):
+        if self.size < MAX_DEVICE_OUTPUT:
+            self.parts.append(text[:MAX_DEVICE_OUTPUT - self.size])
+        if self.size + len(text) > MAX_DEVICE_OUTPUT:
+            self.truncated = True
+        self.size += len(text)
+
+class FleetRun:
+    """
+    Runs one command on a list of devices (dicts with ip, port and optionally name, as
+    returned by database.get_devices). Callbacks fire on worker threads:
+    on_output(result, text) for each piece of output, on_result(result) when a device is
+    done, on_finished(run) once all are.
+    """
+
+    def __init__(self, devices, command, timeout=DEVICE_TIMEOUT, max_workers=MAX_WORKERS,
+                 on_output=None, on_result=None, on_finished=None):
+        self.command = command
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.results = [DeviceResult(device) for device in devices]
+        self.on_output = on_output
+        self.on_result = on_result
+        self.on_finished = on_finished
+        self.cancelled = threading.Event()
+        self.finished = threading.Event()
+        self.started = None
+        self.elapsed = None
+        self._active = set()
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.started = time.monotonic()
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def _run(self):
+        try:
+            workers = max(1, min(self.max_workers, len(self.results)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for result in self.results:
+                    executor.submit(self._run_device, result)
+        finally:
+            self.elapsed = time.monotonic() - self.started
+            self.finished.set()
+            if self.on_finished:
+                self.on_finished(self)
+
+    def wait(self, timeout=None):
+        """Block until every device is done; returns the results."""
+        self.finished.wait(timeout)
+        return self.results
+
+    def cancel(self):
+        """Stop the run: running commands are cancelled, devices not yet started are skipped."""
+        self.cancelled.set()
+        with self._lock:
+            connections = list(self._active)
+        for connection in connections:
+            try:
+                connection.cancel()
+            except OSError:
+                pass
+            connection.close() # Unblocks the worker's receive
+
+    def summary(self):
+        counts = {}
+        for result in self.results:
+            counts[result.status] = counts.get(result.status, 0) + 1
+        return counts
+
+    def _run_device(self, result):
+        if self.cancelled.is_set():
+            result.status = "cancelled"
+            self._notify(result)
+            return
+
+        device = result.device
+        deadline = time.monotonic() + self.timeout
+        result.status = "running"
+        result.started = time.monotonic()
+        connection = RPIConnection(device["ip"], device.get("port") or 5000,
+                                   timeout=min(CONNECT_TIMEOUT, self.timeout), keepalive=KEEPALIVE_IDLE)
+        try:
+            connection.connect()
+            with self._lock:
+                self._active.add(connection)
+            if self.cancelled.is_set():
+                raise ConnectionError("cancelled")
+            connection.send_command(self.command)
+            if connection.framed:
+                self._read_framed(connection, result, deadline)
+            else:
+                self._read_legacy(connection, result, deadline)
+        except socket.timeout:
+            result.status = "timeout"
+            if connection.sock is None:
+                result.error = "connect timed out"
+            else:
+                result.error = f"no answer within {self.timeout:g}s"
+                try:
+                    connection.cancel() # Don't leave it running on the Pi
+                except OSError:
+                    pass
+        except (OSError, ConnectionError, ProtocolError) as e:
+            if self.cancelled.is_set():
+                result.status = "cancelled"
+            else:
+                result.status = "error"
+                result.error = str(e) or type(e).__name__
+        finally:
+            with self._lock:
+                self._active.discard(connection)
+            connection.close()
+            result.elapsed = time.monotonic() - result.started
+            self._notify(result)
+
+    def _notify(self, result):
+        if self.on_result:
+            self.on_result(result)
+
+    def _receive(self, connection, deadline, limit=None):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise socket.timeout("timed out")
+        sock = connection.sock
+        if sock is None:
+            raise ConnectionError("connection closed") # cancel() got there first
+        sock.settimeout(min(remaining, limit) if limit else remaining)
+        return connection.receive()
+
+    def _output(self, result, text):
+        if text:
+            result.add_output(text)
+            if self.on_output:
+                self.on_output(result, text)
+
+    def _read_framed(self, connection, result, deadline):
+        while True:
+            frame_type, value = self._receive(connection, deadline)
+            if frame_type == CHUNK:
+                self._output(result, value)
+            elif frame_type == EXIT:
+                result.code = value.get("code")
+                result.error = value.get("error")
+                result.status = "ok" if result.code == 0 else "failed"
+                return
+            elif frame_type == OUTPUT:
+                # Built-in replies, and servers without streaming
+                self._output(result, value)
+                result.status = "ok"
+                return
+            elif frame_type == ERROR:
+                result.status = "error"
+                result.error = value
+                return
+
+    def _read_legacy(self, connection, result, deadline):
+        _, text = self._receive(connection, deadline)
+        self._output(result, text)
+        while True:
+            try:
+                _, text = self._receive(connection, deadline, limit=LEGACY_IDLE)
+            except socket.timeout:
+                if time.monotonic() >= deadline:
+                    raise
+                break
+            self._output(result, text)
+        result.status = "ok"
+
+def run_command(devices, command, **options):
+    """Run command on every device and wait; returns the DeviceResults in device order."""
+    return FleetRun(devices, command, **options).start().wait()
+
+def parse_host(text):
+    host, _, port = text.rpartition(":") if text.count(":") == 1 else (text, "", "")
+    return {"name": host, "ip": host, "port": int(port) if port else 5000}
+
+def main(argv=None):
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Run a command on many Pis at once")
+    parser.add_argument("command")
+    parser.add_argument("--host", action="append", default=[], help="ip[:port], repeatable")
+    parser.add_argument("--user", help="Use this user's saved devices")
+    parser.add_argument("--group", help="Only devices in this group (with --user)")
+    parser.add_argument("--timeout", type=float, default=DEVICE_TIMEOUT, help="Seconds per device")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Devices contacted at once")
+    args = parser.parse_args(argv)
+
+    devices = [parse_host(host) for host in args.host]
+    if args.user:
+        import database
+        database.init_db()
+        devices += database.get_devices(args.user, args.group)
+    if not devices:
+        parser.error("no devices: pass --host or --user")
+
+    # Print whole lines as they arrive, prefixed by device
+    partial = {}
+    print_lock = threading.Lock()
+
+    def on_output(result, text):
+        with print_lock:
+            lines = (partial.pop(id(result), "") + text).split("\n")
+            partial[id(result)] = lines.pop()
+            for line in lines:
+                print(f"[{result.name}] {line}")
+
+    def on_result(result):
+        with print_lock:
+            rest = partial.pop(id(result), "")
+            if rest:
+                print(f"[{result.name}] {rest}")
+
+    run = FleetRun(devices, args.command, timeout=args.timeout, max_workers=args.workers,
+                   on_output=on_output, on_result=on_result).start()
+    try:
+        run.wait()
+    except KeyboardInterrupt:
+        run.cancel()
+        run.wait()
+
+    print()
+    for result in run.results:
+        detail = result.error or (f"exit {result.code}" if result.code is not None else "")
+        elapsed = f"{result.elapsed:.2f}s" if result.elapsed is not None else "-"
+        print(f"{result.name:<24}{result.status:<11}{elapsed:>8}  {detail}")
+    summary = ", ".join(f"{count} {status}" for status, count in sorted(run.summary().items()))
+    print(f"{len(devices)} devices in {run.elapsed:.2f}s: {summary}")
+    sys.exit(0 if all(result.status == "ok" for result in run.results) else 1)
+
+if __name__ == "__main__":
+    main()
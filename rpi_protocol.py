@@ -0,0 +1,202 @@
+import json
+import struct
+import zlib
+
+# Wire protocol between RPIFrame and rpi_server.
+#
+# Every message is a frame: 4-byte big-endian payload length, 1-byte type, payload.
+# Text payloads are UTF-8, control payloads (HELLO, ERROR, EXIT) are JSON objects.
+#
+# Negotiation: a framed client opens with MAGIC followed by a HELLO frame. A framed server
+# answers with MAGIC and its own HELLO holding the agreed version and features. Servers
+# from before framing run the preamble as a shell command, which fails on the NUL byte
+# without executing anything; the client sees a reply without MAGIC and drops back to
+# the legacy protocol (raw text in, raw text out). Clients that never send MAGIC are
+# served the legacy way by framed servers too.
+#
+# Features (agreed as the intersection of both sides' lists):
+#   stream  a command's output comes back as CHUNK frames while it runs, then one EXIT
+#           frame with the exit code; the client may CANCEL the running command.
+#           Every COMMAND ends with exactly one OUTPUT (built-in replies) or EXIT frame.
+#           Without it the reply is a single OUTPUT frame once the command is done.
+#   deflate frames after the HELLOs may be compressed, marked by COMPRESSED in the type byte.
+#           Each direction is one zlib stream (sync-flushed per frame), so later frames
+#           reuse the dictionary built by earlier ones. Frames under COMPRESS_MIN go raw.
+#   telemetry  the client may SUBSCRIBE to metric samples; the server answers SUBSCRIBED with
+#           the interval it will actually use (or an error) and then pushes TELEMETRY frames.
+#   heartbeat  either side may send PING at any time; the peer answers PONG with the same
+#           payload straight away, even while a command runs. A side that hears nothing at all
+#           for longer than its dead-peer window treats the connection as dead.
+
+MAGIC = b"\x00NXS"
+PROTOCOL_VERSION = 1
+STREAM = "stream"
+DEFLATE = "deflate"
+TELEMETRY_FEATURE = "telemetry"
+HEARTBEAT = "heartbeat"
+FEATURES = (STREAM, DEFLATE, TELEMETRY_FEATURE, HEARTBEAT)
+
+COMPRESSED = 0x80 # Type byte flag
+COMPRESS_MIN = 512 # Smaller payloads aren't worth compressing
+COMPRESS_LEVEL = 6
+
+HEADER = struct.Struct(">IB")
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+RECV_SIZE = 256 * 1024
+
+# Frame types
+HELLO = 1
+COMMAND = 2 # client -> server: command text
+OUTPUT = 3 # server -> client: complete reply text
+ERROR = 4 # server -> client: {"message": ...}
+CHUNK = 5 # server -> client: raw output bytes of the running command (may split a UTF-8 character)
+EXIT = 6 # server -> client: {"code": exit status, negative for a signal} or {"code": null, "error": ...}
+CANCEL = 7 # client -> server: kill the running command
+SUBSCRIBE = 8 # client -> server: {"interval": seconds}, 0 to unsubscribe
+SUBSCRIBED = 9 # server -> client: {"interval": seconds, "fields": [...]} or {"error": ...}
+TELEMETRY = 10 # server -> client: one sample packed with TELEMETRY_STRUCT
+PING = 11 # either way: opaque payload (the client sends its clock, see PING_STRUCT)
+PONG = 12 # either way: the payload of the PING it answers
+
+# Telemetry sample: server timestamp then one float per field, NaN where unavailable.
+# cpu/ram/disk in percent, temp in degrees C, net rates in bytes per second.
+TELEMETRY_FIELDS = ("cpu", "ram", "temp", "disk", "net_down", "net_up")
+TELEMETRY_STRUCT = struct.Struct(">d6f")
+PING_STRUCT = struct.Struct(">d")
+
+class ProtocolError(Exception):
+    pass
+
+def encode_frame(frame_type, payload=b""):
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    return HEADER.pack(len(payload), frame_type) + payload
+
+def encode_json(frame_type, data):
+    return encode_frame(frame_type, json.dumps(data, separators=(",", ":")))
+
+def decode_json(payload):
+    try:
+        data = json.loads(payload)
+    except ValueError:
+        raise ProtocolError("malformed control frame")
+    if not isinstance(data, dict):
+        raise ProtocolError("malformed control frame")
+    return data
+
+def parse_header(header):
+    length, frame_type = HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise ProtocolError(f"frame of {length} bytes exceeds the {MAX_FRAME_SIZE} byte limit")
+    return length, frame_type
+
+def client_hello(features=FEATURES):
+    return MAGIC + encode_json(HELLO, {"version": PROTOCOL_VERSION, "features": list(features)})
+
+def negotiate(hello, features=FEATURES):
+    """Server side: the reply HELLO dict for a client's HELLO dict."""
+    version = hello.get("version")
+    if not isinstance(version, int) or version < 1:
+        raise ProtocolError("bad protocol version")
+    offered = hello.get("features") or []
+    return {
+        "version": min(version, PROTOCOL_VERSION),
+        "features": [feature for feature in features if feature in offered],
+    }
+
+def pack_telemetry(ts, sample):
+    return TELEMETRY_STRUCT.pack(ts, *(sample.get(field, float("nan")) for field in TELEMETRY_FIELDS))
+
+def unpack_telemetry(payload):
+    """TELEMETRY payload -> {"ts": ..., field: value or None}."""
+    ts, *values = TELEMETRY_STRUCT.unpack(payload)
+    sample = {"ts": ts}
+    for field, value in zip(TELEMETRY_FIELDS, values):
+        sample[field] = None if value != value else value # NaN
+    return sample
+
+class FrameCodec:
+    """
+    Encodes and decodes one connection's frames, compressing them once DEFLATE is agreed.
+    Frames must be encoded in the order they are written and decoded in the order they arrive.
+    """
+
+    def __init__(self, compress=False):
+        self.compress = compress
+        self.compressor = zlib.compressobj(COMPRESS_LEVEL) if compress else None
+        self.decompressor = zlib.decompressobj() if compress else None
+
+    def encode(self, frame_type, payload=b""):
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        if self.compress and len(payload) >= COMPRESS_MIN:
+            payload = self.compressor.compress(payload) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+            frame_type |= COMPRESSED
+        return HEADER.pack(len(payload), frame_type) + payload
+
+    def encode_json(self, frame_type, data):
+        return self.encode(frame_type, json.dumps(data, separators=(",", ":")))
+
+    def decode(self, frame_type, payload):
+        """Return (type, payload) with compression undone."""
+        if not frame_type & COMPRESSED:
+            return frame_type, payload
+        if self.decompressor is None:
+            raise ProtocolError("compressed frame without deflate")
+        try:
+            # Cap the output so a small frame can't inflate into gigabytes
+            data = self.decompressor.decompress(payload, MAX_FRAME_SIZE)
+        except zlib.error:
+            raise ProtocolError("corrupt compressed frame")
+        if self.decompressor.unconsumed_tail:
+            raise ProtocolError(f"frame inflates past the {MAX_FRAME_SIZE} byte limit")
+        return frame_type & ~COMPRESSED, data
+
+class FrameReader:
+    """
+    Reads frames off a blocking socket. Receives in large chunks into one buffer,
+    so a burst of small frames or one big frame costs as few recv calls as possible.
+    """
+
+    def __init__(self, sock, initial=b""):
+        self.sock = sock
+        self.buffer = bytearray(initial)
+        self.codec = FrameCodec()
+
+    def _fill(self, size):
+        while len(self.buffer) < size:
+            chunk = self.sock.recv(max(RECV_SIZE, size - len(self.buffer)))
+            if not chunk:
+                raise ConnectionError("connection closed")
+            self.buffer += chunk
+
+    def read_frame(self):
+        """Return (type, payload bytes); blocks until a whole frame has arrived."""
+        self._fill(HEADER.size)
+        length, frame_type = parse_header(bytes(self.buffer[:HEADER.size]))
+        end = HEADER.size + length
+        self._fill(end)
+        payload = bytes(self.buffer[HEADER.size:end])
+        del self.buffer[:end]
+        return self.codec.decode(frame_type, payload)
+
+class AsyncFrameReader:
+    """Frame reader over an asyncio StreamReader; initial holds bytes already read from it."""
+
+    def __init__(self, reader, initial=b""):
+        self.reader = reader
+        self.pending = initial
+        self.codec = FrameCodec()
+
+    async def read_exactly(self, size):
+        if self.pending:
+            head, self.pending = self.pending[:size], self.pending[size:]
+            if len(head) == size:
+                return head
+            return head + await self.reader.readexactly(size - len(head))
+        return await self.reader.readexactly(size)
+
+    async def read_frame(self):
+        length, frame_type = parse_header(await self.read_exactly(HEADER.size))
+        payload = await self.read_exactly(length) if length else b""
+        return self.codec.decode(frame_type, payload)
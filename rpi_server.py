@@ -1,34 +1,87 @@
+import argparse
+import asyncio
+import collections
+import os
+import signal
 import socket
 import subprocess
 import threading
+import time
+
+from rpi_protocol import (MAGIC, STREAM, DEFLATE, TELEMETRY_FEATURE, HEARTBEAT, HELLO, COMMAND, OUTPUT, ERROR, CHUNK,
+                          EXIT, CANCEL, SUBSCRIBE, SUBSCRIBED, TELEMETRY, PING, PONG, TELEMETRY_FIELDS, ProtocolError,
+                          AsyncFrameReader, FrameCodec, encode_json, decode_json, negotiate, pack_telemetry)
+
+try:
+    import psutil
+except ImportError:
+    psutil = None # Telemetry is unavailable without it; commands still work
 
 # Configuration
 HOST = '0.0.0.0'  # Listen on all interfaces
 PORT = 5000
+MAX_CONNECTIONS = 64 # Async mode: clients beyond this are turned away
+WORKERS = 4 # Async mode: shell commands running at once across all clients
+MAX_QUEUE = 16 # Async mode: commands waiting for a worker before new ones are refused
+COMMAND_TIMEOUT = 300.0 # Wall-clock seconds a command may run (0 = no limit)
+MAX_OUTPUT = 32 * 1024 * 1024 # Output bytes a command may produce (0 = no limit)
+KILL_GRACE = 2.0 # Seconds between SIGTERM and SIGKILL when a limit is hit
+SHUTDOWN_GRACE = 5.0 # Seconds in-flight commands get to finish on shutdown
+STREAM_CHUNK = 64 * 1024 # Max bytes of output per CHUNK frame
+STREAM_BUFFER = 256 * 1024 # Unsent output per client before we stop reading the command's pipe
+MAX_QUEUED = 32 # Commands a framed client may line up behind its running one
+TELEMETRY_MIN_INTERVAL = 0.5 # Seconds; subscriptions are clamped to this range
+TELEMETRY_MAX_INTERVAL = 60.0
+CACHE_TTL = 5.0 # Seconds a cached result lives, for allowlisted commands without their own TTL
+CACHE_SIZE = 1024 * 1024 # Bytes of cached output kept, least recently used evicted first
+HEARTBEAT_TIMEOUT = 60.0 # Seconds of silence before a heartbeat client is dropped as dead (0 = never)
+
+# Read-only commands whose results may be cached (--cache), keyed on the exact command string, with TTLs
+CACHEABLE_COMMANDS = {
+    "uptime": 5,
+    "free -h": 5,
+    "df -h": 30,
+    "vcgencmd measure_temp": 2,
+    "vcgencmd get_throttled": 10,
+    "hostname": 300,
+    "hostname -I": 60,
+    "uname -a": 300,
+}
+
+GREETINGS = ["hi", "hello", "hey", "greetings", "hola"]
+HELP_TEXT = "Available commands: help, <shell commands>\nType any shell command to execute it."
+SERVER_HELP_TEXT = "Available commands: help, status, <shell commands>\nType any shell command to execute it.\nstatus shows running and queued commands."
+GREETING_TEXT = "Greetings! How can I help you today?"
+FAILED_TEXT = "unable to fetch command, please type help for instructions"
+NO_OUTPUT_TEXT = "(Command executed with no output)"
+BUSY_TEXT = "Server busy, please try again later"
+
+def builtin_response(request):
+    """Reply for greetings/help, or None if the request is a shell command."""
+    if request.lower().strip() in GREETINGS:
+        return GREETING_TEXT
+    if request.lower().strip() == "help":
+        return HELP_TEXT
+    return None
+
+# --- Threaded mode (one thread per client) ---
 
 def handle_client(client_socket, addr):
     print(f"[*] Accepted connection from {addr[0]}:{addr[1]}")
-    
+
     try:
         while True:
             # Receive data
             request = client_socket.recv(1024).decode('utf-8')
-            
+
             if not request:
                 break
-                
+
             print(f"[*] Received: {request}")
-            
-            # Check for greetings
-            greetings = ["hi", "hello", "hey", "greetings", "hola"]
-            if request.lower().strip() in greetings:
-                response = "Greetings! How can I help you today?"
-                client_socket.send(response.encode('utf-8'))
-                continue
-            
-            # Check for help
-            if request.lower().strip() == "help":
-                response = "Available commands: help, <shell commands>\nType any shell command to execute it."
+
+            # Check for greetings / help
+            response = builtin_response(request)
+            if response:
                 client_socket.send(response.encode('utf-8'))
                 continue
 
@@ -40,28 +93,29 @@ def handle_client(client_socket, addr):
                 response = output.decode('utf-8')
             except subprocess.CalledProcessError as e:
                 # If the command was not found or failed
-                response = "unable to fetch command, please type help for instructions"
+                response = FAILED_TEXT
             except Exception as e:
                 response = f"Error executing command: {str(e)}"
-            
+
             # Send response back
             if not response:
-                response = "(Command executed with no output)"
-                
+                response = NO_OUTPUT_TEXT
+
             client_socket.send(response.encode('utf-8'))
-            
+
     except Exception as e:
         print(f"[!] Error handling client: {e}")
     finally:
         print(f"[*] Closing connection from {addr[0]}:{addr[1]}")
         client_socket.close()
 
-def start_server():
+def start_server(host=HOST, port=PORT):
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.bind((HOST, PORT))
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((host, port))
     server.listen(5)
-    print(f"[*] Listening on {HOST}:{PORT}")
-    
+    print(f"[*] Listening on {host}:{port} (threaded)")
+
     try:
         while True:
             client, addr = server.accept()
@@ -72,5 +126,774 @@ def start_server():
     finally:
         server.close()
 
+# --- Async mode (single thread, bounded concurrency) ---
+
+def kill_process_group(process, sig=signal.SIGKILL):
+    try:
+        os.killpg(process.pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass # Already gone
+
+def format_size(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f}{unit}"
+        size /= 1024
+    return f"{size:.0f}GB"
+
+class OutputLimitExceeded(Exception):
+    pass
+
+class Job:
+    """One shell command on its way through the scheduler."""
+
+    def __init__(self, request, client, sink=None):
+        self.request = request
+        self.client = client
+        self.sink = sink # async callable taking each output chunk; None buffers into output
+        self.output = []
+        self.process = None
+        self.code = None
+        self.error = None
+        self.cancelled = False
+        self.cached = False
+        self.started = None
+        self.on_cancel = None # Called by cancel(), e.g. to stop waiting on a shared cache fill
+        self.done = asyncio.get_running_loop().create_future()
+
+    def cancel(self):
+        self.cancelled = True
+        if self.process is not None:
+            kill_process_group(self.process)
+        if self.on_cancel is not None:
+            self.on_cancel()
+
+class CommandScheduler:
+    """
+    Runs shell commands on a fixed pool of worker tasks fed from a queue.
+    run() raises asyncio.QueueFull once max_queue commands are waiting for a worker. Each command
+    gets a wall-clock timeout and an output cap; either one kills its whole process group.
+    """
+
+    def __init__(self, workers=WORKERS, max_queue=MAX_QUEUE, timeout=COMMAND_TIMEOUT, max_output=MAX_OUTPUT):
+        self.worker_count = workers
+        self.timeout = timeout
+        self.max_output = max_output
+        self.max_queue = max_queue
+        self.queue = asyncio.Queue()
+        self.running = set()
+        self.workers = []
+        self.accepting = True
+        self.stats = {"completed": 0, "failed": 0, "timed_out": 0, "rejected": 0}
+
+    def waiting(self):
+        # Jobs handed to a worker that hasn't woken up yet aren't waiting
+        return max(0, self.queue.qsize() - (self.worker_count - len(self.running)))
+
+    def start(self):
+        self.workers = [asyncio.ensure_future(self.worker()) for _ in range(self.worker_count)]
+
+    async def run(self, job):
+        """Queue job and wait for it to finish; raises asyncio.QueueFull if the queue is full."""
+        if not self.accepting or self.waiting() >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise asyncio.QueueFull()
+        self.queue.put_nowait(job)
+        # Shielded: a caller going away doesn't cancel the job, the worker still finishes it
+        return await asyncio.shield(job.done)
+
+    async def worker(self):
+        while True:
+            job = await self.queue.get()
+            self.running.add(job)
+            try:
+                if job.cancelled:
+                    job.error = "Command cancelled"
+                elif not self.accepting:
+                    job.error = "Server is shutting down"
+                else:
+                    await self.execute(job)
+            except Exception as e:
+                job.error = job.error or f"Error executing command: {str(e)}"
+            finally:
+                self.running.discard(job)
+                self.stats["completed" if job.code == 0 and not job.error else "failed"] += 1
+                if not job.done.done():
+                    job.done.set_result(job)
+
+    async def execute(self, job):
+        # Own session, so the shell and everything it spawns can be killed as a group
+        job.process = await asyncio.create_subprocess_shell(
+            job.request, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+            start_new_session=True)
+        job.started = time.monotonic()
+        if job.cancelled:
+            kill_process_group(job.process)
+        try:
+            await asyncio.wait_for(self.pump(job), self.timeout or None)
+        except asyncio.TimeoutError:
+            job.error = f"Command timed out after {self.timeout:g}s"
+            self.stats["timed_out"] += 1
+            await self.terminate(job.process)
+        except OutputLimitExceeded:
+            job.error = f"Command output exceeded {format_size(self.max_output)}"
+            await self.terminate(job.process)
+        except BaseException:
+            # Client gone mid-stream or worker cancelled
+            kill_process_group(job.process)
+            raise
+        finally:
+            await self.discard_output(job.process)
+        job.code = job.process.returncode
+
+    async def pump(self, job):
+        total = 0
+        while True:
+            chunk = await job.process.stdout.read(STREAM_CHUNK)
+            if not chunk:
+                break
+            total += len(chunk)
+            if self.max_output and total > self.max_output:
+                raise OutputLimitExceeded()
+            if job.sink:
+                await job.sink(chunk)
+            else:
+                job.output.append(chunk)
+        await job.process.wait()
+
+    async def terminate(self, process):
+        """SIGTERM the process group, SIGKILL it if still alive after KILL_GRACE seconds."""
+        kill_process_group(process, signal.SIGTERM)
+        try:
+            await asyncio.wait_for(process.wait(), KILL_GRACE)
+        except asyncio.TimeoutError:
+            kill_process_group(process)
+            await process.wait()
+
+    async def discard_output(self, process):
+        # Read what's left in the pipe so its transport sees EOF and closes; a stream stopped
+        # early (limit, timeout, client gone) otherwise stays paused and leaks until exit
+        try:
+            while await asyncio.wait_for(process.stdout.read(STREAM_CHUNK), 1.0):
+                pass
+        except (asyncio.TimeoutError, OSError):
+            pass
+
+    def kill_all(self):
+        for job in list(self.running):
+            job.cancel()
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+
+    def status(self):
+        now = time.monotonic()
+        limit = f"{self.timeout:g}s" if self.timeout else "no time limit"
+        lines = [
+            f"Workers: {len(self.running)}/{self.worker_count} busy, queue: {self.waiting()}/{self.max_queue}",
+            f"Limits: {limit}, {format_size(self.max_output) if self.max_output else 'unlimited'} output per command",
+            "Totals: " + ", ".join(f"{count} {name.replace('_', ' ')}" for name, count in self.stats.items()),
+        ]
+        for job in sorted(self.running, key=lambda job: job.started or now):
+            elapsed = now - job.started if job.started else 0
+            lines.append(f"  {elapsed:6.1f}s  {job.client}  {job.request[:60]}")
+        return "\n".join(lines)
+
+class CacheFill:
+    """One execution of a cacheable command, shared by every request that missed meanwhile."""
+
+    def __init__(self, key, runner):
+        self.key = key
+        self.runner = runner
+        self.waiters = set()
+        self.task = None
+
+class ResultCache:
+    """
+    TTL + LRU cache of command output for an allowlist of read-only commands.
+    Concurrent misses for the same command share one execution, which is killed (and not
+    cached) once every request waiting on it has been cancelled.
+    """
+
+    def __init__(self, allowlist=CACHEABLE_COMMANDS, max_bytes=CACHE_SIZE):
+        self.allowlist = dict(allowlist)
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict() # command -> (expires (monotonic), output bytes)
+        self.size = 0
+        self.inflight = {} # command -> CacheFill
+        self.stats = {"hits": 0, "misses": 0, "shared": 0, "expired": 0, "evicted": 0}
+
+    def ttl_for(self, request):
+        return self.allowlist.get(request.strip())
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires, output = entry
+        if time.monotonic() >= expires:
+            self._remove(key)
+            self.stats["expired"] += 1
+            return None
+        self.entries.move_to_end(key)
+        return output
+
+    def put(self, key, output, ttl):
+        if len(output) > self.max_bytes // 4:
+            return # One big output shouldn't flush everything else
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (time.monotonic() + ttl, output)
+        self.size += len(output)
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+            self.stats["evicted"] += 1
+
+    def _remove(self, key):
+        _, output = self.entries.pop(key)
+        self.size -= len(output)
+
+    async def run(self, job, scheduler):
+        """Complete job from the cache, running it through scheduler at most once per TTL."""
+        key = job.request.strip()
+        output = self.get(key)
+        if output is not None:
+            self.stats["hits"] += 1
+            job.cached = True
+            job.code = 0
+        elif job.cancelled:
+            job.error = "Command cancelled"
+            return
+        else:
+            fill = self.inflight.get(key)
+            if fill is None:
+                self.stats["misses"] += 1
+                fill = self.inflight[key] = CacheFill(key, Job(job.request, job.client))
+                fill.task = asyncio.ensure_future(self.fill(fill, scheduler))
+            else:
+                self.stats["shared"] += 1
+            fill.waiters.add(job)
+            job.on_cancel = lambda: self.abandon(fill, job)
+            try:
+                # job.done fires if this request is cancelled; the fill carries on for the others
+                await asyncio.wait([fill.task, job.done], return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                job.on_cancel = None
+                fill.waiters.discard(job)
+            if job.cancelled:
+                job.error = "Command cancelled"
+                return
+            job.code, output, job.error = fill.task.result()
+
+        if job.sink:
+            for start in range(0, len(output), STREAM_CHUNK):
+                await job.sink(output[start:start + STREAM_CHUNK])
+        else:
+            job.output = [output]
+
+    def abandon(self, fill, job):
+        fill.waiters.discard(job)
+        if not job.done.done():
+            job.done.set_result(job)
+        if not fill.waiters:
+            # Nobody wants it any more: kill it, and let the next request start a fresh one
+            fill.runner.cancel()
+            fill.task.add_done_callback(lambda task: task.cancelled() or task.exception())
+            if self.inflight.get(fill.key) is fill:
+                del self.inflight[fill.key]
+
+    async def fill(self, fill, scheduler):
+        # Run buffered, whatever the first caller asked for; every waiter gets the full output
+        runner = fill.runner
+        try:
+            await scheduler.run(runner)
+        finally:
+            if self.inflight.get(fill.key) is fill:
+                del self.inflight[fill.key]
+        output = b"".join(runner.output)
+        if runner.code == 0 and not runner.error and not runner.cancelled:
+            self.put(fill.key, output, self.allowlist[fill.key])
+        return runner.code, output, runner.error
+
+    def status(self):
+        return (f"Cache: {len(self.entries)} entries ({format_size(self.size)} of {format_size(self.max_bytes)}), "
+                + ", ".join(f"{count} {name}" for name, count in self.stats.items()))
+
+def read_temperature():
+    try:
+        sensors = psutil.sensors_temperatures() if hasattr(psutil, "sensors_temperatures") else {}
+    except Exception:
+        sensors = {}
+    for name in ("cpu_thermal", "coretemp", "k10temp"):
+        if sensors.get(name):
+            return sensors[name][0].current
+    for entries in sensors.values():
+        if entries:
+            return entries[0].current
+    try:
+        with open("/sys/class/thermal/thermal_zone0/temp") as f:
+            return int(f.read()) / 1000
+    except (OSError, ValueError):
+        return float("nan")
+
+class TelemetrySampler:
+    """
+    Samples system metrics with psutil in-process and pushes them to subscribed sessions.
+    One task serves every subscriber: it ticks at the shortest subscribed interval, sends each
+    subscriber a sample when its own interval is due, and only runs while anyone is subscribed.
+    """
+
+    def __init__(self):
+        self.subscribers = {} # session -> [interval, next due (monotonic)]
+        self.task = None
+        self.changed = asyncio.Event()
+        self.last_net = None
+
+    def subscribe(self, session, interval):
+        """Add or update a subscription; returns the interval actually used."""
+        interval = min(max(interval, TELEMETRY_MIN_INTERVAL), TELEMETRY_MAX_INTERVAL)
+        self.subscribers[session] = [interval, 0.0]
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self.run())
+        else:
+            self.changed.set()
+        return interval
+
+    def unsubscribe(self, session):
+        self.subscribers.pop(session, None)
+
+    def sample(self):
+        now = time.monotonic()
+        net = psutil.net_io_counters()
+        down = up = float("nan")
+        if self.last_net is not None:
+            last_time, last = self.last_net
+            elapsed = max(now - last_time, 1e-3)
+            down = (net.bytes_recv - last.bytes_recv) / elapsed
+            up = (net.bytes_sent - last.bytes_sent) / elapsed
+        self.last_net = (now, net)
+        return {
+            "cpu": psutil.cpu_percent(None), # Since the previous call, no blocking
+            "ram": psutil.virtual_memory().percent,
+            "temp": read_temperature(),
+            "disk": psutil.disk_usage("/").percent,
+            "net_down": down,
+            "net_up": up,
+        }
+
+    async def run(self):
+        psutil.cpu_percent(None) # Prime: the first reading is meaningless
+        self.last_net = None
+        while self.subscribers:
+            payload = pack_telemetry(time.time(), self.sample())
+            now = time.monotonic()
+            for session, subscription in list(self.subscribers.items()):
+                interval, due = subscription
+                if now >= due:
+                    subscription[1] = now + interval
+                    session.send_telemetry(payload)
+            if not self.subscribers:
+                break
+            tick = min(interval for interval, _ in self.subscribers.values())
+            self.changed.clear()
+            try:
+                await asyncio.wait_for(self.changed.wait(), tick)
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self):
+        self.subscribers.clear()
+        if self.task is not None:
+            self.task.cancel()
+
+class FramedSession:
+    """Per-connection state of a framed client."""
+
+    def __init__(self, writer, features):
+        self.writer = writer
+        self.streaming = STREAM in features
+        self.telemetry = TELEMETRY_FEATURE in features
+        self.heartbeat = HEARTBEAT in features
+        self.codec = FrameCodec(compress=DEFLATE in features)
+        self.commands = asyncio.Queue()
+        self.job = None # Command currently running or waiting for a worker, target of CANCEL
+
+    # Encode and write in one step, so frames hit the compression stream in wire order
+    def send(self, frame_type, payload=b""):
+        self.writer.write(self.codec.encode(frame_type, payload))
+
+    def send_json(self, frame_type, data):
+        self.writer.write(self.codec.encode_json(frame_type, data))
+
+    def send_telemetry(self, payload):
+        # Samples are only worth anything fresh: drop them while the client is backed up
+        if self.writer.transport.get_write_buffer_size() < STREAM_BUFFER:
+            self.send(TELEMETRY, payload)
+
+    async def send_chunk(self, chunk):
+        self.send(CHUNK, chunk)
+        # Backpressure: a slow client stalls us here, the pipe fills and the command blocks
+        await self.writer.drain()
+
+    def reject(self, message):
+        # Streaming clients count replies, so a refused command still gets its one EXIT
+        if self.streaming:
+            self.send_json(EXIT, {"code": None, "error": message})
+        else:
+            self.send_json(ERROR, {"message": message})
+
+    def cancel(self):
+        if self.job is not None:
+            self.job.cancel()
+
+class AsyncServer:
+    """
+    asyncio implementation of the same command semantics as handle_client, speaking both
+    the framed protocol (rpi_protocol) and the original raw-text one.
+    Each client costs a coroutine instead of a thread; at most max_connections clients
+    are served and commands run through a CommandScheduler.
+    """
+
+    def __init__(self, host=HOST, port=PORT, max_connections=MAX_CONNECTIONS, workers=WORKERS,
+                 max_queue=MAX_QUEUE, timeout=COMMAND_TIMEOUT, max_output=MAX_OUTPUT, cache=None,
+                 heartbeat_timeout=HEARTBEAT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.max_connections = max_connections
+        self.heartbeat_timeout = heartbeat_timeout
+        self.scheduler = CommandScheduler(workers, max_queue, timeout, max_output)
+        self.cache = cache # ResultCache, or None when caching is off
+        self.telemetry = TelemetrySampler()
+        self.clients = set()
+        self.busy = set()
+        self.server = None
+        self.stopping = asyncio.Event()
+
+    def builtin(self, request):
+        if request.lower().strip() == "status":
+            if self.cache is not None:
+                return self.scheduler.status() + "\n" + self.cache.status()
+            return self.scheduler.status()
+        if request.lower().strip() == "help":
+            return SERVER_HELP_TEXT
+        return builtin_response(request)
+
+    def queue_full_text(self):
+        return f"Server busy: {self.scheduler.waiting()} commands already queued, try again later"
+
+    async def execute(self, job):
+        if self.cache is not None and self.cache.ttl_for(job.request):
+            await self.cache.run(job, self.scheduler)
+        else:
+            await self.scheduler.run(job)
+
+    async def run_command(self, request, client, session=None):
+        """Run a command to completion and return the reply text, with the original semantics."""
+        job = Job(request, client)
+        if session is not None:
+            session.job = job # So a client that goes away takes its command with it
+        try:
+            await self.execute(job)
+        except asyncio.QueueFull:
+            return self.queue_full_text()
+        finally:
+            if session is not None:
+                session.job = None
+        if job.error:
+            return job.error
+        # Same rule as check_output: a non-zero exit is a failure
+        if job.code != 0:
+            return FAILED_TEXT
+        return b"".join(job.output).decode('utf-8', errors='replace')
+
+    async def stream_command(self, session, request, client):
+        """Send output as CHUNK frames while the command runs, then its EXIT code."""
+        job = Job(request, client, sink=session.send_chunk)
+        session.job = job
+        try:
+            await self.execute(job)
+        except asyncio.QueueFull:
+            session.reject(self.queue_full_text())
+            return
+        finally:
+            session.job = None
+        exit_data = {"code": job.code}
+        if job.error:
+            exit_data["error"] = job.error
+        if job.cached:
+            exit_data["cached"] = True
+        session.send_json(EXIT, exit_data)
+
+    async def respond(self, request, client):
+        response = self.builtin(request)
+        if response is None:
+            response = await self.run_command(request, client) or NO_OUTPUT_TEXT
+        return response
+
+    async def read_opening(self, reader, timeout=None):
+        """First bytes from a client, enough to tell a framed client (MAGIC) from a legacy one."""
+        data = await asyncio.wait_for(reader.read(1024), timeout)
+        while data and len(data) < len(MAGIC) and MAGIC.startswith(data):
+            more = await asyncio.wait_for(reader.read(1024), timeout)
+            if not more:
+                break
+            data += more
+        return data
+
+    async def handle_client(self, reader, writer):
+        addr = writer.get_extra_info("peername")
+        task = asyncio.current_task()
+        if len(self.clients) >= self.max_connections:
+            print(f"[!] Rejecting {addr[0]}:{addr[1]}, {len(self.clients)} clients connected")
+            await self.reject(reader, writer)
+            return
+
+        self.clients.add(task)
+        print(f"[*] Accepted connection from {addr[0]}:{addr[1]}")
+        try:
+            data = await self.read_opening(reader)
+            client = f"{addr[0]}:{addr[1]}"
+            if data.startswith(MAGIC):
+                await self.serve_framed(task, client, AsyncFrameReader(reader, data[len(MAGIC):]), writer)
+            elif data:
+                await self.serve_legacy(task, client, reader, writer, data)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            pass # Shutdown
+        except Exception as e:
+            print(f"[!] Error handling client: {e}")
+        finally:
+            self.clients.discard(task)
+            print(f"[*] Closing connection from {addr[0]}:{addr[1]}")
+            await self.close_writer(writer)
+
+    async def reject(self, reader, writer):
+        # Answer in whichever protocol the client speaks; idle legacy clients just get the text
+        try:
+            data = await self.read_opening(reader, timeout=2.0)
+        except (asyncio.TimeoutError, ConnectionError):
+            data = b""
+        if data.startswith(MAGIC):
+            writer.write(MAGIC + encode_json(ERROR, {"message": BUSY_TEXT}))
+        else:
+            writer.write(BUSY_TEXT.encode('utf-8'))
+        await self.close_writer(writer)
+
+    async def serve_legacy(self, task, client, reader, writer, data):
+        """Original protocol: every read is one command, the reply is sent as raw text."""
+        while data and not self.stopping.is_set():
+            request = data.decode('utf-8', errors='replace')
+            print(f"[*] Received: {request}")
+
+            # Busy clients get to finish their reply on shutdown, idle ones are cancelled
+            self.busy.add(task)
+            try:
+                writer.write((await self.respond(request, client)).encode('utf-8'))
+                await writer.drain()
+            finally:
+                self.busy.discard(task)
+            data = await reader.read(1024)
+
+    async def serve_framed(self, task, client, frames, writer):
+        frame_type, payload = await frames.read_frame()
+        # Refusals still start with MAGIC, or the client would take us for a legacy server
+        if frame_type != HELLO:
+            writer.write(MAGIC + encode_json(ERROR, {"message": "expected HELLO"}))
+            return
+        try:
+            agreed = negotiate(decode_json(payload))
+        except ProtocolError as e:
+            writer.write(MAGIC + encode_json(ERROR, {"message": str(e)}))
+            return
+        writer.write(MAGIC + encode_json(HELLO, agreed))
+        writer.transport.set_write_buffer_limits(high=STREAM_BUFFER)
+        await writer.drain()
+
+        session = FramedSession(writer, agreed["features"])
+        frames.codec = session.codec
+        reader_task = asyncio.ensure_future(self.read_frames(frames, session, client))
+        try:
+            while not self.stopping.is_set():
+                request = await session.commands.get()
+                if request is None:
+                    break
+                print(f"[*] Received: {request}")
+
+                self.busy.add(task)
+                try:
+                    response = self.builtin(request)
+                    if response is not None:
+                        session.send(OUTPUT, response)
+                    elif session.streaming:
+                        await self.stream_command(session, request, client)
+                    else:
+                        session.send(OUTPUT, await self.run_command(request, client, session) or NO_OUTPUT_TEXT)
+                    await writer.drain()
+                finally:
+                    self.busy.discard(task)
+        finally:
+            reader_task.cancel()
+            self.telemetry.unsubscribe(session)
+
+    def handle_subscribe(self, session, request):
+        interval = request.get("interval")
+        if not isinstance(interval, (int, float)):
+            raise ProtocolError("SUBSCRIBE needs a numeric interval")
+        if psutil is None:
+            session.send_json(SUBSCRIBED, {"error": "Telemetry needs psutil on the Pi (pip install psutil)"})
+        elif interval <= 0:
+            self.telemetry.unsubscribe(session)
+            session.send_json(SUBSCRIBED, {"interval": 0})
+        else:
+            interval = self.telemetry.subscribe(session, interval)
+            session.send_json(SUBSCRIBED, {"interval": interval, "fields": list(TELEMETRY_FIELDS)})
+
+    async def read_frames(self, frames, session, client):
+        """
+        Read a framed client's frames while its commands run: commands are queued in order,
+        CANCEL and PING are answered straight away.
+        """
+        # Heartbeat clients ping regularly, so a long silence means the peer is gone
+        timeout = self.heartbeat_timeout if session.heartbeat and self.heartbeat_timeout else None
+        try:
+            while True:
+                try:
+                    frame_type, payload = await asyncio.wait_for(frames.read_frame(), timeout)
+                except asyncio.TimeoutError:
+                    print(f"[!] No heartbeat from {client} for {timeout:g}s, dropping it")
+                    self.drop_session(session)
+                    break
+                if frame_type == COMMAND:
+                    if session.commands.qsize() >= MAX_QUEUED:
+                        session.reject(f"Too many queued commands (max {MAX_QUEUED})")
+                        continue
+                    session.commands.put_nowait(payload.decode('utf-8', errors='replace'))
+                elif frame_type == CANCEL:
+                    session.cancel()
+                elif frame_type == SUBSCRIBE and session.telemetry:
+                    self.handle_subscribe(session, decode_json(payload))
+                elif frame_type == PING and session.heartbeat:
+                    session.send(PONG, payload)
+                elif frame_type == PONG and session.heartbeat:
+                    pass
+                else:
+                    raise ProtocolError(f"unexpected frame type {frame_type}")
+        except ProtocolError as e:
+            print(f"[!] Protocol error: {e}")
+            session.send_json(ERROR, {"message": str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            # Client gone (or misbehaving): nobody will read the output of its queued or
+            # running commands, so drop them and kill the running one, then wake the command
+            # loop so the connection closes
+            while not session.commands.empty():
+                session.commands.get_nowait()
+            session.cancel()
+            session.commands.put_nowait(None)
+
+    def drop_session(self, session):
+        """Dead peer: forget its queued commands, kill the running one and abort the connection."""
+        while not session.commands.empty():
+            session.commands.get_nowait()
+        session.cancel()
+        # abort, not close: a dead peer would never acknowledge the unsent output
+        session.writer.transport.abort()
+
+    async def close_writer(self, writer):
+        try:
+            writer.close()
+            await writer.wait_closed()
+        except Exception:
+            pass
+
+    async def serve(self):
+        self.scheduler.start()
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port,
+                                                 reuse_address=True, backlog=128)
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stopping.set)
+            except (NotImplementedError, RuntimeError):
+                pass # Not supported on this platform / not the main thread
+        print(f"[*] Listening on {self.host}:{self.port} (async, max {self.max_connections} clients, "
+              f"{self.scheduler.worker_count} workers)")
+        async with self.server:
+            await self.stopping.wait()
+            await self.shutdown()
+
+    async def shutdown(self):
+        """Stop accepting, let running commands finish for a grace period, then kill the rest."""
+        print("\n[*] Shutting down server")
+        self.server.close()
+        self.telemetry.stop()
+        self.scheduler.accepting = False
+        for task in self.clients - self.busy:
+            task.cancel()
+        if self.busy:
+            print(f"[*] Waiting up to {SHUTDOWN_GRACE:.0f}s for {len(self.busy)} running command(s)")
+            await asyncio.wait(list(self.busy), timeout=SHUTDOWN_GRACE)
+        self.scheduler.kill_all()
+        if self.busy:
+            # Let the handlers reap what was just killed before the loop closes
+            await asyncio.wait(list(self.busy), timeout=1.0)
+        for task in list(self.clients):
+            task.cancel()
+        if self.clients:
+            await asyncio.gather(*self.clients, return_exceptions=True)
+        await self.scheduler.stop()
+
+    def stop(self):
+        """Ask a running server to shut down (call from the loop's thread)."""
+        self.stopping.set()
+
+def start_async_server(host=HOST, port=PORT, **options):
+    async def run():
+        # Built inside the loop: asyncio primitives bind to the running loop on older Pythons
+        await AsyncServer(host, port, **options).serve()
+    asyncio.run(run())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Nexus RPi command server")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--mode", choices=["async", "threaded"], default="async",
+                        help="async (default) or the original thread-per-client server")
+    parser.add_argument("--max-connections", type=int, default=MAX_CONNECTIONS)
+    parser.add_argument("--workers", "--max-commands", type=int, default=WORKERS,
+                        help="shell commands run at once across all clients")
+    parser.add_argument("--max-queue", type=int, default=MAX_QUEUE,
+                        help="commands waiting for a worker before new ones are refused")
+    parser.add_argument("--timeout", type=float, default=COMMAND_TIMEOUT,
+                        help="wall-clock seconds per command, 0 for no limit")
+    parser.add_argument("--max-output", type=int, default=MAX_OUTPUT,
+                        help="output bytes per command, 0 for no limit")
+    parser.add_argument("--cache", action="store_true",
+                        help="cache results of allowlisted read-only commands (uptime, df -h, ...)")
+    parser.add_argument("--cache-allow", action="append", metavar="COMMAND",
+                        help="exact command to cache instead of the built-in list (repeatable)")
+    parser.add_argument("--cache-ttl", type=float, default=CACHE_TTL,
+                        help="TTL in seconds for --cache-allow commands")
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE, help="bytes of cached output")
+    parser.add_argument("--heartbeat-timeout", type=float, default=HEARTBEAT_TIMEOUT,
+                        help="seconds of silence before a heartbeat client is dropped, 0 to never drop")
+    args = parser.parse_args(argv)
+
+    cache = None
+    if args.cache or args.cache_allow:
+        allowlist = {command: args.cache_ttl for command in args.cache_allow} if args.cache_allow else CACHEABLE_COMMANDS
+        cache = ResultCache(allowlist, args.cache_size)
+
+    if args.mode == "threaded":
+        start_server(args.host, args.port)
+    else:
+        start_async_server(args.host, args.port, max_connections=args.max_connections, workers=args.workers,
+                           max_queue=args.max_queue, timeout=args.timeout, max_output=args.max_output,
+                           cache=cache, heartbeat_timeout=args.heartbeat_timeout)
+
 if __name__ == "__main__":
-    start_server()
+    main()
@@ -1,53 +1,6 @@
-import socket
-import threading
 import paramiko
 import os
-from concurrent.futures import ThreadPoolExecutor
-
-class NetworkScanner:
-    def __init__(self):
-        self.found_devices = []
-
-    def get_local_ip(self):
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        try:
-            # doesn't even have to be reachable
-            s.connect(('10.255.255.255', 1))
-            IP = s.getsockname()[0]
-        except Exception:
-            IP = '127.0.0.1'
-        finally:
-            s.close()
-        return IP
-
-    def scan_network(self, port=22):
-        self.found_devices = []
-        local_ip = self.get_local_ip()
-        base_ip = ".".join(local_ip.split(".")[:-1])
-        
-        print(f"Scanning network: {base_ip}.0/24 for port {port}...")
-
-        with ThreadPoolExecutor(max_workers=50) as executor:
-            for i in range(1, 255):
-                ip = f"{base_ip}.{i}"
-                if ip != local_ip:
-                    executor.submit(self.check_port, ip, port)
-        
-        return self.found_devices
-
-    def check_port(self, ip, port):
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(0.5)
-        result = sock.connect_ex((ip, port))
-        if result == 0:
-            try:
-                # Try to get hostname
-                hostname = socket.gethostbyaddr(ip)[0]
-            except socket.herror:
-                hostname = "Unknown"
-            
-            self.found_devices.append({"ip": ip, "hostname": hostname})
-        sock.close()
+from network_scanner import NetworkScanner # Re-exported: callers import the scanner from here
 
 class SSHClient:
     def __init__(self, ip, username, password):